@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from ai.similarity import simhash, hamming_distance
+
+def make_key(*parts: Any) -> str:
+    """
+    Returns a content-addressed key: the SHA-256 of the JSON encoding of `parts`.
+
+    Dictionaries are encoded with sorted keys, so equal requests always hash
+    to the same key regardless of argument order.
+    """
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class PersistentCache:
+    """
+    SQLite-backed key/value cache with TTL and size-bounded LRU eviction.
+
+    Values are stored as zlib-compressed JSON. Entries older than `ttl`
+    seconds are treated as misses; when the stored size exceeds `max_bytes`,
+    the least recently used entries are evicted. The cache is safe to share
+    between threads, so callers may run lookups in a worker thread.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_bytes: Optional[int] = None) -> None:
+        """
+        Args:
+            path: SQLite database file, created if missing
+            ttl: Seconds an entry stays valid, or None for no expiry
+            max_bytes: Maximum total size of stored values, or None for no limit
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores `value` (any JSON-serialisable object) under `key`."""
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.ttl is not None:
+            cursor = self._conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+            self.evictions += cursor.rowcount
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+        self.evictions += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+def cache_path(filename: str) -> str:
+    """Path of a cache file inside DEEP_RESEARCH_CACHE_DIR (default .cache)."""
+    return os.path.join(os.getenv("DEEP_RESEARCH_CACHE_DIR", ".cache"), filename)
+
+_search_cache: Optional[PersistentCache] = None
+
+def get_search_cache() -> Optional[PersistentCache]:
+    """
+    Returns the process-wide Firecrawl search cache, or None if disabled.
+
+    Configured with FIRECRAWL_CACHE (set to 0 to disable), FIRECRAWL_CACHE_TTL
+    (seconds, default one day) and FIRECRAWL_CACHE_MAX_MB (default 512).
+    """
+    global _search_cache
+    if os.getenv("FIRECRAWL_CACHE", "1") == "0":
+        return None
+    if _search_cache is None:
+        _search_cache = PersistentCache(
+            cache_path("firecrawl.sqlite"),
+            ttl=float(os.getenv("FIRECRAWL_CACHE_TTL", str(24 * 3600))),
+            max_bytes=int(float(os.getenv("FIRECRAWL_CACHE_MAX_MB", "512")) * 1024 * 1024),
+        )
+    return _search_cache
+
+class LLMCache:
+    """
+    Two-tier cache for structured LLM responses.
+
+    Entries are keyed on the hash of (model, system, prompt, schema). Lookups
+    hit a bounded in-memory LRU first, then the persistent disk tier. In the
+    opt-in near-duplicate mode, a miss falls back to the closest earlier
+    prompt with the same model, system prompt and schema whose SimHash is
+    within `max_distance` bits.
+    """
+
+    # Number of fingerprints kept per (model, system, schema) scope.
+    MAX_FINGERPRINTS = 512
+
+    def __init__(self, disk: Optional[PersistentCache] = None, memory_entries: int = 256,
+                 near_duplicates: bool = False, max_distance: int = 3) -> None:
+        """
+        Args:
+            disk: Persistent tier, or None for a memory-only cache
+            memory_entries: Maximum number of responses kept in memory
+            near_duplicates: Reuse responses for near-duplicate prompts
+            max_distance: Maximum SimHash Hamming distance for a near-duplicate match
+        """
+        self.disk = disk
+        self.memory_entries = memory_entries
+        self.near_duplicates = near_duplicates
+        self.max_distance = max_distance
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._fingerprints: Dict[str, List[Tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, model: str, system: str, prompt: str, schema: Any) -> Optional[Any]:
+        """Returns the cached response for this call, or None on a miss."""
+        key = make_key(model, system, prompt, schema)
+        value = self._lookup(key)
+        if value is not None:
+            return value
+        if self.near_duplicates:
+            fingerprint = simhash(prompt)
+            best = None
+            for other, other_key in self._scope_fingerprints(make_key(model, system, schema)):
+                distance = hamming_distance(fingerprint, other)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, other_key)
+            if best is not None:
+                value = self._lookup(best[1], count=False)
+                if value is not None:
+                    self.near_hits += 1
+                    return value
+        self.misses += 1
+        return None
+
+    def set(self, model: str, system: str, prompt: str, schema: Any, value: Any) -> None:
+        """Stores the response for this call in both tiers."""
+        key = make_key(model, system, prompt, schema)
+        self._remember(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+        if self.near_duplicates:
+            scope = make_key(model, system, schema)
+            fingerprints = self._scope_fingerprints(scope)
+            with self._lock:
+                fingerprints.append((simhash(prompt), key))
+                del fingerprints[:-self.MAX_FINGERPRINTS]
+                snapshot = list(fingerprints)
+            if self.disk is not None:
+                self.disk.set(make_key("fingerprints", scope), snapshot)
+
+    def _lookup(self, key: str, count: bool = True) -> Optional[Any]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += count
+                return self._memory[key]
+        if self.disk is None:
+            return None
+        value = self.disk.get(key)
+        if value is not None:
+            self.disk_hits += count
+            self._remember(key, value)
+        return value
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _scope_fingerprints(self, scope: str) -> List[Tuple[int, str]]:
+        if scope not in self._fingerprints:
+            stored = self.disk.get(make_key("fingerprints", scope)) if self.disk is not None else None
+            with self._lock:
+                self._fingerprints.setdefault(scope, [tuple(entry) for entry in stored or []])
+        return self._fingerprints[scope]
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits + self.near_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+_llm_cache: Optional[LLMCache] = None
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Returns the process-wide LLM response cache, or None if disabled.
+
+    Configured with LLM_CACHE (set to 0 to disable), LLM_CACHE_MEMORY_ENTRIES
+    (default 256), LLM_CACHE_TTL (seconds, default one week),
+    LLM_CACHE_MAX_MB (default 256), LLM_CACHE_NEAR_DUPLICATES (set to 1 to
+    reuse responses for near-duplicate prompts) and LLM_CACHE_MAX_DISTANCE
+    (SimHash bits, default 3).
+    """
+    global _llm_cache
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMCache(
+            disk=PersistentCache(
+                cache_path("llm.sqlite"),
+                ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+                max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024),
+            ),
+            memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256")),
+            near_duplicates=os.getenv("LLM_CACHE_NEAR_DUPLICATES", "0") == "1",
+            max_distance=int(os.getenv("LLM_CACHE_MAX_DISTANCE", "3")),
+        )
+    return _llm_cache
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import os
+import time
+import tempfile
+import unittest
+from ai.cache import LLMCache, PersistentCache, make_key
+
+class PersistentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_make_key_ignores_dict_order(self):
+        self.assertEqual(make_key("q", {"a": 1, "b": 2}), make_key("q", {"b": 2, "a": 1}))
+        self.assertNotEqual(make_key("q", 5), make_key("q", 6))
+
+    def test_hit_miss_and_persistence(self):
+        cache = PersistentCache(self.path)
+        self.assertIsNone(cache.get("k"))
+        cache.set("k", {"data": [1, 2, 3]})
+        self.assertEqual(cache.get("k"), {"data": [1, 2, 3]})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+        reopened = PersistentCache(self.path)
+        self.assertEqual(reopened.get("k"), {"data": [1, 2, 3]})
+        reopened.close()
+
+    def test_ttl_expiry(self):
+        cache = PersistentCache(self.path, ttl=0.05)
+        cache.set("k", "v")
+        self.assertEqual(cache.get("k"), "v")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("k"))
+        cache.close()
+
+    def test_lru_eviction_by_size(self):
+        cache = PersistentCache(self.path)
+        cache.set("probe", "x" * 1000)
+        entry_size = cache._conn.execute("SELECT size FROM entries").fetchone()[0]
+        cache.close()
+
+        cache = PersistentCache(os.path.join(self.tmp.name, "lru.sqlite"), max_bytes=entry_size * 2)
+        cache.set("a", "a" * 1000)
+        time.sleep(0.01)
+        cache.set("b", "b" * 1000)
+        time.sleep(0.01)
+        cache.get("a")  # "b" is now the least recently used entry
+        time.sleep(0.01)
+        cache.set("c", "c" * 1000)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.evictions, 1)
+        cache.close()
+
+class LLMCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.disk = PersistentCache(os.path.join(self.tmp.name, "llm.sqlite"))
+
+    def tearDown(self):
+        self.disk.close()
+        self.tmp.cleanup()
+
+    def test_memory_then_disk_tier(self):
+        schema = {"type": "object"}
+        cache = LLMCache(disk=self.disk, memory_entries=1)
+        cache.set("m", "sys", "first prompt", schema, {"answer": 1})
+        cache.set("m", "sys", "second prompt", schema, {"answer": 2})
+        # "first prompt" was pushed out of memory but is still on disk.
+        self.assertEqual(cache.get("m", "sys", "second prompt", schema), {"answer": 2})
+        self.assertEqual(cache.get("m", "sys", "first prompt", schema), {"answer": 1})
+        self.assertIsNone(cache.get("other-model", "sys", "first prompt", schema))
+        self.assertEqual((cache.memory_hits, cache.disk_hits, cache.misses), (1, 1, 1))
+
+    def test_near_duplicates_are_opt_in(self):
+        prompt = " ".join(f"word{i}" for i in range(200))
+        variant = prompt + " extra"
+        exact = LLMCache(disk=None)
+        exact.set("m", "sys", prompt, None, {"answer": 1})
+        self.assertIsNone(exact.get("m", "sys", variant, None))
+
+        fuzzy = LLMCache(disk=self.disk, near_duplicates=True, max_distance=8)
+        fuzzy.set("m", "sys", prompt, None, {"answer": 1})
+        self.assertEqual(fuzzy.get("m", "sys", variant, None), {"answer": 1})
+        self.assertIsNone(fuzzy.get("m", "other system", variant, None))
+        self.assertEqual(fuzzy.near_hits, 1)
+
+        # The fingerprint index is persisted with the disk tier.
+        reopened = LLMCache(disk=self.disk, near_duplicates=True, max_distance=8)
+        self.assertEqual(reopened.get("m", "sys", variant, None), {"answer": 1})
+
+if __name__ == '__main__':
+    unittest.main()
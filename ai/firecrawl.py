@@ -1,21 +1,102 @@
 import os
 import httpx
 import asyncio
+import time
+import importlib.util
 from typing import Dict, Any, Optional, List
+from ai.rate_limit import RateLimiter, get_rate_limiter, call_with_retries
+from ai.cache import PersistentCache, get_search_cache, make_key
+from ai.replay import get_recorder
+from ai import tracing
 
 class FirecrawlApp:
     """Python implementation of FirecrawlApp similar to the TypeScript version."""
 
-    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None):
-        """Initialize the FirecrawlApp with API key and optional base URL."""
+    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None,
+                 max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 30.0, http2: bool = True, timeout: float = 60.0,
+                 rate_limiter: Optional[RateLimiter] = None, cache: Optional[PersistentCache] = None):
+        """
+        Initialize the FirecrawlApp with API key and optional base URL.
+
+        The app owns one long-lived httpx.AsyncClient that is shared by all
+        requests, so connections are kept alive and reused across searches.
+        Use it as an async context manager (or call aclose()) to release the pool.
+
+        Args:
+            api_key: Firecrawl API key, defaults to FIRECRAWL_API_KEY
+            api_url: Base URL of the API
+            max_connections: Maximum number of open connections in the pool
+            max_keepalive_connections: Maximum number of idle connections kept alive
+            keepalive_expiry: Seconds an idle connection is kept before closing
+            http2: Negotiate HTTP/2 when the server supports it (requires the h2 package)
+            timeout: Request timeout in seconds
+            rate_limiter: Rate limiter for requests, defaults to the shared "firecrawl" limiter
+            cache: Persistent cache for search results, defaults to the shared search cache
+        """
         self.api_key = api_key or os.getenv("FIRECRAWL_API_KEY")
         if not self.api_key:
             raise ValueError("FirecrawlApp requires an API key")
 
         self.api_url = api_url or "https://api.firecrawl.dev/v1"
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # HTTP/2 support in httpx is optional and needs the h2 package.
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self.rate_limiter = rate_limiter or get_rate_limiter("firecrawl")
+        self.cache = cache if cache is not None else get_search_cache()
+        self.network_calls = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared HTTP client, created on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=self.limits,
+                http2=self.http2,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its connection pool."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "FirecrawlApp":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.aclose()
+
+    async def _post(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        async def send() -> Dict[str, Any]:
+            self.network_calls += 1
+            started = time.perf_counter()
+            response = await self.client.post(f"{self.api_url}/{endpoint}", json=data)
+            response.raise_for_status()
+            tracing.add("bytes", len(response.content))
+            result = response.json()
+            recorder = get_recorder()
+            if recorder is not None:
+                recorder.record(endpoint, data, result, time.perf_counter() - started)
+            return result
+
+        # 429s and transient failures are retried with backoff, honouring Retry-After.
+        return await call_with_retries(send, self.rate_limiter, retry_on=(httpx.TransportError,))
 
     async def search(self, query: str, timeout: int = 15000, limit: int = 5,
-                    scrapeOptions: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                    scrapeOptions: Optional[Dict[str, Any]] = None, scrape: bool = True) -> Dict[str, Any]:
         """
         Search the web using Firecrawl API.
 
@@ -24,27 +105,36 @@ class FirecrawlApp:
             timeout: Timeout in milliseconds
             limit: Maximum number of results
             scrapeOptions: Options for scraping
+            scrape: Scrape the result pages; when False, only URLs, titles and
+                descriptions are returned and pages can be fetched with scrape_url
 
         Returns:
             Search response as a dictionary
         """
-        url = f"{self.api_url}/search"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-
         data = {
             "query": query,
             "timeout": timeout,
             "limit": limit,
-            "scrapeOptions": scrapeOptions or {"formats": ["markdown"]},
         }
-
-        async with httpx.AsyncClient(timeout=httpx.Timeout(60.0)) as client:
-            response = await client.post(url, json=data, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        if scrape:
+            data["scrapeOptions"] = scrapeOptions or {"formats": ["markdown"]}
+
+        # The timeout does not change the results, so it is not part of the key.
+        return await self._cached_post("search", data, data["query"], data["limit"], data.get("scrapeOptions"))
+
+    async def _cached_post(self, endpoint: str, data: Dict[str, Any], *key_parts: Any) -> Dict[str, Any]:
+        if self.cache is None:
+            return await self._post(endpoint, data)
+
+        key = make_key(endpoint, *key_parts)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            tracing.add("cache_hits")
+            return cached
+        result = await self._post(endpoint, data)
+        if result.get("success", True):
+            await asyncio.to_thread(self.cache.set, key, result)
+        return result
 
     async def map_url(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
@@ -57,25 +147,15 @@ class FirecrawlApp:
         Returns:
             Mapping response as a dictionary
         """
-        endpoint = f"{self.api_url}/map"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-
         data = {
             "url": url,
             **(params or {})
         }
-
-        async with httpx.AsyncClient(timeout=httpx.Timeout(60.0)) as client:
-            response = await client.post(endpoint, json=data, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        return await self._post("map", data)
 
     async def scrape_url(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
-        Scrape a specific URL using Firecrawl API.
+        Scrape a specific URL using Firecrawl API. Responses are cached like searches.
 
         Args:
             url: The URL to scrape
@@ -84,18 +164,9 @@ class FirecrawlApp:
         Returns:
             Scraping response as a dictionary
         """
-        endpoint = f"{self.api_url}/scrape"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-
         data = {
             "url": url,
             **(params or {})
         }
-
-        async with httpx.AsyncClient(timeout=httpx.Timeout(60.0)) as client:
-            response = await client.post(endpoint, json=data, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        options = {k: v for k, v in data.items() if k not in ("url", "timeout")}
+        return await self._cached_post("scrape", data, url, options)
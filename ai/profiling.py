@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ai.tracing import Span
+
+# Sampling interval of the profiler, in seconds.
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+
+# Innermost Python frames of a thread that is waiting rather than working:
+# the event loop polling for I/O, and idle executor threads.
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("threading.py", "wait"),
+}
+
+# Slack allowed when matching child span ends against the parent's timeline.
+_SLACK_NS = 1_000_000
+
+class SamplingProfiler:
+    """
+    Statistical CPU profiler for the local processing of a run.
+
+    A background thread takes the Python stack of every other thread every
+    `interval` seconds. Stacks of threads waiting for I/O (the event loop
+    in `select`, idle executor threads) are only counted as idle, so the
+    profile shows where the process spent CPU time between network calls:
+    prompt assembly, splitting, deduplication, JSON parsing...
+
+    Unlike cProfile, sampling adds no overhead to each function call, so
+    the timings of the asyncio tasks it runs alongside stay realistic.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL) -> None:
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(names.get(ident, "thread"), frame)
+
+    def _label(self, code: Any, module: str) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{module}.{code.co_qualname}".replace(";", ":").replace(" ", "_")
+        return label
+
+    def _sample(self, thread_name: str, frame: Any) -> None:
+        self.samples += 1
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            self.idle += 1
+            return
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code, frame.f_globals.get("__name__", "?")))
+            frame = frame.f_back
+        # Executor threads are numbered (asyncio_0, asyncio_1...); merge them into one root.
+        stack.append(re.sub(r"[_-]?\d+$", "", thread_name))
+        stack.reverse()
+        self.stacks[";".join(stack)] += 1
+
+    @property
+    def busy(self) -> int:
+        return self.samples - self.idle
+
+    def folded(self) -> str:
+        """Returns the samples as folded stacks ("root;caller;callee count"), the flame graph input format."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def write_folded(self, path: str) -> None:
+        """Writes the folded stacks to `path`, for flamegraph.pl, speedscope or inferno."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+
+    def top(self, limit: int = 15) -> List[Tuple[str, int, int]]:
+        """
+        Functions the process spent the most CPU in, by self samples (the
+        function itself was running); the flame graph shows the inclusive view.
+
+        Returns:
+            (function, self samples, inclusive samples) tuples
+        """
+        inclusive: Counter = Counter()
+        own: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            for name in set(frames):
+                inclusive[name] += count
+            if frames:
+                own[frames[-1]] += count
+        return [(name, count, inclusive[name]) for name, count in own.most_common(limit)]
+
+    def format_top(self, limit: int = 15) -> str:
+        busy = max(1, self.busy)
+        lines = [f"CPU samples: {self.busy} busy, {self.idle} idle ({self.interval * 1000:g} ms interval)",
+                 f"{'self %':>7}  {'total %':>8}  function"]
+        for name, own, count in self.top(limit):
+            lines.append(f"{100 * own / busy:>6.1f}%  {100 * count / busy:>7.1f}%  {name}")
+        return "\n".join(lines)
+
+def _task_lanes(spans: Iterable[Span]) -> Dict[str, int]:
+    lanes: Dict[str, int] = {}
+    for s in sorted(spans, key=lambda s: s.start_ns):
+        lanes.setdefault(s.task, len(lanes) + 1)
+    return lanes
+
+def write_timeline(spans: List[Span], path: str) -> int:
+    """
+    Writes the spans as a Chrome trace (chrome://tracing, Perfetto,
+    speedscope), one row per asyncio task: concurrent searches, scrapes and
+    LLM calls appear side by side, and gaps inside a row are time the task
+    spent waiting for a scheduler slot or for the event loop.
+
+    Returns:
+        Number of spans written
+    """
+    if not spans:
+        events: List[Dict[str, Any]] = []
+    else:
+        origin = min(s.start_ns for s in spans)
+        lanes = _task_lanes(spans)
+        events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": lane, "args": {"name": task}}
+                  for task, lane in lanes.items()]
+        for s in spans:
+            events.append({
+                "name": s.name,
+                "cat": "error" if s.error else "span",
+                "ph": "X",
+                "ts": (s.start_ns - origin) / 1000,
+                "dur": (s.end_ns - s.start_ns) / 1000,
+                "pid": 1,
+                "tid": lanes[s.task],
+                "args": {**s.attributes, **s.counters, **({"error": s.error} if s.error else {})},
+            })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    return len(spans)
+
+@dataclass
+class PathStep:
+    """A span on the critical path, `level` spans below the root."""
+    span: Span
+    level: int
+    # Time of the span not covered by its own critical children: local work,
+    # waiting for a scheduler slot, or the network call itself for leaf spans.
+    self_s: float
+
+def critical_path(spans: List[Span], root: Optional[Span] = None) -> List[PathStep]:
+    """
+    Returns the chain of spans that determined the duration of `root` (by
+    default the longest top-level span), depth first.
+
+    Walking back from the end of a span, the child that finished last is
+    the one the span was waiting for; before that child started, the span
+    was waiting for the child that finished last before that, and so on.
+    Each child on that chain is analysed the same way. In a research run,
+    the chain goes through the query nodes, and within each node through
+    the search, scrape and extraction calls, that held up the run: making
+    any other branch faster would not have finished it sooner.
+    """
+    finished = [s for s in spans if s.end_ns is not None]
+    if root is None:
+        roots = [s for s in finished if s.parent is None]
+        if not roots:
+            return []
+        root = max(roots, key=lambda s: s.end_ns - s.start_ns)
+    children: Dict[str, List[Span]] = {}
+    for s in finished:
+        if s.parent is not None:
+            children.setdefault(s.parent.span_id, []).append(s)
+    for group in children.values():
+        group.sort(key=lambda s: s.end_ns, reverse=True)
+
+    path: List[PathStep] = []
+
+    def visit(span: Span, level: int) -> None:
+        chain, cursor = [], span.end_ns + _SLACK_NS
+        for child in children.get(span.span_id, ()):
+            if child.end_ns <= cursor and child.start_ns >= span.start_ns - _SLACK_NS:
+                chain.append(child)
+                cursor = child.start_ns + _SLACK_NS
+        chain.reverse()
+        covered = sum(child.end_ns - child.start_ns for child in chain)
+        path.append(PathStep(span, level, max(0, span.end_ns - span.start_ns - covered) / 1e9))
+        for child in chain:
+            visit(child, level + 1)
+
+    visit(root, 0)
+    return path
+
+def _describe(span: Span) -> str:
+    attributes = span.attributes
+    if "id" in attributes:
+        text = f"{span.name} {attributes['id']}"
+        if attributes.get("query"):
+            query = str(attributes["query"])
+            text += f' "{query[:60]}{"..." if len(query) > 60 else ""}"'
+        return text
+    if "url" in attributes:
+        return f"{span.name} {attributes['url']}"
+    return span.name
+
+def format_critical_path(path: List[PathStep]) -> str:
+    """Returns the critical path as an indented table, followed by its time per span name."""
+    if not path:
+        return "No spans recorded."
+    root = path[0].span
+    origin, total = root.start_ns, (root.end_ns - root.start_ns) / 1e9
+    lines = [f"Critical path of {root.name} ({total:.2f} s):",
+             f"{'start s':>8}  {'time s':>7}  {'self s':>7}  span"]
+    by_name: Counter = Counter()
+    for step in path:
+        s = step.span
+        by_name[s.name] += step.self_s
+        lines.append(f"{(s.start_ns - origin) / 1e9:>8.2f}  {(s.end_ns - s.start_ns) / 1e9:>7.2f}  "
+                     f"{step.self_s:>7.2f}  {'  ' * step.level}{_describe(s)}")
+    shares = ", ".join(f"{name} {seconds:.2f} s ({100 * seconds / max(total, 1e-9):.0f}%)"
+                       for name, seconds in by_name.most_common())
+    lines.append(f"Critical time by span: {shares}")
+    branch = [str(step.span.attributes["id"]) for step in path if step.span.name == "node"]
+    if branch:
+        lines.append(f"Critical branch (query nodes): {' -> '.join(branch)}")
+    return "\n".join(lines)
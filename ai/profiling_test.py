@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from ai.profiling import SamplingProfiler, critical_path, format_critical_path, write_timeline
+from ai.tracing import Span, get_tracer, span
+
+def make_span(name, start, end, parent=None, **attributes):
+    s = Span(name, parent=parent, attributes=attributes)
+    s.start_ns, s.end_ns = int(start * 1e9), int(end * 1e9)
+    s.duration = end - start
+    return s
+
+def busy_loop(seconds):
+    total, stop = 0, time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        total += sum(range(100))
+    return total
+
+class CriticalPathTest(unittest.TestCase):
+    def test_follows_the_spans_that_finished_last(self):
+        root = make_span("research", 0, 20)
+        slow = make_span("node", 0, 10, root, id="0", query="slow branch")
+        search = make_span("search", 2, 8, slow)
+        fast = make_span("node", 0, 4, root, id="1", query="fast branch")
+        overlapping = make_span("node", 5, 18, root, id="2")
+        last = make_span("node", 10, 20, root, id="0.0")
+        spans = [search, slow, fast, overlapping, last, root]
+
+        path = critical_path(spans)
+        self.assertEqual([step.span for step in path], [root, slow, search, last])
+        self.assertEqual([step.level for step in path], [0, 1, 2, 1])
+        self.assertAlmostEqual(path[0].self_s, 0)
+        self.assertAlmostEqual(path[1].self_s, 4)
+
+        text = format_critical_path(path)
+        self.assertIn("Critical path of research (20.00 s)", text)
+        self.assertIn('node 0 "slow branch"', text)
+        self.assertIn("Critical branch (query nodes): 0 -> 0.0", text)
+
+    def test_defaults_to_the_longest_root(self):
+        short = make_span("feedback", 0, 1)
+        long = make_span("research", 1, 9)
+        self.assertIs(critical_path([short, long])[0].span, long)
+        self.assertEqual(critical_path([]), [])
+
+class TimelineTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        get_tracer().reset()
+
+    async def test_one_row_per_task(self):
+        async def call(name):
+            with span(name):
+                await asyncio.sleep(0.01)
+
+        with span("root"):
+            await asyncio.gather(call("search"), call("extract"))
+        spans = get_tracer().spans
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "timeline.json")
+            self.assertEqual(write_timeline(spans, path), 3)
+            with open(path, encoding="utf-8") as f:
+                events = json.load(f)["traceEvents"]
+        rows = [e for e in events if e["ph"] == "M"]
+        calls = [e for e in events if e["ph"] == "X"]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len({e["tid"] for e in calls}), 3)
+        self.assertTrue(all(e["dur"] >= 10_000 for e in calls))
+
+class SamplingProfilerTest(unittest.TestCase):
+    def test_samples_busy_code_as_folded_stacks(self):
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_loop(0.2)
+        self.assertGreater(profiler.busy, 0)
+        self.assertIn("busy_loop", profiler.folded())
+        for line in profiler.folded().splitlines():
+            stack, count = line.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+            self.assertNotIn(" ", stack)
+        self.assertIn("busy_loop", profiler.format_top())
+
+    def test_waiting_threads_are_idle(self):
+        event = threading.Event()
+        waiter = threading.Thread(target=event.wait, name="waiter")
+        waiter.start()
+        try:
+            with SamplingProfiler(interval=0.001) as profiler:
+                time.sleep(0.1)
+        finally:
+            event.set()
+            waiter.join()
+        self.assertGreater(profiler.idle, 0)
+        self.assertFalse(any(stack.startswith("waiter") for stack in profiler.stacks))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,127 @@
 import os
 import json
 import httpx
+import logging
 import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, APIConnectionError
+from ai.rate_limit import get_rate_limiter, call_with_retries
+from ai.cache import get_llm_cache
+from ai.tokenizer import count_tokens, token_prefix_length
+from ai.replay import chat_completion_payload, get_recorder
+from ai import tracing
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv('.env.local')
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Size of the HTTP connection pool shared by all OpenAI calls.
+# Keep it at least as large as the LLM concurrency you run with.
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
 
 # Model configuration
 o3_mini_model = "o3-mini"
 
+# Context window of the model, and the part of it kept free for the response
+# (including reasoning tokens). Prompts are trimmed to fit the rest.
+MODEL_CONTEXT_TOKENS = int(os.getenv("OPENAI_CONTEXT_TOKENS", "200000"))
+RESPONSE_TOKEN_RESERVE = int(os.getenv("OPENAI_RESPONSE_TOKENS", "32000"))
+
+# Tokens the chat format adds around each message.
+MESSAGE_OVERHEAD_TOKENS = 8
+
+# Added to every generate_object prompt to satisfy the response_format requirement.
+JSON_INSTRUCTION = "\n\nPlease provide your response in JSON format according to the schema. Your response must be valid JSON."
+
+_client: Optional[AsyncOpenAI] = None
+
+def get_client() -> AsyncOpenAI:
+    """
+    Returns the shared AsyncOpenAI client, creating it on first use.
+
+    Every generate_object call goes through this one client, so concurrent
+    calls run in parallel over a pool of keep-alive connections instead of
+    blocking the event loop one after another.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            # Retries are handled by call_with_retries so they respect the shared rate limiter.
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                )
+            ),
+        )
+    return _client
+
+async def close_client() -> None:
+    """
+    Closes the shared OpenAI client and its connection pool.
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+class TokenUsage:
+    """
+    Token counter for a scope of work (a research run, a query node, ...).
+
+    Usage added to a counter is also added to its parent, so nested scopes
+    roll up into the run total.
+    """
+
+    def __init__(self, parent: Optional["TokenUsage"] = None) -> None:
+        self.parent = parent
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.calls += 1
+        if self.parent is not None:
+            self.parent.add(prompt_tokens, completion_tokens)
+
+_current_usage: ContextVar[Optional[TokenUsage]] = ContextVar("current_usage", default=None)
+
+@contextmanager
+def track_usage() -> Iterator[TokenUsage]:
+    """
+    Counts the tokens of every OpenAI call made inside the block, including
+    calls in tasks started from it. Nested blocks roll up into outer ones.
+    """
+    usage = TokenUsage(parent=_current_usage.get())
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+def _record_usage(usage) -> None:
+    if usage is None:
+        return
+    tracing.add("prompt_tokens", usage.prompt_tokens)
+    tracing.add("completion_tokens", usage.completion_tokens)
+    current = _current_usage.get()
+    if current is not None:
+        current.add(usage.prompt_tokens, usage.completion_tokens)
+
 def system_prompt():
     """
     Returns the system prompt from prompt.py
@@ -22,13 +130,23 @@ def system_prompt():
     from prompt import system_prompt as actual_system_prompt
     return actual_system_prompt()
 
-def trim_prompt(prompt: str, max_length: int = 25000) -> str:
+def prompt_token_budget(system: str, *fixed_parts: str) -> int:
+    """
+    Returns how many tokens of the context window are left for the variable
+    part of a prompt (page contents, learnings, ...), after the system prompt,
+    the fixed parts of the user prompt and the response reserve.
+    """
+    used = count_tokens(system) + sum(count_tokens(part) for part in fixed_parts) + 2 * MESSAGE_OVERHEAD_TOKENS
+    return max(0, MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE - used)
+
+def trim_prompt(prompt: str, max_length: Optional[int] = None, max_tokens: Optional[int] = None) -> str:
     """
     Trims a prompt to a maximum length while preserving whole sentences.
 
     Args:
         prompt: The text to trim
-        max_length: Maximum length in characters
+        max_length: Maximum length in characters (default 25000 when no limit is given)
+        max_tokens: Maximum length in tokens; when both limits are given, the tighter one applies
 
     Returns:
         Trimmed text
@@ -36,20 +154,29 @@ def trim_prompt(prompt: str, max_length: int = 25000) -> str:
     if not prompt:
         return ""
 
+    if max_length is None:
+        max_length = len(prompt) if max_tokens is not None else 25000
+    if max_tokens is not None:
+        max_length = min(max_length, token_prefix_length(prompt, max_tokens))
+
     if len(prompt) <= max_length:
         return prompt
 
-    # Try to trim at sentence boundaries
-    sentences = prompt.split('. ')
-    result = ""
+    # Cut after the last sentence boundary (". ") that fits, in one slice.
+    boundary = prompt.rfind(". ", 0, max_length)
+    result = prompt[:boundary + 2].strip() if boundary >= 0 else ""
 
-    for sentence in sentences:
-        if len(result) + len(sentence) + 2 <= max_length:  # +2 for ". "
-            result += sentence + ". "
-        else:
-            break
+    # Without a sentence boundary in range, cut mid-sentence rather than drop everything.
+    return result or prompt[:max_length]
 
-    return result.strip()
+def _fit_prompt(system: str, prompt: str, suffix: str = "") -> str:
+    """Trims `prompt` so the whole request fits the context window, instead of failing as oversized."""
+    budget = prompt_token_budget(system, suffix)
+    tokens = count_tokens(prompt)
+    if tokens <= budget:
+        return prompt
+    logger.warning("Prompt of %d tokens exceeds the %d-token budget, trimming it", tokens, budget)
+    return trim_prompt(prompt, max_tokens=budget)
 
 async def generate_object(model, system, prompt, schema):
     """
@@ -65,35 +192,68 @@ async def generate_object(model, system, prompt, schema):
         Generated object
     """
     try:
-        print(f"generate_object called with prompt length: {len(prompt)}")
-        print(f"Schema: {schema}")
+        logger.debug("generate_object called with prompt length %d, schema %s", len(prompt), schema)
+
+        # Identical (or, if enabled, near-duplicate) calls are answered from the cache.
+        cache = get_llm_cache()
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, o3_mini_model, system, prompt, schema)
+            if cached is not None:
+                logger.debug("Using cached response")
+                tracing.add("cache_hits")
+                return {"object": cached}
 
         # Add "json" to the prompt to satisfy the response_format requirement
-        modified_prompt = f"{prompt}\n\nPlease provide your response in JSON format according to the schema. Your response must be valid JSON."
+        modified_prompt = _fit_prompt(system, prompt, JSON_INSTRUCTION) + JSON_INSTRUCTION
 
-        print("Calling OpenAI API...")
-        response = client.chat.completions.create(
-            model=o3_mini_model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": modified_prompt}
-            ],
-            response_format={"type": "json_object"}
+        # Prompt tokens reserved from the tokens-per-minute quota.
+        limiter = get_rate_limiter("openai")
+        estimated_tokens = count_tokens(system) + count_tokens(modified_prompt)
+
+        logger.debug("Calling OpenAI API")
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": modified_prompt}
+        ]
+        started = time.perf_counter()
+        response = await call_with_retries(
+            lambda: get_client().chat.completions.create(
+                model=o3_mini_model,
+                messages=messages,
+                response_format={"type": "json_object"}
+            ),
+            limiter,
+            tokens=estimated_tokens,
+            retry_on=(APIConnectionError,),
         )
+        if response.usage:
+            limiter.record_usage(estimated_tokens, response.usage.total_tokens)
+        _record_usage(response.usage)
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record("chat/completions", {"messages": messages}, response.model_dump(mode="json"),
+                            time.perf_counter() - started)
 
-        print(f"OpenAI API response received. Status: {response.choices[0].finish_reason}")
+        logger.debug("OpenAI API response received, finish reason %s", response.choices[0].finish_reason)
 
         content = response.choices[0].message.content
-        print(f"Response content length: {len(content)}")
-        print(f"Response content preview: {content[:200]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response content (%d characters): %s...", len(content), content[:200])
 
         result = json.loads(content)
-        print(f"JSON parsed successfully. Keys: {list(result.keys())}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("JSON parsed successfully, keys %s", list(result.keys()))
+
+        if cache is not None:
+            await asyncio.to_thread(cache.set, o3_mini_model, system, prompt, schema, result)
 
         return {"object": result}
     except Exception as e:
-        print(f"Error generating object: {e}")
-        print(f"Error type: {type(e)}")
+        logger.error("Error generating object: %s: %s", type(e).__name__, e)
+        # The caller gets a placeholder object; record the failure on its span.
+        current = tracing.current_span()
+        if current is not None:
+            current.error = f"{type(e).__name__}: {e}"
         # Return a minimal valid object based on the schema
         if schema and "properties" in schema:
             minimal_object = {}
@@ -106,3 +266,58 @@ async def generate_object(model, system, prompt, schema):
                     minimal_object[key] = {}
             return {"object": minimal_object}
         return {"object": {}}
+
+async def stream_text(model, system, prompt) -> AsyncIterator[str]:
+    """
+    Stream a plain-text completion from OpenAI.
+
+    Rate limiting and retries apply to opening the stream; once tokens start
+    arriving they are yielded as-is.
+
+    Args:
+        model: Model name or identifier
+        system: System prompt
+        prompt: User prompt
+
+    Yields:
+        Text deltas in the order they arrive
+    """
+    prompt = _fit_prompt(system, prompt)
+    limiter = get_rate_limiter("openai")
+    estimated_tokens = count_tokens(system) + count_tokens(prompt)
+
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt}
+    ]
+    started = time.perf_counter()
+    stream = await call_with_retries(
+        lambda: get_client().chat.completions.create(
+            model=o3_mini_model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        ),
+        limiter,
+        tokens=estimated_tokens,
+        retry_on=(APIConnectionError,),
+    )
+    recorder = get_recorder()
+    # Time to the first token, which is what a replayed stream is delayed by.
+    first_token = None
+    parts, usage = [], None
+    async for chunk in stream:
+        if chunk.usage:
+            limiter.record_usage(estimated_tokens, chunk.usage.total_tokens)
+            _record_usage(chunk.usage)
+            usage = chunk.usage.model_dump(mode="json")
+        if chunk.choices and chunk.choices[0].delta.content:
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            if recorder is not None:
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk.choices[0].delta.content
+    if recorder is not None:
+        recorder.record("chat/completions", {"messages": messages},
+                        chat_completion_payload(o3_mini_model, "".join(parts), usage),
+                        first_token if first_token is not None else time.perf_counter() - started)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import os
+import unittest
+from unittest import mock
+from ai.providers import close_client, stream_text, track_usage, trim_prompt
+from ai.tokenizer import count_tokens
+from benchmarks.fake_server import FakeServer, chat_completion
+
+class TrimPromptTest(unittest.TestCase):
+    def test_short_prompts_are_unchanged(self):
+        self.assertEqual(trim_prompt("One sentence. Two sentences.", 100), "One sentence. Two sentences.")
+        self.assertEqual(trim_prompt("", 10), "")
+
+    def test_cuts_after_the_last_sentence_that_fits(self):
+        prompt = "First sentence. Second sentence. Third sentence."
+        self.assertEqual(trim_prompt(prompt, 35), "First sentence. Second sentence.")
+        self.assertEqual(trim_prompt(prompt, 20), "First sentence.")
+
+    def test_without_a_sentence_boundary_cuts_mid_sentence(self):
+        # Rather than dropping the whole prompt, which a token budget cannot afford.
+        prompt = "word " * 100
+        self.assertEqual(trim_prompt(prompt, 12), "word word wo")
+        self.assertEqual(trim_prompt("A long first sentence. Then more.", 10), "A long fir")
+
+    def test_token_limit(self):
+        prompt = " ".join(f"Sentence number {i}." for i in range(200))
+        trimmed = trim_prompt(prompt, max_tokens=50)
+        self.assertLessEqual(count_tokens(trimmed), 50)
+        self.assertTrue(prompt.startswith(trimmed))
+        self.assertTrue(trimmed.endswith("."))
+        # The tighter of both limits applies.
+        self.assertLessEqual(len(trim_prompt(prompt, max_length=40, max_tokens=50)), 40)
+
+class StreamTextTest(unittest.IsolatedAsyncioTestCase):
+    async def test_yields_deltas_and_counts_usage(self):
+        def responder(path, body):
+            return chat_completion(body["model"], "Solar output rose sharply.", 100, 5)
+
+        async with FakeServer(latency=0.0, responder=responder) as server:
+            with mock.patch.dict(os.environ, {"OPENAI_BASE_URL": server.base_url, "OPENAI_API_KEY": "test-key",
+                                              "RECORD_FIXTURES": ""}):
+                try:
+                    with track_usage() as usage:
+                        deltas = [delta async for delta in stream_text("o3-mini", "System.", "Prompt.")]
+                finally:
+                    await close_client()
+
+        self.assertEqual(deltas, ["Solar ", "output ", "rose ", "sharply."])
+        self.assertEqual((usage.prompt_tokens, usage.completion_tokens), (100, 5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import os
+import time
+import logging
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple, Type, TypeVar
+from ai import tracing
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limiting and transient server errors.
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "6"))
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `rate_per_minute`.
+
+    The level may go negative when actual usage turns out larger than what
+    was reserved, which simply delays the next callers.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None) -> None:
+        if rate_per_minute <= 0:
+            raise ValueError("TokenBucket requires a positive rate")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (amounts above capacity wait for a full bucket)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for one provider.
+
+    Callers are admitted one at a time in arrival order, so a large request
+    cannot be starved by a stream of small ones. A Retry-After received by
+    any caller pauses everyone sharing the limiter.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None) -> None:
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        # The limiter is process-wide and may outlive an event loop (one
+        # asyncio.run per batch or benchmark run), so each loop gets its own lock.
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Metrics
+        self.throttled = 0
+        self.throttle_time = 0.0
+        self.retries = 0
+
+    def _loop_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def acquire(self, tokens: float = 0) -> None:
+        """Wait until one request carrying `tokens` tokens fits in the quota."""
+        async with self._loop_lock():
+            while True:
+                delay = self.blocked_until - time.monotonic()
+                if self.requests:
+                    delay = max(delay, self.requests.delay_for(1))
+                if self.tokens and tokens:
+                    delay = max(delay, self.tokens.delay_for(tokens))
+                if delay <= 0:
+                    break
+                self.throttled += 1
+                self.throttle_time += delay
+                await asyncio.sleep(delay)
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens and tokens:
+                self.tokens.consume(tokens)
+
+    def record_usage(self, reserved: float, actual: float) -> None:
+        """Correct the token bucket once the real token usage of a request is known."""
+        if self.tokens:
+            self.tokens.consume(actual - reserved)
+
+    def block_for(self, seconds: float) -> None:
+        """Stop admitting requests for `seconds`, e.g. after a 429 with Retry-After."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "throttled": self.throttled,
+            "throttle_time": self.throttle_time,
+            "retries": self.retries,
+        }
+
+_limiters: Dict[str, RateLimiter] = {}
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """
+    Returns the process-wide rate limiter for a provider, creating it on first use.
+
+    Quotas are read from <PROVIDER>_RPM and <PROVIDER>_TPM environment
+    variables (e.g. OPENAI_RPM, OPENAI_TPM, FIRECRAWL_RPM). Unset quotas are
+    not enforced, but 429 responses are still retried with backoff.
+    """
+    if provider not in _limiters:
+        prefix = provider.upper()
+        rpm = os.getenv(f"{prefix}_RPM")
+        tpm = os.getenv(f"{prefix}_TPM")
+        _limiters[provider] = RateLimiter(
+            requests_per_minute=float(rpm) if rpm else None,
+            tokens_per_minute=float(tpm) if tpm else None,
+        )
+    return _limiters[provider]
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Parses the delay requested by a server via retry-after-ms or Retry-After.
+
+    Retry-After may be a number of seconds or an HTTP date.
+    """
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, base: float = BASE_DELAY, cap: float = MAX_DELAY) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _status_and_headers(error: Exception) -> Tuple[Optional[int], Optional[Mapping[str, str]]]:
+    # Both httpx.HTTPStatusError and openai.APIStatusError carry the response.
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None), getattr(response, "headers", None)
+
+async def call_with_retries(call: Callable[[], Awaitable[T]], limiter: RateLimiter, tokens: float = 0,
+                            max_retries: int = MAX_RETRIES,
+                            retry_on: Tuple[Type[BaseException], ...] = ()) -> T:
+    """
+    Runs `call` under `limiter`, retrying rate-limited and transient failures.
+
+    Retry-After hints are honoured (with a little jitter so waiting callers do
+    not wake up together); otherwise retries back off exponentially with
+    full jitter.
+
+    Args:
+        call: Zero-argument coroutine function performing one request
+        limiter: Rate limiter of the provider being called
+        tokens: Estimated tokens consumed by the request
+        max_retries: Maximum number of retries before the error is raised
+        retry_on: Exception types that are always retried (e.g. connection errors)
+
+    Returns:
+        The result of `call`
+    """
+    attempt = 0
+    while True:
+        await limiter.acquire(tokens)
+        try:
+            return await call()
+        except Exception as e:
+            status, headers = _status_and_headers(e)
+            if attempt >= max_retries or not (status in RETRYABLE_STATUS_CODES or isinstance(e, retry_on)):
+                raise
+            delay = retry_after_seconds(headers)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            else:
+                delay += random.uniform(0, BASE_DELAY / 4)
+            if status == 429:
+                limiter.block_for(delay)
+            logger.warning("Retrying after error (%s) in %.1fs (attempt %d/%d)",
+                           status or type(e).__name__, delay, attempt + 1, max_retries)
+            limiter.retries += 1
+            tracing.add("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
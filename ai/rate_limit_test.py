@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import asyncio
+import time
+import unittest
+from email.utils import formatdate
+from unittest import mock
+from ai import rate_limit
+from ai.rate_limit import RateLimiter, TokenBucket, call_with_retries, retry_after_seconds
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+class StatusError(Exception):
+    """An error carrying a response, like httpx.HTTPStatusError and openai.APIStatusError."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = mock.Mock(status_code=status_code, headers=headers or {})
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(rate_limit, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_starts_full_and_refills_at_rate(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.delay_for(60), 0.0)
+        bucket.consume(60)
+        self.assertAlmostEqual(bucket.delay_for(1), 1.0)
+        self.clock.now += 0.5
+        self.assertAlmostEqual(bucket.delay_for(1), 0.5)
+        # The level never refills beyond the capacity.
+        self.clock.now += 3600
+        self.assertEqual(bucket.delay_for(60), 0.0)
+        self.assertEqual(bucket.level, 60)
+
+    def test_amounts_above_capacity_wait_for_a_full_bucket(self):
+        bucket = TokenBucket(60, capacity=10)
+        bucket.consume(10)
+        self.assertAlmostEqual(bucket.delay_for(100), 10.0)
+
+    def test_overdraft_delays_next_callers(self):
+        bucket = TokenBucket(60)
+        bucket.consume(90)
+        self.assertAlmostEqual(bucket.delay_for(1), 31.0)
+
+    def test_rejects_non_positive_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+class RetryAfterTest(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(retry_after_seconds({"retry-after": "3"}), 3.0)
+        self.assertEqual(retry_after_seconds({"retry-after": "-1"}), 0.0)
+
+    def test_milliseconds_take_precedence(self):
+        self.assertEqual(retry_after_seconds({"retry-after-ms": "1500", "retry-after": "3"}), 1.5)
+        self.assertEqual(retry_after_seconds({"retry-after-ms": "soon", "retry-after": "3"}), 3.0)
+
+    def test_http_date(self):
+        delay = retry_after_seconds({"retry-after": formatdate(time.time() + 30, usegmt=True)})
+        self.assertAlmostEqual(delay, 30, delta=2)
+        self.assertEqual(retry_after_seconds({"retry-after": formatdate(time.time() - 30, usegmt=True)}), 0.0)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(retry_after_seconds(None))
+        self.assertIsNone(retry_after_seconds({}))
+        self.assertIsNone(retry_after_seconds({"retry-after": "later"}))
+
+class CallWithRetriesTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # No jitter on top of Retry-After, so the tests do not sleep.
+        patcher = mock.patch.object(rate_limit, "BASE_DELAY", 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def failing(self, *errors, result="ok"):
+        calls = []
+
+        async def call():
+            calls.append(time.monotonic())
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return result
+
+        return call, calls
+
+    async def test_retries_rate_limits_then_succeeds(self):
+        limiter = RateLimiter()
+        call, calls = self.failing(StatusError(429, {"retry-after-ms": "50"}), StatusError(429, {"retry-after": "0"}))
+        self.assertEqual(await call_with_retries(call, limiter, max_retries=2), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(limiter.retries, 2)
+        # The Retry-After of the first 429 was waited for.
+        self.assertGreaterEqual(calls[1] - calls[0], 0.05)
+
+    async def test_gives_up_after_max_retries(self):
+        limiter = RateLimiter()
+        call, calls = self.failing(*[StatusError(429, {"retry-after": "0"})] * 3)
+        with self.assertRaises(StatusError):
+            await call_with_retries(call, limiter, max_retries=2)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(limiter.retries, 2)
+
+    async def test_client_errors_are_not_retried(self):
+        limiter = RateLimiter()
+        call, calls = self.failing(StatusError(400))
+        with self.assertRaises(StatusError):
+            await call_with_retries(call, limiter)
+        self.assertEqual(len(calls), 1)
+
+    async def test_retry_on_exception_types(self):
+        limiter = RateLimiter()
+        call, calls = self.failing(ConnectionError("reset"))
+        with mock.patch.object(rate_limit, "backoff_delay", return_value=0.0):
+            self.assertEqual(await call_with_retries(call, limiter, retry_on=(ConnectionError,)), "ok")
+        self.assertEqual(len(calls), 2)
+
+    async def test_rate_limit_pauses_other_callers(self):
+        limiter = RateLimiter()
+        call, _ = self.failing(StatusError(429, {"retry-after-ms": "100"}))
+        started = time.monotonic()
+        retrying = asyncio.create_task(call_with_retries(call, limiter))
+        await asyncio.sleep(0.01)
+        await limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(await retrying, "ok")
+
+class RateLimiterTest(unittest.TestCase):
+    def test_can_be_shared_across_event_loops(self):
+        limiter = RateLimiter(requests_per_minute=6000)
+
+        async def contended():
+            # Callers queue on the lock while the first one waits out the block.
+            limiter.block_for(0.02)
+            await asyncio.gather(limiter.acquire(), limiter.acquire())
+
+        asyncio.run(contended())
+        asyncio.run(contended())
+        self.assertEqual(limiter.throttled, 2)
+
+if __name__ == '__main__':
+    unittest.main()
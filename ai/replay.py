@@ -0,0 +1,157 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from ai.similarity import simhash, hamming_distance
+
+logger = logging.getLogger(__name__)
+
+def request_endpoint(path: str, body: Dict[str, Any]) -> str:
+    """
+    Names the kind of request: "chat/completions", "search", "search+scrape"
+    (a search that also returns the page contents) or "scrape".
+    """
+    endpoint = path.strip("/")
+    for name in ("chat/completions", "search", "scrape"):
+        if endpoint.endswith(name):
+            endpoint = name
+            break
+    if endpoint == "search" and body.get("scrapeOptions"):
+        endpoint += "+scrape"
+    return endpoint
+
+def request_key(path: str, body: Dict[str, Any]) -> str:
+    """
+    Text identifying a request among those of its endpoint: the messages of
+    an LLM call, the query of a search or the URL of a scrape. Options that
+    do not change the response (timeouts, the model name) are left out.
+    """
+    if "messages" in body:
+        return "\n\n".join(f"{m.get('role')}: {m.get('content')}" for m in body["messages"])
+    if "query" in body:
+        return f"{body['query']}\nlimit: {body.get('limit')}"
+    return str(body.get("url", ""))
+
+def chat_completion_payload(model: str, content: str, usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Builds an OpenAI chat completion payload, used to record streamed completions."""
+    return {
+        "id": "chatcmpl-recorded",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+class FixtureRecorder:
+    """
+    Appends every OpenAI and Firecrawl response to a JSONL fixture file.
+
+    Each line holds the endpoint, the request key (see `request_key`), the
+    response payload and how long the call took, so a ReplayResponder can
+    serve the same responses later with the same latencies. Only calls that
+    reach the network are recorded: record with LLM_CACHE=0 and
+    FIRECRAWL_CACHE=0 to capture every call of a run.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def record(self, path: str, body: Dict[str, Any], response: Any, duration: float) -> None:
+        line = json.dumps({
+            "endpoint": request_endpoint(path, body),
+            "key": request_key(path, body),
+            "response": response,
+            "duration_s": round(duration, 4),
+        }, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.recorded += 1
+
+_recorder: Optional[FixtureRecorder] = None
+
+def get_recorder() -> Optional[FixtureRecorder]:
+    """
+    Returns the process-wide fixture recorder, or None when not recording.
+
+    Recording is enabled by setting RECORD_FIXTURES to the JSONL file the
+    responses are appended to.
+    """
+    global _recorder
+    path = os.getenv("RECORD_FIXTURES")
+    if not path:
+        return None
+    if _recorder is None or _recorder.path != path:
+        _recorder = FixtureRecorder(path)
+    return _recorder
+
+class ReplayResponder:
+    """
+    FakeServer responder answering with the responses of a fixture file.
+
+    A request is answered with the fixture recorded for the same endpoint and
+    key. Prompts rarely repeat exactly across runs (learnings from parallel
+    branches arrive in a different order, dates change), so otherwise the
+    fixture whose key has the closest SimHash is used; requests for an
+    endpoint without fixtures get a 404.
+
+    With `latency_scale`, each response is delayed by its recorded duration
+    times the scale, on top of the server's own latency and jitter.
+    """
+
+    def __init__(self, path: str, latency_scale: Optional[float] = None) -> None:
+        self.path = path
+        self.latency_scale = latency_scale
+        self._exact: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._fingerprints: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._add(json.loads(line))
+
+        # Metrics
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _add(self, entry: Dict[str, Any]) -> None:
+        self._exact[(entry["endpoint"], entry["key"])] = entry
+        self._fingerprints.setdefault(entry["endpoint"], []).append((simhash(entry["key"]), entry))
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def lookup(self, path: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Returns the fixture answering this request, or None if its endpoint has none."""
+        endpoint, key = request_endpoint(path, body), request_key(path, body)
+        entry = self._exact.get((endpoint, key))
+        if entry is not None:
+            self.exact_hits += 1
+            return entry
+        candidates = self._fingerprints.get(endpoint)
+        if not candidates:
+            self.misses += 1
+            return None
+        fingerprint = simhash(key)
+        self.near_hits += 1
+        return min(candidates, key=lambda candidate: hamming_distance(fingerprint, candidate[0]))[1]
+
+    async def __call__(self, path: str, body: Dict[str, Any]) -> Any:
+        entry = self.lookup(path, body)
+        if entry is None:
+            logger.warning("No fixture for %s request", request_endpoint(path, body))
+            return 404, {"success": False, "error": f"No fixture for {request_endpoint(path, body)}"}
+        if self.latency_scale:
+            await asyncio.sleep(entry.get("duration_s", 0.0) * self.latency_scale)
+        return entry["response"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"fixtures": len(self), "exact_hits": self.exact_hits, "near_hits": self.near_hits,
+                "misses": self.misses}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from ai.replay import FixtureRecorder, ReplayResponder, get_recorder, request_endpoint, request_key
+
+def chat(prompt):
+    return {"model": "o3-mini", "messages": [{"role": "system", "content": "You are a researcher."},
+                                             {"role": "user", "content": prompt}]}
+
+PROMPT = ("Given the following contents from a SERP search for the query <query>solar panel efficiency</query>, "
+          "generate a list of learnings from the contents. The contents: perovskite cells reach 33 percent.")
+
+class RequestKeyTest(unittest.TestCase):
+    def test_endpoints(self):
+        self.assertEqual(request_endpoint("/v1/chat/completions", chat("hi")), "chat/completions")
+        self.assertEqual(request_endpoint("/v1/search", {"query": "q"}), "search")
+        self.assertEqual(request_endpoint("search", {"query": "q", "scrapeOptions": {"formats": ["markdown"]}}),
+                         "search+scrape")
+        self.assertEqual(request_endpoint("/v1/scrape", {"url": "https://a.com"}), "scrape")
+
+    def test_keys_ignore_options_that_do_not_change_the_response(self):
+        self.assertEqual(request_key("search", {"query": "q", "limit": 5, "timeout": 1000}),
+                         request_key("search", {"query": "q", "limit": 5, "timeout": 15000}))
+        self.assertNotEqual(request_key("search", {"query": "q", "limit": 5}),
+                            request_key("search", {"query": "q", "limit": 10}))
+        self.assertEqual(request_key("chat/completions", {**chat("hi"), "model": "other"}),
+                         request_key("chat/completions", chat("hi")))
+        self.assertEqual(request_key("scrape", {"url": "https://a.com", "formats": ["markdown"]}), "https://a.com")
+
+class ReplayTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "fixtures", "run.jsonl")
+        recorder = FixtureRecorder(self.path)
+        recorder.record("chat/completions", chat(PROMPT), {"choices": ["learnings"]}, 0.05)
+        recorder.record("chat/completions", chat("Generate SERP queries about wind turbines."),
+                        {"choices": ["queries"]}, 0.05)
+        recorder.record("search", {"query": "solar", "limit": 5, "timeout": 15000}, {"data": ["page"]}, 0.2)
+        self.assertEqual(recorder.recorded, 3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_exact_replay(self):
+        responder = ReplayResponder(self.path)
+        self.assertEqual(len(responder), 3)
+        self.assertEqual(await responder("/v1/chat/completions", chat(PROMPT)), {"choices": ["learnings"]})
+        self.assertEqual(await responder("/v1/search", {"query": "solar", "limit": 5}), {"data": ["page"]})
+        self.assertEqual(responder.stats()["exact_hits"], 2)
+
+    async def test_changed_prompts_get_the_closest_fixture(self):
+        responder = ReplayResponder(self.path)
+        changed = PROMPT.replace("33 percent", "34 percent")
+        self.assertEqual(await responder("/v1/chat/completions", chat(changed)), {"choices": ["learnings"]})
+        self.assertEqual(responder.stats()["near_hits"], 1)
+
+    async def test_endpoints_without_fixtures_fail(self):
+        responder = ReplayResponder(self.path)
+        with self.assertLogs(level="WARNING"):
+            status, payload = await responder("/v1/scrape", {"url": "https://a.com"})
+        self.assertEqual(status, 404)
+        self.assertFalse(payload["success"])
+        self.assertEqual(responder.stats()["misses"], 1)
+
+    async def test_recorded_latency(self):
+        responder = ReplayResponder(self.path, latency_scale=0.5)
+        started = time.perf_counter()
+        await responder("/v1/search", {"query": "solar", "limit": 5})
+        self.assertGreaterEqual(time.perf_counter() - started, 0.09)
+
+class GetRecorderTest(unittest.TestCase):
+    def test_enabled_by_environment(self):
+        with mock.patch.dict(os.environ, {"RECORD_FIXTURES": ""}):
+            self.assertIsNone(get_recorder())
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fixtures.jsonl")
+            with mock.patch.dict(os.environ, {"RECORD_FIXTURES": path}):
+                self.assertEqual(get_recorder().path, path)
+                self.assertIs(get_recorder(), get_recorder())
+
+if __name__ == "__main__":
+    unittest.main()
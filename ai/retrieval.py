@@ -0,0 +1,94 @@
+import math
+from collections import Counter
+from typing import List
+from ai.similarity import STOPWORDS, tokenize
+from ai.text_splitter import RecursiveCharacterTextSplitter
+
+# Passage size for ranking: small enough to skip boilerplate, large enough to keep context.
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 150
+
+# Longest page prefix that is chunked; the rest of very long pages is ignored.
+MAX_PAGE_CHARS = 100000
+
+def _terms(text: str) -> List[str]:
+    return [t for t in tokenize(text) if t not in STOPWORDS]
+
+class BM25:
+    """
+    Okapi BM25 ranking over a fixed set of documents.
+
+    Args:
+        documents: Texts to rank
+        k1: Term frequency saturation
+        b: Document length normalisation
+    """
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._counts = [Counter(_terms(document)) for document in documents]
+        self._lengths = [sum(c.values()) for c in self._counts]
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_frequency: Counter = Counter()
+        for counts in self._counts:
+            document_frequency.update(counts.keys())
+        n = len(documents)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        """BM25 score of every document for `query`, in document order."""
+        terms = set(_terms(query))
+        scores = []
+        for counts, length in zip(self._counts, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._average_length) if self._average_length else self.k1
+            scores.append(sum(
+                self._idf[t] * counts[t] * (self.k1 + 1) / (counts[t] + norm)
+                for t in terms if t in counts
+            ))
+        return scores
+
+def select_passages(pages: List[str], query: str, top_k: int = 12, chunk_size: int = CHUNK_SIZE,
+                    chunk_overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Reduces each page to the passages most relevant to `query`.
+
+    Pages are split into chunks with RecursiveCharacterTextSplitter and all
+    chunks are ranked together with BM25. Each page keeps its best chunk, and
+    the remaining of the `top_k` slots go to the best chunks overall. Chunks
+    are returned in page order, joined with "...". When everything already
+    fits in `top_k` chunks, the pages are returned unchanged.
+
+    Returns:
+        One excerpt per page, in the order of `pages`
+    """
+    if sum(len(page) for page in pages) <= top_k * chunk_size:
+        return list(pages)
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = []
+    for page_index, page in enumerate(pages):
+        for chunk_index, chunk in enumerate(splitter.split_text(page[:MAX_PAGE_CHARS])):
+            chunks.append((page_index, chunk_index, chunk))
+    if not chunks:
+        return list(pages)
+
+    scores = BM25([chunk for _, _, chunk in chunks]).scores(query)
+    ranked = sorted(range(len(chunks)), key=lambda i: -scores[i])
+    selected = set()
+    covered = set()
+    for i in ranked:
+        if chunks[i][0] not in covered:
+            covered.add(chunks[i][0])
+            selected.add(i)
+    for i in ranked:
+        if len(selected) >= max(top_k, len(covered)):
+            break
+        selected.add(i)
+
+    excerpts: List[List[str]] = [[] for _ in pages]
+    for i in sorted(selected):
+        excerpts[chunks[i][0]].append(chunks[i][2])
+    return ["\n...\n".join(parts) for parts in excerpts]
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+import unittest
+from ai.retrieval import BM25, select_passages
+
+FILLER = "\n\n".join(f"Paragraph {i} discusses unrelated filler about weather and travel plans." for i in range(400))
+
+class BM25Test(unittest.TestCase):
+    def test_ranks_matching_documents_first(self):
+        documents = ["solar panel efficiency records", "wind turbine maintenance", "solar eclipse photography"]
+        scores = BM25(documents).scores("solar panel efficiency")
+        self.assertEqual(max(range(3), key=lambda i: scores[i]), 0)
+        self.assertEqual(scores[1], 0.0)
+
+class SelectPassagesTest(unittest.TestCase):
+    def test_short_pages_are_returned_unchanged(self):
+        pages = ["A short page.", "Another short page."]
+        self.assertEqual(select_passages(pages, "page"), pages)
+
+    def test_keeps_relevant_chunks_and_every_page(self):
+        relevant = FILLER[:20000] + "\n\nThe new battery cell reached 400 Wh/kg energy density in 2024.\n\n" + FILLER[20000:]
+        excerpts = select_passages([FILLER, relevant], "battery energy density", top_k=4)
+        self.assertEqual(len(excerpts), 2)
+        self.assertIn("400 Wh/kg", excerpts[1])
+        self.assertTrue(excerpts[0])
+        self.assertLess(sum(map(len, excerpts)), 4 * 1500 + 100)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+class PriorityLimiter:
+    """
+    A semaphore that hands out free slots in priority order.
+
+    Waiters with the lowest priority value are admitted first; waiters with
+    equal priority are admitted in arrival order. The limiter also keeps
+    queue-depth and wait-time counters for reporting.
+    """
+
+    def __init__(self, limit: int) -> None:
+        if limit < 1:
+            raise ValueError("PriorityLimiter requires a limit of at least 1")
+        self.limit = limit
+        self.in_flight = 0
+        self.queue_depth = 0
+        self._waiters: List[Any] = []
+        self._counter = itertools.count()
+
+        # Metrics
+        self.acquired = 0
+        self.max_in_flight = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def acquire(self, priority: float = 0) -> None:
+        """Wait until a slot is free for this priority and take it."""
+        start = time.perf_counter()
+        if self.in_flight < self.limit and not self.queue_depth:
+            self._grant()
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._counter), future))
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was granted just before cancellation: pass it on.
+                    self.release()
+                else:
+                    self.queue_depth -= 1
+                raise
+        waited = time.perf_counter() - start
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def release(self) -> None:
+        """Free a slot and admit the highest-priority waiter, if any."""
+        self.in_flight -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # Cancelled while queued; its queue_depth was already adjusted.
+                continue
+            self.queue_depth -= 1
+            self._grant()
+            future.set_result(None)
+            break
+
+    def _grant(self) -> None:
+        self.in_flight += 1
+        self.acquired += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_in_flight": self.max_in_flight,
+            "max_queue_depth": self.max_queue_depth,
+            "acquired": self.acquired,
+            "avg_wait": self.total_wait / self.acquired if self.acquired else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+class ResearchScheduler:
+    """
+    Run-scoped concurrency scheduler shared by every branch of a research run.
+
+    Each kind of work (e.g. "search" and "llm") has its own limit, so the total
+    number of in-flight calls stays bounded no matter how deep the research
+    tree gets. Slots should be held only around the call itself, never while
+    waiting on child work.
+    """
+
+    def __init__(self, search_limit: int = 4, llm_limit: int = 8,
+                 limits: Optional[Dict[str, int]] = None) -> None:
+        """
+        Args:
+            search_limit: Maximum number of concurrent search calls
+            llm_limit: Maximum number of concurrent LLM calls
+            limits: Limits for any additional kinds of work
+        """
+        all_limits = {"search": search_limit, "llm": llm_limit, **(limits or {})}
+        self.limiters = {kind: PriorityLimiter(limit) for kind, limit in all_limits.items()}
+
+    @asynccontextmanager
+    async def slot(self, kind: str, priority: float = 0) -> AsyncIterator[None]:
+        """
+        Hold one slot of the given kind for the duration of the block.
+
+        Args:
+            kind: The kind of work, e.g. "search" or "llm"
+            priority: Lower values are admitted first
+        """
+        limiter = self.limiters[kind]
+        await limiter.acquire(priority)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the current and peak queue metrics for each kind of work."""
+        return {kind: limiter.metrics() for kind, limiter in self.limiters.items()}
+
+    def format_metrics(self) -> str:
+        """Returns the metrics as a short human-readable summary."""
+        lines = []
+        for kind, m in self.metrics().items():
+            lines.append(
+                f"{kind}: {m['acquired']} calls, limit {m['limit']}, "
+                f"peak in-flight {m['max_in_flight']}, peak queue {m['max_queue_depth']}, "
+                f"avg wait {m['avg_wait']:.2f}s, max wait {m['max_wait']:.2f}s"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import asyncio
+import unittest
+from ai.scheduler import ResearchScheduler
+
+class ResearchSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_limits_are_separate_per_kind(self):
+        scheduler = ResearchScheduler(search_limit=1, llm_limit=2)
+
+        async def work(kind):
+            async with scheduler.slot(kind):
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[work("search") for _ in range(3)], *[work("llm") for _ in range(5)])
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics["search"]["max_in_flight"], 1)
+        self.assertEqual(metrics["llm"]["max_in_flight"], 2)
+        self.assertEqual(metrics["search"]["max_queue_depth"], 2)
+        self.assertEqual(metrics["llm"]["acquired"], 5)
+
+    async def test_waiters_admitted_in_priority_order(self):
+        scheduler = ResearchScheduler(search_limit=1)
+        order = []
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("search"):
+                await release.wait()
+
+        async def waiter(priority):
+            async with scheduler.slot("search", priority=priority):
+                order.append(priority)
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(waiter(p)) for p in (2, 0, 1)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, *waiters)
+        self.assertEqual(order, [0, 1, 2])
+
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        scheduler = ResearchScheduler(search_limit=1)
+        async with scheduler.slot("search"):
+            waiter = asyncio.create_task(scheduler.slot("search").__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+        metrics = scheduler.metrics()["search"]
+        self.assertEqual(metrics["in_flight"], 0)
+        self.assertEqual(metrics["queue_depth"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
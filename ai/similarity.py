@@ -0,0 +1,275 @@
+import re
+import math
+import hashlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    # Optional: vectorises pairwise similarity for large text sets.
+    import numpy as np
+except ImportError:
+    np = None
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cases `text` and splits it into word tokens."""
+    return _WORD_RE.findall(text.lower())
+
+def shingles(tokens: List[str], size: int = 3) -> Iterable[str]:
+    """Yields overlapping word n-grams ("shingles") of `size` tokens."""
+    if len(tokens) < size:
+        if tokens:
+            yield " ".join(tokens)
+        return
+    for i in range(len(tokens) - size + 1):
+        yield " ".join(tokens[i:i + size])
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    Returns the 64-bit SimHash of `text` over word shingles.
+
+    Texts that differ only slightly have fingerprints within a small Hamming
+    distance of each other.
+    """
+    weights = [0] * 64
+    for shingle in shingles(tokenize(text), shingle_size):
+        h = _hash64(shingle)
+        for bit in range(64):
+            if h >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints."""
+    return bin(a ^ b).count("1")
+
+_MAX_HASH = (1 << 64) - 1
+
+def minhash(text: str, num_perm: int = 64, shingle_size: int = 5) -> Tuple[int, ...]:
+    """
+    Returns the MinHash signature of `text` over word shingles.
+
+    Uses one-permutation hashing: each shingle is hashed once and the hash
+    space is split into `num_perm` bins, keeping the minimum of each bin, so
+    the cost is a single pass over the text. Empty bins borrow the value of
+    the next non-empty bin. The fraction of equal positions in two
+    signatures estimates the Jaccard similarity of the texts' shingle sets.
+    """
+    signature = [_MAX_HASH] * num_perm
+    for shingle in shingles(tokenize(text), shingle_size):
+        h = _hash64(shingle)
+        b = h % num_perm
+        if h < signature[b]:
+            signature[b] = h
+    filled = [i for i, value in enumerate(signature) if value != _MAX_HASH]
+    if filled and len(filled) < num_perm:
+        for i in range(num_perm):
+            j = i
+            while signature[j] == _MAX_HASH:
+                j = (j + 1) % num_perm
+            if j != i:
+                # Offset by the distance so borrowed values differ from the source bin's.
+                signature[i] = (signature[j] + (i - j) % num_perm) & _MAX_HASH
+    return tuple(signature)
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(x == y for x, y in zip(a, b)) / len(a) if a else 0.0
+
+class NearDuplicateIndex:
+    """
+    Locality-sensitive hashing index of MinHash signatures.
+
+    Signatures are split into `bands` bands; documents sharing any band are
+    candidates and are confirmed when their estimated Jaccard similarity is at
+    least `threshold`. Lookups cost one dictionary probe per band instead of a
+    comparison with every indexed document.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 5) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._buckets: List[Dict[Tuple[int, ...], List[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+
+        # Metrics
+        self.documents = 0
+        self.duplicates = 0
+        self.skipped_bytes = 0
+
+    def _bands(self, signature: Tuple[int, ...]) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def find(self, signature: Tuple[int, ...]) -> Optional[str]:
+        """Returns the key of the most similar indexed document above the threshold, or None."""
+        candidates = {key for band, rows in self._bands(signature) for key in self._buckets[band].get(rows, ())}
+        best = None
+        for key in candidates:
+            similarity = estimate_similarity(signature, self._signatures[key])
+            if similarity >= self.threshold and (best is None or similarity > best[0]):
+                best = (similarity, key)
+        return best[1] if best else None
+
+    def add(self, key: str, text: str) -> Optional[str]:
+        """
+        Indexes `text` under `key` unless it is a near-duplicate of an indexed document.
+
+        Returns:
+            The key of the document `text` duplicates, or None if it was added
+        """
+        signature = minhash(text, self.num_perm, self.shingle_size)
+        duplicate = self.find(signature)
+        if duplicate is not None and duplicate != key:
+            self.duplicates += 1
+            self.skipped_bytes += len(text.encode("utf-8"))
+            return duplicate
+        if key not in self._signatures:
+            self._signatures[key] = signature
+            for band, rows in self._bands(signature):
+                self._buckets[band].setdefault(rows, []).append(key)
+            self.documents += 1
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "documents": self.documents,
+            "duplicates": self.duplicates,
+            "skipped_bytes": self.skipped_bytes,
+        }
+
+# Common English words that carry no topical signal.
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can for from has have in into is it its of on or "
+    "that the their there these this to was were which will with".split()
+)
+
+def tfidf_vectors(texts: List[str]) -> List[Dict[str, float]]:
+    """
+    Returns an L2-normalised sparse TF-IDF vector (term -> weight) for each text.
+    """
+    counts = [Counter(t for t in tokenize(text) if t not in STOPWORDS) for text in texts]
+    document_frequency: Counter = Counter()
+    for c in counts:
+        document_frequency.update(c.keys())
+    n = len(texts)
+    vectors = []
+    for c in counts:
+        vector = {term: tf * (math.log((1 + n) / (1 + document_frequency[term])) + 1) for term, tf in c.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        vectors.append({term: w / norm for term, w in vector.items()} if norm else {})
+    return vectors
+
+def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Cosine similarity of two L2-normalised sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+def _similar_indices(vectors: List[Dict[str, float]], threshold: float):
+    """Returns a function mapping a text index to the indices at least `threshold` similar to it."""
+    # Small tolerance so rounding does not split identical texts.
+    threshold -= 1e-6
+    if np is not None:
+        vocabulary = {term: i for i, term in enumerate({t for v in vectors for t in v})}
+        matrix = np.zeros((len(vectors), len(vocabulary)), dtype=np.float32)
+        for row, vector in enumerate(vectors):
+            for term, weight in vector.items():
+                matrix[row, vocabulary[term]] = weight
+        similar = (matrix @ matrix.T) >= threshold
+        return lambda i: np.flatnonzero(similar[i]).tolist()
+    # Only texts sharing a term can have a non-zero similarity.
+    postings: Dict[str, List[int]] = {}
+    for i, vector in enumerate(vectors):
+        for term in vector:
+            postings.setdefault(term, []).append(i)
+    def similar_to(i: int) -> List[int]:
+        candidates = sorted({j for term in vectors[i] for j in postings[term]})
+        return [j for j in candidates if cosine(vectors[i], vectors[j]) >= threshold]
+    return similar_to
+
+def group_near_duplicates(texts: List[str], threshold: float = 0.8,
+                          order: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """
+    Groups texts whose TF-IDF cosine similarity is at least `threshold`.
+
+    Texts are visited in `order` (default: input order); each text not yet
+    grouped starts a group and takes every ungrouped text similar enough to
+    it, so groups never chain through intermediate texts. Similarities are
+    computed with NumPy when it is installed.
+
+    Returns:
+        Groups of text indices, each starting with the text that formed it
+    """
+    if not texts:
+        return []
+    similar = _similar_indices(tfidf_vectors(texts), threshold)
+    grouped = [False] * len(texts)
+    groups = []
+    for i in (order if order is not None else range(len(texts))):
+        if grouped[i]:
+            continue
+        group = [i] + [j for j in similar(i) if not grouped[j] and j != i]
+        for j in group:
+            grouped[j] = True
+        groups.append(group)
+    return groups
+
+def cluster_texts(texts: List[str], num_clusters: int, max_size: Optional[int] = None) -> List[List[int]]:
+    """
+    Groups texts into at most `num_clusters` lexically similar clusters.
+
+    Seeds are picked farthest-first over TF-IDF vectors, then each text joins
+    the most similar seed that still has room (`max_size`). Runs in
+    O(len(texts) * num_clusters) similarity computations.
+
+    Returns:
+        Lists of text indices, each in original order; empty clusters are dropped
+    """
+    n = len(texts)
+    if n == 0:
+        return []
+    num_clusters = max(1, min(num_clusters, n))
+    max_size = max_size or n
+    if num_clusters * max_size < n:
+        raise ValueError("num_clusters * max_size must cover all texts")
+
+    vectors = tfidf_vectors(texts)
+    seeds = [0]
+    chosen = {0}
+    closest = [cosine(vectors[0], v) for v in vectors]
+    while len(seeds) < num_clusters:
+        candidate = min((i for i in range(n) if i not in chosen), key=lambda i: closest[i])
+        seeds.append(candidate)
+        chosen.add(candidate)
+        closest = [max(closest[i], cosine(vectors[candidate], vectors[i])) for i in range(n)]
+
+    # Assign the most confident (text, seed) pairs first, so capacity limits
+    # only push out texts that fit other clusters nearly as well.
+    pairs = sorted(
+        ((cosine(vectors[seed], vectors[i]), i, c) for c, seed in enumerate(seeds) for i in range(n)),
+        key=lambda pair: -pair[0],
+    )
+    clusters: List[List[int]] = [[] for _ in seeds]
+    assigned = [False] * n
+    for _, i, c in pairs:
+        if not assigned[i] and len(clusters[c]) < max_size:
+            clusters[c].append(i)
+            assigned[i] = True
+    return [sorted(c) for c in clusters if c]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import unittest
+from unittest import mock
+from ai import similarity
+from ai.similarity import NearDuplicateIndex, cluster_texts, estimate_similarity, group_near_duplicates, minhash
+
+ARTICLE = " ".join(
+    f"Paragraph {i} reports that the vendor shipped {i * 7} units in quarter {i % 4 + 1} of the year."
+    for i in range(60)
+)
+
+class MinHashTest(unittest.TestCase):
+    def test_signature_is_deterministic(self):
+        self.assertEqual(minhash(ARTICLE), minhash(ARTICLE))
+        self.assertEqual(len(minhash(ARTICLE, num_perm=32)), 32)
+
+    def test_similarity_tracks_overlap(self):
+        mirror = "Syndicated from the original site. " + ARTICLE + " Share this article."
+        unrelated = " ".join(f"Recipe step {i}: whisk {i} eggs with flour and bake." for i in range(60))
+        self.assertGreater(estimate_similarity(minhash(ARTICLE), minhash(mirror)), 0.8)
+        self.assertLess(estimate_similarity(minhash(ARTICLE), minhash(unrelated)), 0.2)
+
+class NearDuplicateIndexTest(unittest.TestCase):
+    def test_drops_mirrors_and_counts_savings(self):
+        index = NearDuplicateIndex()
+        mirror = ARTICLE.replace("Paragraph 3 ", "Paragraph three ")
+        self.assertIsNone(index.add("https://a.example/post", ARTICLE))
+        self.assertEqual(index.add("https://b.example/copy", mirror), "https://a.example/post")
+        self.assertIsNone(index.add("https://c.example/other", "An entirely different text about gardening and soil."))
+        self.assertEqual(index.stats(), {"documents": 2, "duplicates": 1, "skipped_bytes": len(mirror.encode("utf-8"))})
+
+    def test_same_key_is_not_a_duplicate(self):
+        index = NearDuplicateIndex()
+        self.assertIsNone(index.add("k", ARTICLE))
+        self.assertIsNone(index.add("k", ARTICLE))
+        self.assertEqual(index.duplicates, 0)
+
+class GroupNearDuplicatesTest(unittest.TestCase):
+    TEXTS = [
+        "Acme shipped 1.2 million units in 2023, up 40% year over year.",
+        "The Eiffel Tower is 330 metres tall.",
+        "In 2023 Acme shipped 1.2 million units, up 40% year over year, led by Europe.",
+        "Acme shipped 1.2 million units in 2023, up 40 percent year over year.",
+    ]
+
+    def test_groups_paraphrases_around_the_first_visited_text(self):
+        groups = group_near_duplicates(self.TEXTS, threshold=0.7, order=[2, 0, 1, 3])
+        self.assertEqual([sorted(g) for g in groups], [[0, 2, 3], [1]])
+        self.assertEqual(groups[0][0], 2)
+
+    def test_pure_python_fallback_matches_numpy(self):
+        expected = group_near_duplicates(self.TEXTS, threshold=0.7)
+        with mock.patch.object(similarity, "np", None):
+            self.assertEqual(group_near_duplicates(self.TEXTS, threshold=0.7), expected)
+
+class ClusterTextsTest(unittest.TestCase):
+    TEXTS = [
+        "Solar panels convert sunlight into electricity.",
+        "Wind turbines generate power from moving air.",
+        "Rooftop solar panels lower electricity bills.",
+        "Offshore wind turbines face stronger winds.",
+        "Solar panel efficiency keeps improving.",
+        "Wind farms need turbines spaced apart.",
+    ]
+
+    def test_groups_similar_texts(self):
+        clusters = cluster_texts(self.TEXTS, 2)
+        self.assertEqual(sorted(clusters), [[0, 2, 4], [1, 3, 5]])
+
+    def test_respects_max_size(self):
+        clusters = cluster_texts(self.TEXTS, 3, max_size=2)
+        self.assertTrue(all(len(cluster) <= 2 for cluster in clusters))
+        self.assertEqual(sorted(i for cluster in clusters for i in cluster), list(range(len(self.TEXTS))))
+        for cluster in clusters:
+            self.assertEqual(cluster, sorted(cluster))
+
+    def test_rejects_clusters_too_small_for_all_texts(self):
+        with self.assertRaises(ValueError):
+            cluster_texts(self.TEXTS, 2, max_size=2)
+        self.assertEqual(cluster_texts([], 3, max_size=1), [])
+
+if __name__ == "__main__":
+    unittest.main()
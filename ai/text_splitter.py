@@ -1,11 +1,23 @@
 #!/usr/bin/env python3
+import logging
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from collections import deque
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 class TextSplitter(ABC):
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200) -> None:
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 length_function: Callable[[str], int] = len) -> None:
+        """
+        Args:
+            chunk_size: Maximum chunk length, as measured by length_function
+            chunk_overlap: Length shared by consecutive chunks
+            length_function: Measures text, e.g. ai.tokenizer.count_tokens to size chunks in tokens
+        """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
         if self.chunk_overlap >= self.chunk_size:
             raise ValueError("Cannot have chunk_overlap >= chunk_size")
 
@@ -16,14 +28,31 @@ class TextSplitter(ABC):
         """
         pass
 
+    def iter_split_text(self, text: str) -> Iterator[str]:
+        """
+        Yields the chunks of split_text one at a time.
+        """
+        yield from self.split_text(text)
+
+    def split_stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Splits one text that arrives in pieces (e.g. a streamed HTTP body or
+        the lines of a file) and yields its chunks as they become available.
+        """
+        yield from self.iter_split_text("".join(pieces))
+
+    def iter_documents(self, texts: Iterable[str]) -> Iterator[str]:
+        """
+        Lazily splits each text, yielding all chunks in order.
+        """
+        for text in texts:
+            yield from self.iter_split_text(text)
+
     def create_documents(self, texts: List[str]) -> List[str]:
         """
         Splits each text using the split_text method and returns all chunks.
         """
-        documents: List[str] = []
-        for text in texts:
-            documents.extend(self.split_text(text))
-        return documents
+        return list(self.iter_documents(texts))
 
     def split_documents(self, documents: List[str]) -> List[str]:
         """
@@ -44,24 +73,26 @@ class TextSplitter(ABC):
         Merges a list of text splits into chunks respecting the chunk_size and chunk_overlap.
         """
         docs: List[str] = []
-        current_doc: List[str] = []
+        current_doc: Deque[str] = deque()
         total = 0
+        lengths: Deque[int] = deque()
         for s in splits:
-            s_len = len(s)
+            s_len = self.length_function(s)
             if total + s_len >= self.chunk_size:
                 if total > self.chunk_size:
-                    print(f"Warning: Created a chunk of size {total}, which exceeds {self.chunk_size}")
+                    logger.warning("Created a chunk of size %d, which exceeds %d", total, self.chunk_size)
                 if current_doc:
-                    merged = self.join_docs(current_doc, separator)
+                    merged = self.join_docs(list(current_doc), separator)
                     if merged is not None:
                         docs.append(merged)
                     # Remove elements from the beginning until conditions are met.
                     while current_doc and (total > self.chunk_overlap or (total + s_len > self.chunk_size and total > 0)):
-                        removed = current_doc.pop(0)
-                        total -= len(removed)
+                        current_doc.popleft()
+                        total -= lengths.popleft()
             current_doc.append(s)
+            lengths.append(s_len)
             total += s_len
-        merged = self.join_docs(current_doc, separator)
+        merged = self.join_docs(list(current_doc), separator)
         if merged is not None:
             docs.append(merged)
         return docs
@@ -70,8 +101,9 @@ class RecursiveCharacterTextSplitter(TextSplitter):
     def __init__(self,
                  chunk_size: int = 1000,
                  chunk_overlap: int = 200,
-                 separators: Optional[List[str]] = None) -> None:
-        super().__init__(chunk_size, chunk_overlap)
+                 separators: Optional[List[str]] = None,
+                 length_function: Callable[[str], int] = len) -> None:
+        super().__init__(chunk_size, chunk_overlap, length_function)
         # Use default separators if not provided.
         self.separators = separators if separators is not None else ['\n\n', '\n', '.', ',', '>', '<', ' ', '']
 
@@ -80,48 +112,209 @@ class RecursiveCharacterTextSplitter(TextSplitter):
         Splits the text into chunks using an appropriate separator.
         Handles long chunks recursively.
         """
-        final_chunks: List[str] = []
+        return list(self.iter_split_text(text))
 
-        # Select appropriate separator.
-        separator = self.separators[-1]  # default to last element (usually '')
-        for sep in self.separators:
-            if sep == "":
-                separator = sep
-                break
-            if sep in text:
-                separator = sep
-                break
+    def iter_split_text(self, text: str) -> Iterator[str]:
+        """
+        Yields the chunks of split_text one at a time.
 
-        # Split text using the chosen separator.
-        if separator:
-            splits = text.split(separator)
-        else:
-            # If separator is empty, split into individual characters.
-            splits = list(text)
+        Works on (start, end) offsets into `text`: pieces are only sliced out
+        when a chunk is emitted, and the sliding window of pieces is a deque,
+        so splitting is linear in the length of the text.
+        """
+        return self._iter_span(text, 0, len(text), 0)
+
+    def split_stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Splits one text that arrives in pieces (e.g. a streamed HTTP body or
+        the lines of a file) and yields its chunks as they become available.
 
-        good_splits: List[str] = []
+        The text is cut at the first separator as it streams in, so memory is
+        bounded by the longest run between two such separators plus one chunk
+        window, not by the size of the text. Yields the same chunks as
+        split_text on the concatenated pieces.
+        """
+        separator = self.separators[0] if self.separators else ""
+        if not separator:
+            yield from super().split_stream(pieces)
+            return
+        yield from self._iter_merge_pieces(self._stream_splits(pieces, separator), separator)
+
+    @staticmethod
+    def _stream_splits(pieces: Iterable[str], separator: str) -> Iterator[str]:
+        """Yields "".join(pieces).split(separator) without joining the whole text."""
+        pending: List[str] = []
+        tail = ""
+        keep = len(separator) - 1
+        for piece in pieces:
+            if not piece:
+                continue
+            # A separator may straddle the previous piece and this one.
+            window = tail + piece
+            if separator not in window:
+                pending.append(piece)
+                tail = window[-keep:] if keep else ""
+                continue
+            parts = ("".join(pending) + piece).split(separator)
+            yield from parts[:-1]
+            pending = [parts[-1]]
+            tail = parts[-1][-keep:] if keep else ""
+        yield "".join(pending)
+
+    def _iter_merge_pieces(self, splits: Iterable[str], separator: str) -> Iterator[str]:
+        """
+        Streaming merge_splits over the top-level splits of split_stream.
+        Splits of chunk_size or more end the current window and are split
+        recursively, as in split_text.
+        """
+        window: Deque[str] = deque()
+        lengths: Deque[int] = deque()
+        total = 0
         for s in splits:
-            if len(s) < self.chunk_size:
-                good_splits.append(s)
-            else:
-                if good_splits:
-                    merged = self.merge_splits(good_splits, separator)
-                    final_chunks.extend(merged)
-                    good_splits = []
+            s_len = self.length_function(s)
+            if s_len >= self.chunk_size:
+                if window:
+                    merged = self.join_docs(list(window), separator)
+                    if merged is not None:
+                        yield merged
+                    window.clear()
+                    lengths.clear()
+                    total = 0
+                yield from self._iter_span(s, 0, len(s), 1)
+                continue
+            if total + s_len >= self.chunk_size:
+                if total > self.chunk_size:
+                    logger.warning("Created a chunk of size %d, which exceeds %d", total, self.chunk_size)
+                if window:
+                    merged = self.join_docs(list(window), separator)
+                    if merged is not None:
+                        yield merged
+                    # Remove elements from the beginning until conditions are met.
+                    while window and (total > self.chunk_overlap or (total + s_len > self.chunk_size and total > 0)):
+                        window.popleft()
+                        total -= lengths.popleft()
+            window.append(s)
+            lengths.append(s_len)
+            total += s_len
+        if window:
+            merged = self.join_docs(list(window), separator)
+            if merged is not None:
+                yield merged
+
+    def _iter_span(self, text: str, start: int, end: int, first: int) -> Iterator[str]:
+        # Select appropriate separator. Separators before `first` are known
+        # not to occur in this span, so they are not searched again.
+        index = len(self.separators) - 1
+        separator = self.separators[index]  # default to last element (usually '')
+        for i in range(first, len(self.separators)):
+            sep = self.separators[i]
+            if sep == "" or text.find(sep, start, end) != -1:
+                index, separator = i, sep
+                break
+        else:
+            # No separator matches; keep searching from the same one, like a full rescan would.
+            index -= 1
+
+        if separator == "" and self.chunk_size > 1 and self.length_function is len:
+            yield from self._merge_characters(text, start, end)
+            return
+
+        # Splits are merged through a sliding window as they are found, so the
+        # first chunks are yielded before the rest of the span is scanned.
+        measure = self.length_function
+        window: Deque[Tuple[int, int, int]] = deque()
+        total = 0
+        for span_start, span_end in self._spans(text, start, end, separator):
+            s_len = span_end - span_start if measure is len else measure(text[span_start:span_end])
+            if s_len >= self.chunk_size:
+                if window:
+                    merged = text[window[0][0]:window[-1][1]].strip()
+                    if merged:
+                        yield merged
+                    window.clear()
+                    total = 0
                 # Recursively split the long segment.
-                final_chunks.extend(self.split_text(s))
-        if good_splits:
-            merged = self.merge_splits(good_splits, separator)
-            final_chunks.extend(merged)
-        return final_chunks
+                yield from self._iter_span(text, span_start, span_end, index + 1)
+                continue
+            if total + s_len >= self.chunk_size:
+                if total > self.chunk_size:
+                    logger.warning("Created a chunk of size %d, which exceeds %d", total, self.chunk_size)
+                if window:
+                    # The window holds consecutive pieces of one split, so joining
+                    # it with the separator is a single slice of `text`.
+                    merged = text[window[0][0]:window[-1][1]].strip()
+                    if merged:
+                        yield merged
+                    # Remove elements from the beginning until conditions are met.
+                    while window and (total > self.chunk_overlap or (total + s_len > self.chunk_size and total > 0)):
+                        total -= window.popleft()[2]
+            window.append((span_start, span_end, s_len))
+            total += s_len
+        if window:
+            merged = text[window[0][0]:window[-1][1]].strip()
+            if merged:
+                yield merged
 
-def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+    @staticmethod
+    def _spans(text: str, start: int, end: int, separator: str) -> Iterator[Tuple[int, int]]:
+        """Yields the offsets of text[start:end].split(separator), or of each character if it is empty."""
+        if not separator:
+            for i in range(start, end):
+                yield i, i + 1
+            return
+        step = len(separator)
+        while True:
+            found = text.find(separator, start, end)
+            if found == -1:
+                yield start, end
+                return
+            yield start, found
+            start = found + step
+
+    def _merge_characters(self, text: str, start: int, end: int) -> Iterator[str]:
+        """
+        merge_splits over the single characters of text[start:end], computed
+        per chunk instead of per character: the window grows to
+        chunk_size - 1 characters, is emitted, and shrinks to chunk_overlap.
+        """
+        low = start
+        total = 0
+        position = start
+        while position < end:
+            if total + 1 >= self.chunk_size:
+                merged = text[low:low + total].strip()
+                if merged:
+                    yield merged
+                kept = min(total, self.chunk_overlap)
+                low += total - kept
+                total = kept + 1
+                position += 1
+            else:
+                step = min(self.chunk_size - 1 - total, end - position)
+                total += step
+                position += step
+        merged = text[low:low + total].strip()
+        if merged:
+            yield merged
+
+def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+               length_function: Callable[[str], int] = len) -> List[str]:
     """
     Splits the provided text into chunks using the RecursiveCharacterTextSplitter.
     """
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                              length_function=length_function)
     return splitter.split_text(text)
 
+def split_stream(pieces: Iterable[str], chunk_size: int = 1000, chunk_overlap: int = 200,
+                 length_function: Callable[[str], int] = len) -> Iterator[str]:
+    """
+    Lazily splits a text that arrives in pieces using the RecursiveCharacterTextSplitter.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                              length_function=length_function)
+    return splitter.split_stream(pieces)
+
 # Example usage for testing.
 if __name__ == '__main__':
     splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=20)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 import unittest
-from text_splitter import split_text
+from ai.text_splitter import RecursiveCharacterTextSplitter, split_stream, split_text
 
 class TextSplitterTest(unittest.TestCase):
     def test_split_text_default(self):
@@ -16,5 +16,50 @@ class TextSplitterTest(unittest.TestCase):
         text = "short text"
         self.assertEqual(split_text(text, 100), [text])
 
+class StreamingSplitterTest(unittest.TestCase):
+    TEXT = "\n\n".join(f"Paragraph {i}. " + "word " * (i * 7 % 45) for i in range(60))
+
+    def test_iter_split_text_matches_split_text(self):
+        splitter = RecursiveCharacterTextSplitter(chunk_size=120, chunk_overlap=20)
+        chunks = splitter.iter_split_text(self.TEXT)
+        self.assertNotIsInstance(chunks, list)
+        self.assertEqual(list(chunks), splitter.split_text(self.TEXT))
+
+    def test_split_stream_matches_split_text_for_any_piece_boundaries(self):
+        expected = split_text(self.TEXT, 120, 20)
+        for size in (1, 7, 64, len(self.TEXT)):
+            pieces = (self.TEXT[i:i + size] for i in range(0, len(self.TEXT), size))
+            self.assertEqual(list(split_stream(pieces, 120, 20)), expected)
+
+    def test_split_stream_is_lazy(self):
+        consumed = []
+
+        def pieces():
+            for i in range(1000):
+                consumed.append(i)
+                yield f"Paragraph {i} with some text in it.\n\n"
+
+        first = next(split_stream(pieces(), 100, 10))
+        self.assertTrue(first.startswith("Paragraph 0"))
+        self.assertLess(len(consumed), 10)
+
+    def test_iter_split_text_is_lazy(self):
+        measured = []
+
+        def length(s):
+            measured.append(s)
+            return len(s)
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=10, length_function=length)
+        text = "".join(f"Paragraph {i} with some text in it.\n\n" for i in range(1000))
+        first = next(splitter.iter_split_text(text))
+        self.assertTrue(first.startswith("Paragraph 0"))
+        self.assertLess(len(measured), 10)
+
+    def test_iter_documents_chains_texts(self):
+        splitter = RecursiveCharacterTextSplitter(chunk_size=50, chunk_overlap=0)
+        texts = ["first text. " * 10, "second text. " * 10]
+        self.assertEqual(list(splitter.iter_documents(iter(texts))), splitter.create_documents(texts))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,121 @@
+import os
+import re
+import logging
+import math
+from functools import lru_cache
+from typing import List, Sequence
+
+try:
+    # Optional: exact token counts for OpenAI models.
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Encoding used by o3-mini and other recent OpenAI models.
+ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+
+# Strings up to this many characters are cached; longer ones are rarely repeated.
+CACHE_MAX_CHARS = 20000
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+_encoding = None
+
+def _get_encoding():
+    """Returns the tiktoken encoding, or None when tiktoken or its data is unavailable."""
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(ENCODING)
+            except Exception as e:
+                # The encoding data is downloaded on first use and may be unreachable.
+                logger.warning("tiktoken encoding %s unavailable (%s), estimating token counts", ENCODING, e)
+    return _encoding or None
+
+def _estimate_tokens(text: str) -> int:
+    # About four characters per token for prose; punctuation-heavy text has
+    # more tokens than that, so never count fewer than words plus symbols.
+    return max(math.ceil(len(text) / 4), len(_PIECE_RE.findall(text)))
+
+def _count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _estimate_tokens(text)
+
+@lru_cache(maxsize=8192)
+def _count_tokens_cached(text: str) -> int:
+    return _count_tokens(text)
+
+def count_tokens(text: str) -> int:
+    """
+    Returns the number of tokens in `text`.
+
+    Exact with tiktoken installed, otherwise a conservative estimate. Counts
+    of short strings (learnings, prompts, chunks) are kept in an LRU cache.
+    """
+    if not text:
+        return 0
+    if len(text) <= CACHE_MAX_CHARS:
+        return _count_tokens_cached(text)
+    return _count_tokens(text)
+
+def token_prefix_length(text: str, max_tokens: int) -> int:
+    """
+    Returns the length in characters of the longest prefix of `text` that
+    fits in `max_tokens` tokens.
+    """
+    if max_tokens <= 0:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return len(text)
+        # Ignore a multi-byte character cut in half at the boundary.
+        return len(encoding.decode_bytes(tokens[:max_tokens]).decode("utf-8", errors="ignore"))
+    if count_tokens(text) <= max_tokens:
+        return len(text)
+    # The estimate grows monotonically with the prefix, so bisect on the length.
+    low, high = 0, min(len(text), max_tokens * 4)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def allocate_tokens(sizes: Sequence[int], budget: int) -> List[int]:
+    """
+    Splits `budget` tokens between parts of the given sizes.
+
+    Parts smaller than an equal share keep their full size and the tokens
+    they leave unused go to the larger parts, so the budget is used exactly
+    when the parts do not all fit.
+
+    Returns:
+        Tokens allotted to each part, in order
+    """
+    allocation = [0] * len(sizes)
+    remaining = max(0, budget)
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for position, i in enumerate(order):
+        left = len(order) - position
+        share = remaining // left
+        if sizes[i] <= share:
+            allocation[i] = sizes[i]
+            remaining -= sizes[i]
+            continue
+        rest = order[position:]
+        for j in rest:
+            allocation[j] = share
+        # Hand out the rounding remainder to the largest parts.
+        for j in rest[left - (remaining - share * left):]:
+            allocation[j] += 1
+        break
+    return allocation
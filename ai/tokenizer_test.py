@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import unittest
+from ai.tokenizer import allocate_tokens, count_tokens, token_prefix_length
+
+class CountTokensTest(unittest.TestCase):
+    def test_empty_text_has_no_tokens(self):
+        self.assertEqual(count_tokens(""), 0)
+
+    def test_counts_grow_with_text(self):
+        sentence = "The quick brown fox jumps over the lazy dog. "
+        self.assertGreater(count_tokens(sentence), 0)
+        self.assertGreater(count_tokens(sentence * 10), count_tokens(sentence))
+
+    def test_punctuation_counts_more_than_prose(self):
+        # Same length, but symbols split into far more tokens than words.
+        self.assertGreater(count_tokens("{[(<>)]};" * 20), count_tokens("sentences" * 20))
+
+    def test_long_texts_are_counted(self):
+        text = "word " * 10000
+        self.assertGreaterEqual(count_tokens(text), 10000)
+
+class TokenPrefixLengthTest(unittest.TestCase):
+    TEXT = "Research results are summarised in a few sentences. " * 200
+
+    def test_whole_text_when_it_fits(self):
+        self.assertEqual(token_prefix_length(self.TEXT, count_tokens(self.TEXT)), len(self.TEXT))
+
+    def test_prefix_fits_the_limit(self):
+        for limit in (1, 10, 100, 1000):
+            length = token_prefix_length(self.TEXT, limit)
+            self.assertLess(length, len(self.TEXT))
+            self.assertLessEqual(count_tokens(self.TEXT[:length]), limit)
+            self.assertGreater(count_tokens(self.TEXT[:length + 20]), limit)
+
+    def test_no_tokens_no_text(self):
+        self.assertEqual(token_prefix_length(self.TEXT, 0), 0)
+
+class AllocateTokensTest(unittest.TestCase):
+    def test_everything_fits(self):
+        self.assertEqual(allocate_tokens([10, 20, 30], 100), [10, 20, 30])
+
+    def test_small_parts_keep_their_size(self):
+        self.assertEqual(allocate_tokens([10, 500, 300, 2000], 1000), [10, 345, 300, 345])
+
+    def test_budget_is_used_exactly(self):
+        allocation = allocate_tokens([400, 400, 400], 1000)
+        self.assertEqual(sum(allocation), 1000)
+        self.assertLessEqual(max(allocation) - min(allocation), 1)
+
+    def test_no_budget(self):
+        self.assertEqual(allocate_tokens([10, 20], 0), [0, 0])
+        self.assertEqual(allocate_tokens([], 100), [])
+
+if __name__ == "__main__":
+    unittest.main()
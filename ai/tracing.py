@@ -0,0 +1,184 @@
+import asyncio
+import functools
+import json
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Counters shown in the summary table, in column order.
+SUMMARY_COUNTERS = ("prompt_tokens", "completion_tokens", "bytes", "cache_hits", "retries")
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+def _task_name() -> str:
+    """Name of the asyncio task running the caller, or of its thread outside tasks."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task.get_name() if task is not None else threading.current_thread().name
+
+class Span:
+    """
+    One timed operation of a run (a search, an LLM extraction, a report...).
+
+    Spans nest: a span started inside another one, including in tasks
+    started from it, becomes its child. Counters (tokens, bytes, cache hits,
+    retries) added to a span are also added to its ancestors, so every span
+    reports the totals of the work done under it.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None,
+                 attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else _new_id(128)
+        self.span_id = _new_id(64)
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.counters: Dict[str, float] = {}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        # Spans of one task nest strictly, so the task is a row of the timeline.
+        self.task = _task_name()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def add(self, counter: str, value: float = 1) -> None:
+        span: Optional[Span] = self
+        while span is not None:
+            span.counters[counter] = span.counters.get(counter, 0) + value
+            span = span.parent
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Returns the span in the OpenTelemetry (OTLP) JSON span format."""
+        def value(v: Any) -> Dict[str, Any]:
+            if isinstance(v, bool):
+                return {"boolValue": v}
+            if isinstance(v, int):
+                return {"intValue": str(v)}
+            if isinstance(v, float):
+                return {"doubleValue": v}
+            return {"stringValue": str(v)}
+
+        attributes = {**self.attributes, **self.counters, "duration_s": self.duration}
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent is not None else "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": value(v)} for k, v in attributes.items() if v is not None],
+            # 1 = OK, 2 = ERROR
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+
+class Tracer:
+    """Collects the finished spans of a process and summarises them per span name."""
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def reset(self) -> None:
+        self.spans = []
+
+    def export_jsonl(self, path: str) -> int:
+        """
+        Writes every finished span to `path` as one OTLP JSON span per line.
+
+        Returns:
+            Number of spans written
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for s in self.spans:
+                f.write(json.dumps(s.to_otlp(), ensure_ascii=False) + "\n")
+        return len(self.spans)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per span name: call count, errors, latency (total, mean, p95) and counter totals."""
+        durations: Dict[str, List[float]] = {}
+        rows: Dict[str, Dict[str, Any]] = {}
+        for s in self.spans:
+            row = rows.setdefault(s.name, {"count": 0, "errors": 0, **{c: 0 for c in SUMMARY_COUNTERS}})
+            row["count"] += 1
+            row["errors"] += s.error is not None
+            for counter in SUMMARY_COUNTERS:
+                row[counter] += s.counters.get(counter, 0)
+            durations.setdefault(s.name, []).append(s.duration or 0.0)
+        for name, values in durations.items():
+            values.sort()
+            rows[name]["total_s"] = sum(values)
+            rows[name]["mean_s"] = sum(values) / len(values)
+            rows[name]["p95_s"] = values[min(len(values) - 1, math.ceil(0.95 * len(values)) - 1)]
+        return rows
+
+    def format_summary(self) -> str:
+        """Returns the summary as a table; counters of a span include those of the spans nested in it."""
+        headers = ["span", "count", "errors", "total s", "mean s", "p95 s", "prompt tok", "compl. tok",
+                   "bytes", "cache hits", "retries"]
+        table = [headers]
+        for name, row in sorted(self.summary().items(), key=lambda item: -item[1]["total_s"]):
+            table.append([name, str(row["count"]), str(row["errors"]), f"{row['total_s']:.2f}",
+                          f"{row['mean_s']:.2f}", f"{row['p95_s']:.2f}"]
+                         + [str(int(row[c])) for c in SUMMARY_COUNTERS])
+        widths = [max(len(line[i]) for line in table) for i in range(len(headers))]
+        return "\n".join(
+            "  ".join(cell.ljust(w) if i == 0 else cell.rjust(w) for i, (cell, w) in enumerate(zip(line, widths)))
+            for line in table
+        )
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    """Returns the process-wide tracer."""
+    return _tracer
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Times the block as a span named `name`, child of the current span.
+    An exception leaving the block marks the span as failed.
+    """
+    s = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        s.end()
+        _tracer.spans.append(s)
+
+def traced(name: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator running every call of an async function in a span named `name`."""
+    def decorator(function: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(function)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with span(name):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def add(counter: str, value: float = 1) -> None:
+    """Adds to a counter of the current span and its ancestors; a no-op outside spans."""
+    s = _current_span.get()
+    if s is not None:
+        s.add(counter, value)
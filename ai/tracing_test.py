@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from ai.tracing import add, get_tracer, span, traced
+
+class TracingTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        get_tracer().reset()
+
+    async def test_spans_nest_across_tasks(self):
+        @traced("child")
+        async def child():
+            add("prompt_tokens", 10)
+            await asyncio.sleep(0)
+
+        with span("root", query="q") as root:
+            await asyncio.gather(child(), child())
+        spans = get_tracer().spans
+        self.assertEqual([s.name for s in spans], ["child", "child", "root"])
+        self.assertTrue(all(s.parent is root for s in spans[:2]))
+        self.assertEqual(root.counters["prompt_tokens"], 20)
+        self.assertEqual(len({s.trace_id for s in spans}), 1)
+
+    def test_errors_are_recorded(self):
+        with self.assertRaises(ValueError):
+            with span("failing"):
+                raise ValueError("boom")
+        self.assertEqual(get_tracer().spans[0].error, "ValueError: boom")
+        self.assertEqual(get_tracer().summary()["failing"]["errors"], 1)
+
+    def test_add_outside_spans_is_ignored(self):
+        add("bytes", 100)
+        self.assertEqual(get_tracer().spans, [])
+
+    def test_summary_and_export(self):
+        for size in (100, 300):
+            with span("search"):
+                add("bytes", size)
+                add("cache_hits")
+        summary = get_tracer().summary()["search"]
+        self.assertEqual((summary["count"], summary["bytes"], summary["cache_hits"]), (2, 400, 2))
+        self.assertIn("search", get_tracer().format_summary())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.jsonl")
+            self.assertEqual(get_tracer().export_jsonl(path), 2)
+            with open(path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+        attributes = {a["key"]: a["value"] for a in records[0]["attributes"]}
+        self.assertEqual(attributes["bytes"], {"intValue": "100"})
+        self.assertEqual(records[0]["status"], {"code": 1})
+        self.assertEqual(len(records[0]["spanId"]), 16)
+        self.assertEqual(len(records[0]["traceId"]), 32)
+
+if __name__ == "__main__":
+    unittest.main()
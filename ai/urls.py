@@ -0,0 +1,103 @@
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track the visitor and never change the page.
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "ref_src", "_hsenc", "_hsmi",
+})
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str) -> str:
+    """
+    Returns a normal form of `url`, so that addresses of the same page compare equal.
+
+    Lower-cases the scheme and host, drops "www.", default ports, fragments,
+    tracking parameters (utm_* and the like) and trailing slashes, sorts the
+    remaining query parameters and treats http and https as the same page.
+    Strings that are not absolute http(s) URLs are returned stripped.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return url
+    host = parts.hostname.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if port is not None and port != _DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/")
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit(("https", host, path, query, ""))
+
+def canonical_url(metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Returns the canonical URL a page declares in its scraped metadata, if any."""
+    if not isinstance(metadata, dict):
+        return None
+    for key in ("canonicalUrl", "canonical", "ogUrl", "og:url"):
+        value = metadata.get(key)
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, str) and value.startswith(("http://", "https://")):
+            return value
+    return None
+
+class UrlRegistry:
+    """
+    Run-wide record of the pages whose content has been digested.
+
+    A page is identified by its normalised URL and, when known, its
+    canonical URL, so the same page reached under different addresses is
+    only sent to the LLM once.
+    """
+
+    def __init__(self) -> None:
+        self._owners: Dict[str, str] = {}
+
+        # Metrics
+        self.claimed = 0
+        self.duplicates = 0
+        self.skipped_bytes = 0
+
+    def owner(self, url: str, canonical: Optional[str] = None) -> Optional[str]:
+        """Returns the id of the node that digested this page, or None."""
+        for candidate in (url, canonical):
+            if candidate and normalize_url(candidate) in self._owners:
+                return self._owners[normalize_url(candidate)]
+        return None
+
+    def claim(self, url: str, owner: str, canonical: Optional[str] = None, size: int = 0) -> bool:
+        """
+        Claims a page for the node `owner`. `size` is the number of bytes the
+        page would have added to the prompt, counted when it is skipped.
+
+        Returns:
+            True if the page is new (or already owned by `owner`) and should be
+            digested, False if another node digested it already
+        """
+        current = self.owner(url, canonical)
+        if current is not None and current != owner:
+            self.duplicates += 1
+            self.skipped_bytes += size
+            return False
+        for candidate in (url, canonical):
+            if candidate:
+                self._owners.setdefault(normalize_url(candidate), owner)
+        if current is None:
+            self.claimed += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "claimed": self.claimed,
+            "duplicates": self.duplicates,
+            "skipped_bytes": self.skipped_bytes,
+        }
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import unittest
+from ai.urls import UrlRegistry, canonical_url, normalize_url
+
+class NormalizeUrlTest(unittest.TestCase):
+    def test_equivalent_addresses_normalise_equal(self):
+        expected = normalize_url("https://example.com/a/b?a=1&b=2")
+        self.assertEqual(normalize_url("HTTP://WWW.Example.com:80/a/b/?utm_source=x&b=2&a=1#top"), expected)
+        self.assertEqual(normalize_url("https://example.com/a/b?b=2&a=1&gclid=123"), expected)
+
+    def test_distinct_pages_stay_distinct(self):
+        self.assertNotEqual(normalize_url("https://example.com/a"), normalize_url("https://example.com/b"))
+        self.assertNotEqual(normalize_url("https://example.com/a?id=1"), normalize_url("https://example.com/a?id=2"))
+        self.assertNotEqual(normalize_url("https://example.com:8443/"), normalize_url("https://example.com/"))
+
+    def test_non_http_urls_are_kept(self):
+        self.assertEqual(normalize_url(" mailto:someone@example.com "), "mailto:someone@example.com")
+
+class UrlRegistryTest(unittest.TestCase):
+    def test_claims_each_page_once(self):
+        registry = UrlRegistry()
+        self.assertTrue(registry.claim("https://example.com/a", "0"))
+        self.assertTrue(registry.claim("https://example.com/a/", "0"))
+        self.assertFalse(registry.claim("https://www.example.com/a?utm_medium=x", "1", size=100))
+        self.assertEqual(registry.owner("http://example.com/a"), "0")
+        self.assertEqual(registry.stats(), {"claimed": 1, "duplicates": 1, "skipped_bytes": 100})
+
+    def test_canonical_links_match_other_addresses(self):
+        registry = UrlRegistry()
+        canonical = canonical_url({"ogUrl": "https://example.com/article"})
+        self.assertTrue(registry.claim("https://example.com/article?page=amp", "0", canonical))
+        self.assertFalse(registry.claim("https://example.com/article", "1"))
+        self.assertFalse(registry.claim("https://mirror.example.org/copy", "2", canonical))
+
+    def test_canonical_url_ignores_missing_metadata(self):
+        self.assertIsNone(canonical_url(None))
+        self.assertIsNone(canonical_url({"title": "No canonical"}))
+        self.assertEqual(canonical_url({"canonicalUrl": ["https://example.com/x"]}), "https://example.com/x")
+
+if __name__ == "__main__":
+    unittest.main()
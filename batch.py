@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Runs many research jobs from a JSON Lines file, without interaction.
+
+Each line is one job:
+
+    {"query": "...", "breadth": 4, "depth": 2, "answers": {"Follow-up question?": "Answer"}}
+
+Only "query" is required. "id" names the report file (default: the line
+number and the start of the query); "answers" are answers to follow-up
+questions, as an object or a list of {"question", "answer"} objects;
+"max_queries", "max_tokens" and "deadline" override the batch-wide budgets.
+
+Jobs run concurrently in one process and share one search and LLM
+scheduler, one Firecrawl connection pool, the OpenAI client, the rate
+limiters (OPENAI_RPM, OPENAI_TPM, FIRECRAWL_RPM...) and the caches. Each
+report is written to OUTPUT_DIR/<id>.md and every finished job is logged
+to OUTPUT_DIR/results.jsonl. A job checkpoints its research tree next to
+its report, so an interrupted batch continues where it stopped; jobs
+whose report already exists are skipped.
+
+Usage:
+    python batch.py jobs.jsonl [--output-dir reports] [--jobs 4]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dotenv import load_dotenv
+
+from deep_research import CONCURRENCY_LIMIT, LLM_CONCURRENCY_LIMIT, deep_research, write_final_report
+from feedback import combine_query
+from ai.firecrawl import FirecrawlApp
+from ai.providers import close_client, track_usage
+from ai.scheduler import ResearchScheduler
+from ai.tracing import get_tracer
+from checkpoint import ResearchCheckpoint
+from report_writer import needs_hierarchical_report, write_hierarchical_report
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv('.env.local')
+
+def job_id(index, job):
+    """File-safe name of a job: its "id", or its line number and the start of its query."""
+    if job.get("id"):
+        return re.sub(r"[^\w.-]+", "-", str(job["id"])).strip("-.")
+    slug = re.sub(r"[^a-z0-9]+", "-", job["query"].lower()).strip("-")[:40].rstrip("-")
+    return f"{index:04d}-{slug}" if slug else f"{index:04d}"
+
+def load_jobs(path):
+    """
+    Reads and validates the jobs of a JSON Lines file.
+
+    Raises:
+        ValueError: If a line is not a job object with a query, or two jobs have the same id
+    """
+    jobs, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from e
+            if not isinstance(job, dict) or not isinstance(job.get("query"), str) or not job["query"].strip():
+                raise ValueError(f"{path}:{line_number}: a job needs a non-empty \"query\"")
+            job = {"breadth": 4, "depth": 2, **job}
+            name = job_id(line_number, job)
+            if not name:
+                # The id would name the report ".md" and clash with other such ids.
+                raise ValueError(f"{path}:{line_number}: job id {job['id']!r} has no letters or digits")
+            job["id"] = name
+            if job["id"] in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate job id {job['id']}")
+            seen.add(job["id"])
+            jobs.append(job)
+    return jobs
+
+def research_query(job):
+    """The query researched for a job, including its answers to follow-up questions."""
+    answers = job.get("answers")
+    if not answers:
+        return job["query"]
+    if isinstance(answers, dict):
+        pairs = answers.items()
+    else:
+        pairs = [(answer.get("question", ""), answer.get("answer", "")) for answer in answers]
+    return combine_query(job["query"], pairs)
+
+async def run_job(job, args, scheduler, firecrawl):
+    """
+    Researches one job and writes its report.
+
+    Returns:
+        The job's line for results.jsonl
+    """
+    report_path = os.path.join(args.output_dir, f"{job['id']}.md")
+    checkpoint_path = os.path.join(args.output_dir, f"{job['id']}.checkpoint.jsonl")
+    query = research_query(job)
+    started = time.monotonic()
+    checkpoint = ResearchCheckpoint(checkpoint_path, resume=True)
+    if checkpoint.run is not None and (checkpoint.run["query"], checkpoint.run["breadth"], checkpoint.run["depth"]) \
+            != (query, job["breadth"], job["depth"]):
+        # The job was changed since it was interrupted: its research tree no longer applies.
+        checkpoint.close()
+        checkpoint = ResearchCheckpoint(checkpoint_path, resume=False)
+    try:
+        with track_usage() as usage:
+            result = await deep_research(
+                query=query, breadth=job["breadth"], depth=job["depth"], firecrawl=firecrawl,
+                scheduler=scheduler, checkpoint=checkpoint, strategy=args.strategy,
+                max_queries=job.get("max_queries", args.max_queries),
+                max_tokens=job.get("max_tokens", args.max_tokens),
+                deadline=job.get("deadline", args.deadline),
+                pipeline=args.pipeline, speculate=args.speculate,
+            )
+            learnings = result.get("learnings", [])
+            visited_urls = result.get("visitedUrls", [])
+            if not learnings:
+                # Failed searches and LLM calls only leave an empty result; keep the job to be retried.
+                raise RuntimeError("the research found no learnings")
+            # Reports are bounded separately, so they do not hold up the searches of other jobs.
+            async with scheduler.slot("report"):
+                if needs_hierarchical_report(learnings):
+                    report = await write_hierarchical_report(prompt=query, learnings=learnings,
+                                                             visited_urls=visited_urls,
+                                                             learning_sources=result.get("learningSources", {}))
+                else:
+                    report = await write_final_report(prompt=query, learnings=learnings, visited_urls=visited_urls)
+    finally:
+        checkpoint.close()
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(report)
+    # The report is written; the research tree is no longer needed to resume.
+    os.remove(checkpoint_path)
+    return {
+        "id": job["id"],
+        "status": "done",
+        "report": report_path,
+        "learnings": len(learnings),
+        "urls": len(visited_urls),
+        "tokens": usage.total_tokens,
+        "seconds": round(time.monotonic() - started, 2),
+    }
+
+async def main(args):
+    jobs = load_jobs(args.jobs_file)
+    os.makedirs(args.output_dir, exist_ok=True)
+    if not args.force:
+        done = [job for job in jobs if os.path.exists(os.path.join(args.output_dir, f"{job['id']}.md"))]
+        if done:
+            print(f"Skipping {len(done)} jobs whose report already exists (use --force to redo them)")
+            jobs = [job for job in jobs if job not in done]
+    if not jobs:
+        print("Nothing to do.")
+        return
+
+    api_key = os.getenv("FIRECRAWL_API_KEY")
+    if not api_key:
+        print("FIRECRAWL_API_KEY is not set.")
+        return
+
+    # One scheduler for all jobs bounds the total number of searches, LLM calls and reports in flight.
+    scheduler = ResearchScheduler(search_limit=args.search_concurrency, llm_limit=args.llm_concurrency,
+                                  limits={"report": args.report_concurrency})
+    running = asyncio.Semaphore(args.jobs)
+    results_path = os.path.join(args.output_dir, "results.jsonl")
+    finished = failed = 0
+    print(f"Running {len(jobs)} jobs, {args.jobs} at a time; reports go to {args.output_dir}/")
+
+    async def run(job):
+        nonlocal finished, failed
+        async with running:
+            try:
+                outcome = await run_job(job, args, scheduler, firecrawl)
+            except Exception as e:
+                logger.error("Job %s failed: %s", job["id"], e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                outcome = {"id": job["id"], "status": "failed", "error": f"{type(e).__name__}: {e}"}
+                failed += 1
+        finished += 1
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(outcome, ensure_ascii=False) + "\n")
+        if outcome["status"] == "done":
+            print(f"[{finished}/{len(jobs)}] {job['id']}: {outcome['learnings']} learnings, "
+                  f"{outcome['tokens']} tokens, {outcome['seconds']:.1f}s -> {outcome['report']}")
+        else:
+            print(f"[{finished}/{len(jobs)}] {job['id']} failed: {outcome['error']}")
+
+    started = time.monotonic()
+    get_tracer().reset()
+    try:
+        async with FirecrawlApp(api_key=api_key, api_url=os.getenv("FIRECRAWL_BASE_URL")) as firecrawl:
+            await asyncio.gather(*(run(job) for job in jobs))
+    finally:
+        await close_client()
+
+    print(f"\n{finished - failed} of {len(jobs)} jobs done, {failed} failed, in {time.monotonic() - started:.1f}s")
+    print(f"\nScheduler:\n{scheduler.format_metrics()}")
+    tracer = get_tracer()
+    print(f"\nWhere the time and tokens went:\n{tracer.format_summary()}")
+    if args.trace:
+        count = tracer.export_jsonl(args.trace)
+        print(f"Wrote {count} trace spans to {args.trace}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run research jobs from a JSON Lines file, writing one report each.")
+    parser.add_argument("jobs_file", help="JSON Lines file with one job per line")
+    parser.add_argument("--output-dir", default="reports",
+                        help="Directory the reports, checkpoints and results.jsonl are written to (default: reports)")
+    parser.add_argument("--jobs", type=int, default=4, help="Number of jobs researched at the same time (default: 4)")
+    parser.add_argument("--search-concurrency", type=int, default=CONCURRENCY_LIMIT,
+                        help=f"Searches in flight across all jobs (default: {CONCURRENCY_LIMIT})")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY_LIMIT,
+                        help=f"LLM calls in flight across all jobs (default: {LLM_CONCURRENCY_LIMIT})")
+    parser.add_argument("--report-concurrency", type=int, default=2,
+                        help="Reports written at the same time (default: 2)")
+    parser.add_argument("--force", action="store_true", help="Redo jobs whose report already exists")
+    parser.add_argument("--strategy", choices=["breadth_first", "best_first"], default="breadth_first",
+                        help="Order in which each research tree is explored (default: breadth_first)")
+    parser.add_argument("--max-queries", type=int, default=None, help="Default per-job limit on search queries")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Default per-job limit on LLM tokens")
+    parser.add_argument("--deadline", type=float, default=None, help="Default per-job research time limit in seconds")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Scrape search results one page at a time and extract learnings from each as it arrives")
+    parser.add_argument("--speculate", action="store_true",
+                        help="Generate and search follow-up queries as soon as each query finishes")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "WARNING").upper(),
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Level of the log messages written to stderr (default: WARNING, or LOG_LEVEL)")
+    parser.add_argument("--trace", default=None, metavar="PATH",
+                        help="Write a span per search, LLM and report call to PATH as OpenTelemetry JSON lines")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Third-party clients log every request at INFO.
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, logging.getLogger().level))
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Finished reports and checkpoints are in {args.output_dir}/; "
+              f"run the same command again to continue.")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+import batch
+from benchmarks.fake_server import FakeServer
+from benchmarks.research_e2e import SyntheticResponder
+from ai.replay import ReplayResponder
+
+JOBS = [
+    {"query": "Solar panel efficiency trends", "breadth": 2, "depth": 2},
+    {"id": "heat/pumps", "query": "Heat pumps in cold climates", "breadth": 2, "depth": 1,
+     "answers": {"Which region?": "The Nordics"}},
+]
+
+class LoadJobsTest(unittest.TestCase):
+    def load(self, *lines):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "jobs.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            return batch.load_jobs(path)
+
+    def test_ids(self):
+        jobs = self.load('{"query": "Heat pumps?"}', "", '{"id": "a/b c", "query": "q", "depth": 1}')
+        self.assertEqual([job["id"] for job in jobs], ["0001-heat-pumps", "a-b-c"])
+        self.assertEqual((jobs[0]["breadth"], jobs[0]["depth"], jobs[1]["depth"]), (4, 2, 1))
+
+    def test_rejects_ids_without_letters_or_digits(self):
+        for job_id in ("..", "--", "/"):
+            with self.assertRaisesRegex(ValueError, "jobs.jsonl:1: job id"):
+                self.load(json.dumps({"id": job_id, "query": "q"}))
+
+    def test_rejects_duplicates_and_jobs_without_query(self):
+        with self.assertRaisesRegex(ValueError, "duplicate job id a-b"):
+            self.load('{"id": "a b", "query": "q"}', '{"id": "a/b", "query": "q"}')
+        with self.assertRaisesRegex(ValueError, "non-empty"):
+            self.load('{"query": " "}')
+
+class BatchReplayTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.jobs_file = os.path.join(self.tmp.name, "jobs.jsonl")
+        with open(self.jobs_file, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(job) + "\n" for job in JOBS))
+        # Every call must reach the server to be recorded and replayed.
+        patcher = mock.patch.dict(os.environ, {"LLM_CACHE": "0", "FIRECRAWL_CACHE": "0", "RECORD_FIXTURES": ""})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def run_batch(self, responder, output_dir, *options):
+        async with FakeServer(latency=0.0, responder=responder) as server:
+            os.environ.update(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="test-key",
+                              FIRECRAWL_BASE_URL=server.base_url, FIRECRAWL_API_KEY="test-key")
+            with mock.patch.object(sys, "argv", ["batch.py", self.jobs_file, "--output-dir", output_dir, *options]):
+                args = batch.parse_args()
+            with redirect_stdout(io.StringIO()) as out:
+                await batch.main(args)
+        with open(os.path.join(output_dir, "results.jsonl"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f], out.getvalue()
+
+    async def test_batch_against_replayed_fixtures(self):
+        fixtures = os.path.join(self.tmp.name, "fixtures.jsonl")
+        os.environ["RECORD_FIXTURES"] = fixtures
+        await self.run_batch(SyntheticResponder(page_chars=500), os.path.join(self.tmp.name, "recorded"))
+        os.environ["RECORD_FIXTURES"] = ""
+
+        responder = ReplayResponder(fixtures)
+        output_dir = os.path.join(self.tmp.name, "replayed")
+        results, out = await self.run_batch(responder, output_dir, "--jobs", "2")
+
+        self.assertEqual(responder.stats()["misses"], 0)
+        self.assertEqual(sorted(result["id"] for result in results), ["0001-solar-panel-efficiency-trends",
+                                                                      "heat-pumps"])
+        for result in results:
+            self.assertEqual(result["status"], "done", result)
+            self.assertGreater(result["learnings"], 0)
+            with open(result["report"], encoding="utf-8") as f:
+                self.assertIn("# Report", f.read())
+            # The checkpoint of a finished job is removed.
+            self.assertFalse(os.path.exists(os.path.join(output_dir, f"{result['id']}.checkpoint.jsonl")))
+        self.assertIn("2 of 2 jobs done, 0 failed", out)
+
+        # Jobs whose report exists are skipped.
+        _, out = await self.run_batch(responder, output_dir)
+        self.assertIn("Skipping 2 jobs", out)
+
+if __name__ == '__main__':
+    unittest.main()
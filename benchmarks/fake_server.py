@@ -0,0 +1,171 @@
+import json
+import random
+import asyncio
+from collections import Counter
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Optional
+
+Responder = Callable[[str, Dict[str, Any]], Any]
+
+def default_responder(path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Answers every chat completion with an empty JSON object.
+    """
+    return chat_completion(body.get("model", "fake-model"), "{}")
+
+def chat_completion(model: str, content: str, prompt_tokens: int = 0, completion_tokens: int = 0) -> Dict[str, Any]:
+    """
+    Builds an OpenAI-compatible chat completion payload around `content`.
+    """
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+class FakeServer:
+    """
+    Minimal HTTP/1.1 JSON server with a configurable response latency.
+
+    It speaks just enough HTTP (keep-alive, Content-Length bodies, chunked
+    server-sent events for streamed completions) for the OpenAI and httpx
+    clients, so benchmarks can run without network access.
+
+    Every response is delayed by `latency` plus a random extra delay of up
+    to `jitter` seconds, drawn from a generator seeded with `seed` so runs
+    can be repeated.
+    """
+
+    def __init__(self, latency: float = 0.2, responder: Optional[Responder] = None,
+                 host: str = "127.0.0.1", port: int = 0, stream_delay: float = 0.0,
+                 jitter: float = 0.0, seed: Optional[int] = None) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_delay = stream_delay
+        self.responder = responder or default_responder
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.requests_by_path: Counter = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+        self._random = random.Random(seed)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def __aenter__(self) -> "FakeServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Clients may still hold keep-alive connections open; drop them.
+            for writer in list(self._connections):
+                writer.transport.abort()
+            await asyncio.sleep(0)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _stream_completion(self, writer: asyncio.StreamWriter, completion: Dict[str, Any]) -> None:
+        """
+        Sends a chat completion as server-sent events, one word per chunk,
+        using chunked transfer encoding and `stream_delay` between chunks.
+        """
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+        content = completion["choices"][0]["message"]["content"]
+        words = [w + " " for w in content.split(" ")]
+        words[-1] = words[-1][:-1]
+        events = []
+        for word in words:
+            events.append({"id": completion["id"], "object": "chat.completion.chunk", "created": 0,
+                           "model": completion["model"],
+                           "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]})
+        events.append({"id": completion["id"], "object": "chat.completion.chunk", "created": 0,
+                       "model": completion["model"], "choices": [], "usage": completion.get("usage")})
+        for event in events:
+            data = f"data: {json.dumps(event)}\n\n".encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            await writer.drain()
+            await asyncio.sleep(self.stream_delay)
+        done = b"data: [DONE]\n\n"
+        writer.write(f"{len(done):x}\r\n".encode("latin-1") + done + b"\r\n0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get("content-length", "0")))
+                body = json.loads(raw) if raw else {}
+
+                self.requests += 1
+                self.requests_by_path[path] += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter) if self.jitter
+                                        else self.latency)
+                    result = self.responder(path, body)
+                    if asyncio.iscoroutine(result):
+                        result = await result
+                finally:
+                    self.in_flight -= 1
+
+                # Responders return a payload, (status, payload) or (status, payload, headers).
+                status, extra_headers = 200, {}
+                if isinstance(result, tuple):
+                    status, result, *rest = result
+                    extra_headers = rest[0] if rest else {}
+                if status == 200 and body.get("stream") and "choices" in result:
+                    await self._stream_completion(writer, result)
+                    continue
+                payload = json.dumps(result).encode("utf-8")
+                head = "".join(f"{name}: {value}\r\n" for name, value in extra_headers.items())
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"{head}"
+                    f"Connection: keep-alive\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Measures how generate_object scales with concurrency.
+
+A local fake OpenAI-compatible server answers every request after a fixed
+latency. With a non-blocking client, wall time should track
+ceil(calls / concurrency) * latency rather than calls * latency.
+
+Usage:
+    python -m benchmarks.llm_concurrency [--calls 32] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+from benchmarks.fake_server import FakeServer
+
+async def run_batch(generate_object, calls: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_call(i: int):
+        async with semaphore:
+            return await generate_object(
+                model="fake-model",
+                system="You are a benchmark.",
+                prompt=f"Benchmark prompt {i}",
+                schema={"type": "object", "properties": {}},
+            )
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one_call(i) for i in range(calls)))
+    return time.perf_counter() - start
+
+async def main(calls: int, latency: float, levels: list) -> None:
+    async with FakeServer(latency=latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark-key")
+        # Each level repeats the same prompts, which the cache would answer.
+        os.environ["LLM_CACHE"] = "0"
+        from ai.providers import generate_object, close_client
+
+        print(f"{calls} calls, {latency:.3f}s simulated latency per call\n")
+        print(f"{'concurrency':>11}  {'wall (s)':>9}  {'ideal (s)':>9}  {'serial (s)':>10}  {'peak in-flight':>14}")
+        try:
+            for concurrency in levels:
+                server.max_in_flight = 0
+                wall = await run_batch(generate_object, calls, concurrency)
+                ideal = -(-calls // concurrency) * latency
+                print(f"{concurrency:>11}  {wall:>9.3f}  {ideal:>9.3f}  {calls * latency:>10.3f}  {server.max_in_flight:>14}")
+        finally:
+            await close_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.latency, args.concurrency))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for prompt trimming and report assembly on large inputs.
+
+trim_prompt and the Markdown conversion in write_final_report are compared
+with their previous string-concatenation versions (kept below as
+references) and checked to return the same text.
+
+Usage:
+    python -m pytest benchmarks/prompt_benchmark_test.py --benchmark-autosave
+    python -m pytest benchmarks/prompt_benchmark_test.py --benchmark-compare --benchmark-compare-fail=mean:25%
+"""
+import random
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ai.providers import trim_prompt
+from deep_research import _simple_report, _structured_report
+
+def reference_trim_prompt(prompt, max_length):
+    """The previous implementation: one += per sentence."""
+    if len(prompt) <= max_length:
+        return prompt
+    result = ""
+    for sentence in prompt.split('. '):
+        if len(result) + len(sentence) + 2 <= max_length:
+            result += sentence + ". "
+        else:
+            break
+    return result.strip() or prompt[:max_length]
+
+def reference_structured_report(obj, title_key):
+    """The previous implementation: one += per section, nested up to two levels."""
+    report = f"# {obj.get(title_key, 'Research Report')}\n\n"
+    if obj.get("introduction"):
+        report += f"## Introduction\n\n{obj['introduction']}\n\n"
+    for key, value in obj.items():
+        if key in (title_key, "introduction", "conclusion"):
+            continue
+        section_title = key.replace('_', ' ').title()
+        if isinstance(value, str):
+            report += f"## {section_title}\n\n{value}\n\n"
+        elif isinstance(value, dict):
+            report += f"## {section_title}\n\n"
+            for sub_key, sub_value in value.items():
+                sub_section_title = sub_key.replace('_', ' ').title()
+                if isinstance(sub_value, str):
+                    report += f"### {sub_section_title}\n\n{sub_value}\n\n"
+                elif isinstance(sub_value, dict):
+                    report += f"### {sub_section_title}\n\n"
+                    for sub_sub_key, sub_sub_value in sub_value.items():
+                        report += f"#### {sub_sub_key.replace('_', ' ').title()}\n\n{str(sub_sub_value)}\n\n"
+    if obj.get("conclusion"):
+        report += f"## Conclusion\n\n{obj['conclusion']}\n\n"
+    return report
+
+def reference_simple_report(formatted_learnings):
+    report = "# Research Report\n\n## Key Findings\n\n"
+    for learning in formatted_learnings:
+        report += f"{learning}\n\n"
+    return report
+
+def make_sentences(size, seed=0):
+    rng = random.Random(seed)
+    words = "research model latency cache token throughput data the of and".split()
+    parts, length = [], 0
+    while length < size:
+        part = " ".join(rng.choices(words, k=rng.randint(5, 25))) + ". "
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+@pytest.fixture(scope="module")
+def page():
+    return make_sentences(500_000)
+
+@pytest.fixture(scope="module")
+def report_object():
+    text = make_sentences(300, seed=1)
+    return {
+        "reportTitle": "Benchmark",
+        "introduction": text,
+        **{f"section_{i}": {f"topic_{j}": {f"detail_{k}": text for k in range(10)} for j in range(10)}
+           for i in range(30)},
+        "conclusion": text,
+    }
+
+@pytest.fixture(scope="module")
+def learnings():
+    return [make_sentences(200, seed=i) for i in range(20000)]
+
+@pytest.mark.parametrize("max_length", [25_000, 400_000])
+def test_trim_prompt(benchmark, page, max_length):
+    trimmed = benchmark(trim_prompt, page, max_length)
+    assert trimmed == reference_trim_prompt(page, max_length)
+
+@pytest.mark.parametrize("max_length", [25_000, 400_000])
+def test_reference_trim_prompt(benchmark, page, max_length):
+    benchmark.pedantic(reference_trim_prompt, args=(page, max_length), rounds=3)
+
+def test_structured_report(benchmark, report_object):
+    report = benchmark(_structured_report, report_object, "reportTitle")
+    assert report == reference_structured_report(report_object, "reportTitle")
+
+def test_reference_structured_report(benchmark, report_object):
+    benchmark.pedantic(reference_structured_report, args=(report_object, "reportTitle"), rounds=3)
+
+def test_simple_report(benchmark, learnings):
+    report = benchmark(_simple_report, learnings)
+    assert report == reference_simple_report(learnings)
+
+def test_reference_simple_report(benchmark, learnings):
+    benchmark.pedantic(reference_simple_report, args=(learnings,), rounds=3)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks of a research run and its report against the local
+FakeServer, at several breadth x depth settings.
+
+The wall time is tracked by pytest-benchmark; the peak memory and call
+counts of each setting are stored in the benchmark's extra_info, so saved
+runs can be compared offline.
+
+Usage:
+    python -m pytest benchmarks/research_benchmark_test.py --benchmark-autosave
+    python -m pytest benchmarks/research_benchmark_test.py --benchmark-compare --benchmark-compare-fail=mean:25%
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks.research_e2e import SyntheticResponder, run_research
+from deep_research import _expected_nodes
+
+SETTINGS = [(2, 1), (3, 2), (4, 2)]
+LATENCY = 0.02
+
+@pytest.mark.parametrize("breadth,depth", SETTINGS, ids=[f"{b}x{d}" for b, d in SETTINGS])
+@pytest.mark.parametrize("mode", ["default", "pipeline", "speculate"])
+def test_research(benchmark, breadth, depth, mode):
+    options = dict(responder=SyntheticResponder(), latency=LATENCY, jitter=LATENCY, seed=0,
+                   pipeline=mode == "pipeline", speculate=mode == "speculate")
+
+    result = benchmark.pedantic(lambda: asyncio.run(run_research(breadth, depth, **options)), rounds=3)
+    profile = asyncio.run(run_research(breadth, depth, memory=True, **options))
+    benchmark.extra_info.update({key: profile[key] for key in
+                                 ("peak_mb", "llm_calls", "searches", "scrapes", "requests", "learnings")})
+
+    # Every query node is searched once; in pipeline mode, result pages are scraped separately.
+    assert result["searches"] == _expected_nodes(breadth, depth)
+    assert result["learnings"] > 0
+    assert (result["scrapes"] > 0) == (mode == "pipeline")
+    assert profile["llm_calls"] == result["llm_calls"]
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of deep_research and the final report, fully offline.
+
+Each run starts a local FakeServer that stands in for both OpenAI and
+Firecrawl, researches a topic and writes the report, and measures the wall
+time, the peak Python memory (tracemalloc, in a separate run so tracing
+does not slow the timed ones) and the number of LLM, search and scrape
+calls, for several breadth x depth settings.
+
+Responses are synthetic by default: deterministic SERP queries, learnings
+and result pages of --page-chars characters. With --fixtures, responses
+recorded from a real run are replayed instead:
+
+    LLM_CACHE=0 FIRECRAWL_CACHE=0 RECORD_FIXTURES=fixtures.jsonl python run.py
+    python -m benchmarks.research_e2e --fixtures fixtures.jsonl --recorded-latency 1.0
+
+Usage:
+    python -m benchmarks.research_e2e [--settings 2x1 3x2 4x2] [--latency 0.05] [--jitter 0.05] [--repeat 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import time
+import tracemalloc
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from benchmarks.fake_server import FakeServer, chat_completion
+
+WORDS = ("research latency model token cache throughput result query page source data analysis "
+         "system network quantum energy market policy study report evidence method").split()
+
+class SyntheticResponder:
+    """
+    Deterministic stand-in for OpenAI and Firecrawl responses.
+
+    Every response is derived from a checksum of its request, so the same
+    run always gets the same queries, learnings and pages, while distinct
+    queries get distinct results.
+    """
+
+    def __init__(self, page_chars: int = 6000, learnings: int = 3) -> None:
+        self.page_chars = page_chars
+        self.learnings = learnings
+
+    def page(self, url: str) -> str:
+        rng = random.Random(zlib.crc32(url.encode("utf-8")))
+        parts, length = [], 0
+        while length < self.page_chars:
+            sentence = " ".join(rng.choices(WORDS, k=rng.randint(6, 20))).capitalize() + ". "
+            parts.append(sentence)
+            length += len(sentence)
+        return "".join(parts)
+
+    def completion(self, prompt: str) -> Dict[str, Any]:
+        seed = zlib.crc32(prompt.encode("utf-8"))
+        if "SERP queries" in prompt:
+            match = re.search(r"up to (\d+) unique SERP queries", prompt)
+            count = int(match.group(1)) if match else 3
+            return {"queries": [{"query": f"topic {seed % 100000} aspect {i}", "researchGoal": f"Goal {i}"}
+                                for i in range(count)]}
+        if "list of learnings" in prompt:
+            rng = random.Random(seed)
+            return {"learnings": [f"Finding {seed % 100000}-{i}: {' '.join(rng.sample(WORDS, 8))}."
+                                  for i in range(self.learnings)],
+                    "followUpQuestions": [f"Follow-up {seed % 1000}-{i}?" for i in range(2)]}
+        if "final report" in prompt:
+            return {"reportMarkdown": "# Report\n\n" + self.page(str(seed))[:2000]}
+        return {"questions": ["Which aspect matters most?"]}
+
+    def __call__(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        if path.endswith("/chat/completions"):
+            content = json.dumps(self.completion(body["messages"][-1]["content"]))
+            return chat_completion(body.get("model", "fake-model"), content, 1000, 200)
+        if path.endswith("/search"):
+            slug = re.sub(r"\W+", "-", body["query"]).strip("-")
+            items = [{"url": f"https://example.com/{slug}/{i}", "title": f"{body['query']} {i}"}
+                     for i in range(body.get("limit", 5))]
+            if body.get("scrapeOptions"):
+                for item in items:
+                    item["markdown"] = self.page(item["url"])
+            return {"success": True, "data": items}
+        if path.endswith("/scrape"):
+            return {"success": True, "data": {"markdown": self.page(body["url"]), "metadata": {}}}
+        return 404, {"success": False, "error": f"Unknown endpoint {path}"}
+
+@contextmanager
+def environ(**values: str) -> Iterator[None]:
+    """Sets environment variables for the duration of the block, then restores their previous values."""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def _count(server: FakeServer, endpoint: str) -> int:
+    return sum(count for path, count in server.requests_by_path.items() if path.endswith(endpoint))
+
+async def run_research(breadth: int, depth: int, responder: Any = None, latency: float = 0.05,
+                       jitter: float = 0.0, seed: Optional[int] = 0, pipeline: bool = False,
+                       speculate: bool = False, memory: bool = False) -> Dict[str, Any]:
+    """
+    Runs one research and report against a fresh FakeServer.
+
+    Returns:
+        Wall time, peak memory (with `memory`), call counts and result sizes
+    """
+    from deep_research import deep_research, write_final_report
+    from ai.providers import close_client
+    from ai.tracing import get_tracer
+
+    async with FakeServer(latency=latency, jitter=jitter, seed=seed,
+                          responder=responder or SyntheticResponder()) as server:
+        # Caches would answer repeated runs without any calls.
+        with environ(LLM_CACHE="0", FIRECRAWL_CACHE="0",
+                     OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="benchmark-key",
+                     FIRECRAWL_BASE_URL=server.base_url, FIRECRAWL_API_KEY="benchmark-key"):
+            get_tracer().reset()
+            if memory:
+                tracemalloc.start()
+            try:
+                started = time.perf_counter()
+                result = await deep_research("Benchmark topic", breadth, depth, pipeline=pipeline,
+                                             speculate=speculate)
+                report = await write_final_report("Benchmark topic", result["learnings"], result["visitedUrls"])
+                wall = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] if memory else None
+            finally:
+                if memory:
+                    tracemalloc.stop()
+                # The client is bound to this server and event loop.
+                await close_client()
+        return {
+            "wall_s": wall,
+            "peak_mb": peak / 2 ** 20 if peak is not None else None,
+            "llm_calls": _count(server, "/chat/completions"),
+            "searches": _count(server, "/search"),
+            "scrapes": _count(server, "/scrape"),
+            "requests": server.requests,
+            "learnings": len(result["learnings"]),
+            "urls": len(result["visitedUrls"]),
+            "report_chars": len(report),
+        }
+
+def parse_setting(text: str) -> tuple:
+    breadth, _, depth = text.lower().partition("x")
+    return int(breadth), int(depth)
+
+async def main(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    if args.fixtures:
+        from ai.replay import ReplayResponder
+        responder = ReplayResponder(args.fixtures, latency_scale=args.recorded_latency)
+        print(f"Replaying {len(responder)} fixtures from {args.fixtures}")
+    else:
+        responder = SyntheticResponder(page_chars=args.page_chars)
+    options = dict(responder=responder, latency=args.latency, jitter=args.jitter, seed=args.seed,
+                   pipeline=args.pipeline, speculate=args.speculate)
+
+    print(f"{'setting':>7}  {'median s':>8}  {'min s':>6}  {'peak MB':>7}  {'LLM':>4}  {'search':>6}  "
+          f"{'scrape':>6}  {'learnings':>9}  {'URLs':>4}")
+    rows = []
+    for breadth, depth in map(parse_setting, args.settings):
+        walls = [(await run_research(breadth, depth, **options))["wall_s"] for _ in range(args.repeat)]
+        row = await run_research(breadth, depth, memory=True, **options)
+        row.update(setting=f"{breadth}x{depth}", wall_s=statistics.median(walls), min_wall_s=min(walls))
+        rows.append(row)
+        print(f"{row['setting']:>7}  {row['wall_s']:>8.3f}  {row['min_wall_s']:>6.3f}  {row['peak_mb']:>7.1f}  "
+              f"{row['llm_calls']:>4}  {row['searches']:>6}  {row['scrapes']:>6}  {row['learnings']:>9}  "
+              f"{row['urls']:>4}")
+    if args.fixtures:
+        print(f"Fixture matches: {responder.stats()}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--settings", nargs="+", default=["2x1", "3x2", "4x2"],
+                        help="Breadth x depth settings to run (default: 2x1 3x2 4x2)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per setting (default: 3)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency of up to this many seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latency jitter")
+    parser.add_argument("--page-chars", type=int, default=6000, help="Size of the synthetic result pages")
+    parser.add_argument("--fixtures", default=None, help="Replay responses recorded with RECORD_FIXTURES")
+    parser.add_argument("--recorded-latency", type=float, default=None, metavar="SCALE",
+                        help="With --fixtures, also delay each response by its recorded latency times SCALE")
+    parser.add_argument("--pipeline", action="store_true", help="Research in pipelined search-then-scrape mode")
+    parser.add_argument("--speculate", action="store_true", help="Research with speculative expansion")
+    parser.add_argument("--json", default=None, metavar="PATH", help="Also write the results to PATH as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmarks RecursiveCharacterTextSplitter on multi-megabyte markdown.
+
+Compares the offset-based splitter with the previous list-based version
+(kept below as a reference) and checks both return the same chunks.
+
+Usage:
+    python -m pytest benchmarks/text_splitter_benchmark_test.py --benchmark-group-by=param:chunk_size
+"""
+import contextlib
+import io
+import random
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ai.text_splitter import RecursiveCharacterTextSplitter
+
+SEPARATORS = ['\n\n', '\n', '.', ',', '>', '<', ' ', '']
+
+def reference_split_text(text, chunk_size, chunk_overlap, separators=SEPARATORS):
+    """The previous implementation: list(text) for the empty separator and list.pop(0) merging."""
+    def merge_splits(splits, separator):
+        docs, current_doc, total = [], [], 0
+        for s in splits:
+            if total + len(s) >= chunk_size:
+                if total > chunk_size:
+                    print(f"Warning: Created a chunk of size {total}, which exceeds {chunk_size}")
+                if current_doc:
+                    merged = separator.join(current_doc).strip()
+                    if merged:
+                        docs.append(merged)
+                    while current_doc and (total > chunk_overlap or (total + len(s) > chunk_size and total > 0)):
+                        total -= len(current_doc.pop(0))
+            current_doc.append(s)
+            total += len(s)
+        merged = separator.join(current_doc).strip()
+        if merged:
+            docs.append(merged)
+        return docs
+
+    separator = next((sep for sep in separators if sep == "" or sep in text), separators[-1])
+    splits = text.split(separator) if separator else list(text)
+    final_chunks, good_splits = [], []
+    for s in splits:
+        if len(s) < chunk_size:
+            good_splits.append(s)
+        else:
+            if good_splits:
+                final_chunks.extend(merge_splits(good_splits, separator))
+                good_splits = []
+            final_chunks.extend(reference_split_text(s, chunk_size, chunk_overlap, separators))
+    if good_splits:
+        final_chunks.extend(merge_splits(good_splits, separator))
+    return final_chunks
+
+def make_markdown(size, seed=0):
+    """Scraped-page-like markdown: headings, paragraphs, lists and inline base64 images."""
+    rng = random.Random(seed)
+    words = "data model research the of and latency cache python token throughput benchmark".split()
+    parts, length = [], 0
+    while length < size:
+        r = rng.random()
+        if r < 0.05:
+            part = f"## Section {len(parts)}\n\n"
+        elif r < 0.12:
+            part = "".join(f"- {' '.join(rng.choices(words, k=8))}\n" for _ in range(5)) + "\n"
+        elif r < 0.14:
+            part = "![chart](data:image/png;base64," + "".join(rng.choices("ABCDEFabcdef0123456789+/", k=20000)) + ")\n\n"
+        else:
+            part = " ".join(rng.choices(words, k=rng.randint(30, 150))) + ".\n\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+@pytest.fixture(scope="module")
+def markdown():
+    return make_markdown(2_000_000)
+
+def quiet(split, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return split(*args)
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 200), (4000, 400)])
+def test_offset_splitter(benchmark, markdown, chunk_size, chunk_overlap):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = benchmark(quiet, splitter.split_text, markdown)
+    assert chunks == quiet(reference_split_text, markdown, chunk_size, chunk_overlap)
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 200), (4000, 400)])
+def test_reference_splitter(benchmark, markdown, chunk_size, chunk_overlap):
+    benchmark.pedantic(quiet, args=(reference_split_text, markdown, chunk_size, chunk_overlap), rounds=3)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import os
+import json
+from typing import Any, Dict, List, Optional
+
+class ResearchCheckpoint:
+    """
+    Append-only JSON Lines record of a research tree, used to resume runs.
+
+    The file holds three kinds of records:
+    - "run": the query, breadth and depth the run was started with
+    - "queries": the SERP queries generated under a parent node
+    - "node": a finished query node with its learnings, URLs and follow-up questions
+
+    Node ids are paths through the tree: the i-th query of the root is "i",
+    its j-th child is "i.j", and so on. Every record is flushed as soon as it
+    is written, so an interrupted run loses at most the nodes in flight.
+    """
+
+    def __init__(self, path: str, resume: bool = True) -> None:
+        """
+        Args:
+            path: Checkpoint file
+            resume: Load the existing file; otherwise start a new, empty checkpoint
+        """
+        self.path = path
+        self.run: Optional[Dict[str, Any]] = None
+        self._queries: Dict[str, List[Dict[str, Any]]] = {}
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+
+        if resume and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            # Only complete lines hold records.
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._load(record)
+            if end < len(data):
+                # A partially written last line from an interrupted run: drop it so
+                # the next record does not get appended to it.
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self, record: Dict[str, Any]) -> None:
+        kind = record.get("type")
+        if kind == "run":
+            self.run = record
+        elif kind == "queries":
+            self._queries[record["parent"]] = record["queries"]
+        elif kind == "node":
+            self._nodes[record["id"]] = record
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._load(record)
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    @property
+    def completed(self) -> int:
+        """Number of finished query nodes."""
+        return len(self._nodes)
+
+    def start(self, query: str, breadth: int, depth: int) -> None:
+        self._write({"type": "run", "query": query, "breadth": breadth, "depth": depth})
+
+    def queries(self, parent: str) -> Optional[List[Dict[str, Any]]]:
+        """SERP queries previously generated under `parent`, if any."""
+        return self._queries.get(parent)
+
+    def record_queries(self, parent: str, queries: List[Dict[str, Any]]) -> None:
+        self._write({"type": "queries", "parent": parent, "queries": queries})
+
+    def node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        """The finished node with this id, if any."""
+        return self._nodes.get(node_id)
+
+    def record_node(self, node_id: str, serp_query: Dict[str, Any], learnings: List[str],
+                    urls: List[str], follow_up_questions: List[str]) -> None:
+        self._write({
+            "type": "node",
+            "id": node_id,
+            "query": serp_query.get("query"),
+            "researchGoal": serp_query.get("researchGoal"),
+            "learnings": learnings,
+            "urls": urls,
+            "followUpQuestions": follow_up_questions,
+        })
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from unittest import mock
+import deep_research
+from checkpoint import ResearchCheckpoint
+
+class FakeFirecrawl:
+    """Search client answering every query with one page, failing queries in `failing`."""
+
+    cache = None
+    network_calls = 0
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.searches = []
+
+    async def search(self, query, **options):
+        self.searches.append(query)
+        if query in self.failing:
+            raise ConnectionError(f"search for {query} failed")
+        slug = query.replace(" ", "-")
+        return {"data": [{"url": f"https://example.com/{slug}", "markdown": f"All about {query}."}]}
+
+class ResearchCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "run", "checkpoint.jsonl")
+
+    def write_run(self):
+        checkpoint = ResearchCheckpoint(self.path)
+        checkpoint.start("solar power", 2, 2)
+        checkpoint.record_queries("", [{"query": "q0", "researchGoal": "g0"}, {"query": "q1", "researchGoal": "g1"}])
+        checkpoint.record_node("0", {"query": "q0", "researchGoal": "g0"}, ["Learning 0"],
+                               ["https://a.com"], ["Why?"])
+        checkpoint.close()
+
+    def test_reload(self):
+        self.write_run()
+        checkpoint = ResearchCheckpoint(self.path)
+        self.addCleanup(checkpoint.close)
+
+        self.assertEqual(checkpoint.run["query"], "solar power")
+        self.assertEqual([q["query"] for q in checkpoint.queries("")], ["q0", "q1"])
+        self.assertIsNone(checkpoint.queries("0"))
+        self.assertEqual(checkpoint.completed, 1)
+        self.assertEqual(checkpoint.node("0")["learnings"], ["Learning 0"])
+        self.assertEqual(checkpoint.node("0")["followUpQuestions"], ["Why?"])
+        self.assertIsNone(checkpoint.node("1"))
+
+    def test_without_resume_starts_over(self):
+        self.write_run()
+        checkpoint = ResearchCheckpoint(self.path, resume=False)
+        checkpoint.close()
+        checkpoint = ResearchCheckpoint(self.path)
+        self.addCleanup(checkpoint.close)
+        self.assertIsNone(checkpoint.run)
+        self.assertEqual(checkpoint.completed, 0)
+
+    def test_torn_last_line_is_ignored(self):
+        self.write_run()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"type": "node", "id": "1", "query": "q1", "lear')
+
+        checkpoint = ResearchCheckpoint(self.path)
+        self.assertEqual(checkpoint.completed, 1)
+        self.assertIsNone(checkpoint.node("1"))
+        # Records written after resuming are not lost to the torn line.
+        checkpoint.record_node("1", {"query": "q1", "researchGoal": "g1"}, ["Learning 1"], [], [])
+        checkpoint.close()
+
+        checkpoint = ResearchCheckpoint(self.path)
+        self.addCleanup(checkpoint.close)
+        self.assertEqual(checkpoint.completed, 2)
+        self.assertEqual(checkpoint.node("1")["learnings"], ["Learning 1"])
+
+class ResumeTest(unittest.IsolatedAsyncioTestCase):
+    async def generate_serp_queries(self, query, num_queries=3, learnings=None):
+        self.generated.append(query)
+        return [{"query": f"q{i}", "researchGoal": f"Goal {i}"} for i in range(num_queries)]
+
+    async def process_serp_result(self, query, result, num_learnings=3, num_follow_up_questions=3,
+                                  research_goal=""):
+        return {"learnings": [f"Learning of {query}"], "followUpQuestions": []}
+
+    async def research(self, checkpoint, firecrawl):
+        with mock.patch.object(deep_research, "generate_serp_queries", self.generate_serp_queries), \
+                mock.patch.object(deep_research, "process_serp_result", self.process_serp_result), \
+                mock.patch.object(deep_research, "LEARNING_SIMILARITY_THRESHOLD", None):
+            try:
+                return await deep_research.deep_research("solar power", 2, 1, firecrawl=firecrawl,
+                                                         checkpoint=checkpoint)
+            finally:
+                checkpoint.close()
+
+    async def test_resume_skips_completed_nodes(self):
+        self.generated = []
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "checkpoint.jsonl")
+            # The search of the second query fails: only the first node is recorded.
+            interrupted = FakeFirecrawl(failing={"q1"})
+            result = await self.research(ResearchCheckpoint(path), interrupted)
+            self.assertEqual(result["learnings"], ["Learning of q0"])
+
+            resumed = FakeFirecrawl()
+            checkpoint = ResearchCheckpoint(path)
+            self.assertEqual(checkpoint.completed, 1)
+            result = await self.research(checkpoint, resumed)
+
+        self.assertEqual(resumed.searches, ["q1"])
+        # The SERP queries of the root were reused from the checkpoint.
+        self.assertEqual(len(self.generated), 1)
+        self.assertEqual(sorted(result["learnings"]), ["Learning of q0", "Learning of q1"])
+        self.assertEqual(sorted(result["visitedUrls"]), ["https://example.com/q0", "https://example.com/q1"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,50 @@
 import asyncio
+import logging
 import math
 import os
-from ai.providers import o3_mini_model, trim_prompt, system_prompt, generate_object
+import sys
+import time
+from ai.providers import (o3_mini_model, trim_prompt, system_prompt, generate_object, stream_text,
+                          prompt_token_budget, JSON_INSTRUCTION)
+from ai.tokenizer import allocate_tokens, count_tokens
 from markdown_prompt import markdown_system_prompt
 from ai.firecrawl import FirecrawlApp
-
-# Increase this if you have higher API rate limits
+from ai.scheduler import ResearchScheduler
+from ai.cache import get_llm_cache
+from ai.urls import canonical_url
+from ai.retrieval import select_passages
+from ai.similarity import group_near_duplicates
+from ai import tracing
+from frontier import FrontierEngine, ResearchBudget, ResearchNode, ResearchStore
+
+logger = logging.getLogger(__name__)
+
+# Increase these if you have higher API rate limits.
+# They bound the whole run: all tree levels share the same slots.
 CONCURRENCY_LIMIT = 4
+LLM_CONCURRENCY_LIMIT = 8
+
+# Tokens of each page sent to the LLM (about 25,000 characters of English text).
+# A page may use more when the other pages of the search are shorter.
+MAX_CONTENT_TOKENS = 6000
+
+# Number of page chunks (about 400 tokens each) most relevant to the query that are
+# sent to the LLM per search; set to None to send each page's first MAX_CONTENT_TOKENS instead.
+PASSAGES_PER_QUERY = 12
+
+# Maximum number of learnings used to refine follow-up queries.
+SHARED_LEARNINGS_LIMIT = 50
+
+# Learnings at least this similar (TF-IDF cosine) are merged before the report; set to None to keep all.
+LEARNING_SIMILARITY_THRESHOLD = 0.8
+
+# Number of search results per query.
+SEARCH_LIMIT = 5
+
+# In pipelined mode, pages that take longer than this to scrape are dropped.
+SCRAPE_TIMEOUT_MS = 15000
 
+@tracing.traced("serp_queries")
 async def generate_serp_queries(query, num_queries=3, learnings=None):
     learnings = learnings or []
     prompt_text = (
@@ -41,33 +78,50 @@ async def generate_serp_queries(query, num_queries=3, learnings=None):
         }
     )
     queries = response.get("object", {}).get("queries", [])
-    print(f"Created {len(queries)} queries: {queries}")
+    logger.debug("Created %d queries: %s", len(queries), queries)
     return queries[:num_queries]
 
-async def process_serp_result(query, result, num_learnings=3, num_follow_up_questions=3):
+@tracing.traced("extract")
+async def process_serp_result(query, result, num_learnings=3, num_follow_up_questions=3, research_goal=""):
     # Safely extract and filter markdown content
-    contents = []
+    pages = []
     for item in result.get("data", []):
         if item and isinstance(item, dict) and "markdown" in item and item["markdown"]:
-            contents.append(trim_prompt(item["markdown"], 25000))
+            pages.append(item["markdown"])
 
-    print(f"Ran {query}, found {len(contents)} contents")
+    if PASSAGES_PER_QUERY is not None and pages:
+        # Only the passages most relevant to the query and research goal are sent.
+        excerpts = select_passages(pages, f"{query}\n{research_goal}", top_k=PASSAGES_PER_QUERY)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Selected %d of %d characters of relevant passages",
+                         sum(map(len, excerpts)), sum(map(len, pages)))
+        pages = excerpts
+
+    logger.debug("Ran %s, found %d contents", query, len(pages))
 
     # If no contents found, return empty learnings and followUpQuestions immediately.
-    if not contents:
-        print(f"No contents found for query {query}. Returning empty learnings and follow-up questions.")
+    if not pages:
+        logger.info("No contents found for query %s", query)
         return {"learnings": [], "followUpQuestions": []}
 
-    # Build the prompt from scraped contents (each wrapped in <content> tags)
-    contents_text = "\n".join([f"<content>\n{content}\n</content>" for content in contents])
-    prompt_text = (
+    instructions = (
         f"Given the following contents from a SERP search for the query <query>{query}</query>, generate a list of learnings from the contents. "
         f"Return a maximum of {num_learnings} learnings, but feel free to return less if the contents are clear. "
         f"Ensure each learning is unique and provide concise, detailed information. "
         f"Include any entities (such as people, places, companies, products) and any exact metrics, numbers, or dates mentioned.\n\n"
-        f"<contents>{contents_text}</contents>"
     )
 
+    # Share the token budget between the pages: short pages are sent whole and
+    # longer ones split what is left, so the prompt always fits the context window.
+    tags = "<contents></contents>" + "<content>\n\n</content>\n" * len(pages)
+    budget = min(prompt_token_budget(system_prompt(), instructions, tags), MAX_CONTENT_TOKENS * len(pages))
+    shares = allocate_tokens([count_tokens(page) for page in pages], budget)
+    contents = [trim_prompt(page, max_tokens=share) for page, share in zip(pages, shares)]
+
+    # Build the prompt from scraped contents (each wrapped in <content> tags)
+    contents_text = "\n".join([f"<content>\n{content}\n</content>" for content in contents])
+    prompt_text = f"{instructions}<contents>{contents_text}</contents>"
+
     response = await generate_object(
         model=o3_mini_model,
         system=system_prompt(),
@@ -88,59 +142,128 @@ async def process_serp_result(query, result, num_learnings=3, num_follow_up_ques
         }
     )
     learnings = response.get("object", {}).get("learnings", [])
-    print(f"Created {len(learnings)} learnings: {learnings}")
+    logger.debug("Created %d learnings: %s", len(learnings), learnings)
     return response.get("object", {})
 
-async def write_final_report(prompt, learnings, visited_urls):
-    print(f"Starting write_final_report with {len(learnings)} learnings and {len(visited_urls)} URLs")
-
-    # Prepare learnings string with each learning wrapped in tags.
+def format_learnings(learnings):
+    """
+    Formats learnings (strings or dictionaries) as Markdown strings for the report.
+    """
     # Handle both string and dictionary learnings
     formatted_learnings = []
+    debug = logger.isEnabledFor(logging.DEBUG)
     for i, learning in enumerate(learnings):
-        print(f"Processing learning {i+1}: {type(learning)}")
         if isinstance(learning, dict):
             # Extract the most important fields from the dictionary
             if 'title' in learning and ('details' in learning or 'description' in learning):
                 details = learning.get('details', learning.get('description', ''))
                 formatted_learning = f"**{learning['title']}**\n\n{details}"
                 formatted_learnings.append(formatted_learning)
-                print(f"  - Formatted dictionary learning with title: {learning['title']}")
+                if debug:
+                    logger.debug("Learning %d: formatted dictionary with title %s", i + 1, learning['title'])
             else:
                 # If the dictionary doesn't have the expected structure, convert it to a string
                 formatted_learnings.append(str(learning))
-                print(f"  - Converted dictionary to string: {str(learning)[:50]}...")
+                if debug:
+                    logger.debug("Learning %d: converted dictionary to string %s...", i + 1, str(learning)[:50])
         else:
             # If it's already a string, use it as is
             formatted_learnings.append(learning)
-            print(f"  - Using string learning: {learning[:50]}...")
+            if debug:
+                logger.debug("Learning %d: using string %s...", i + 1, learning[:50])
+    return formatted_learnings
+
+def format_source(index, url):
+    """
+    Formats one numbered entry of the Sources section, with the anchor citations link to.
+    """
+    return f"{index+1}. <a id=\"ref{index+1}\"></a>[{url}]({url})"
+
+def final_report_prompt(prompt, formatted_learnings, visited_urls, include_sources=True):
+    """
+    Builds the prompt for the final report.
+
+    With include_sources=False the model is told to leave out the Sources
+    section, which the caller appends itself.
+    """
+    # Create a numbered list of source URLs for reference with anchor IDs
+    sources_list = "\n".join([format_source(i, url) for i, url in enumerate(visited_urls)])
 
-    learnings_string = "\n\n".join([f"<learning>\n{learning}\n</learning>" for learning in formatted_learnings])
-    learnings_string = trim_prompt(learnings_string, 150000)
-    print(f"Formatted learnings string length: {len(learnings_string)}")
+    if include_sources:
+        sources_instruction = "Include a numbered Sources section at the end with all the URLs listed.\n\n"
+    else:
+        sources_instruction = "Do not write a Sources section; it is appended automatically after your report.\n\n"
+
+    def build(learnings_string):
+        return (
+            f"Given the following prompt from the user, write a final report on the topic using the learnings from research. "
+            f"Make it as detailed as possible, aim for 3 or more pages, include ALL the learnings from research. "
+            f"Format your response as a well-structured Markdown document with proper headings, lists, and formatting. "
+            f"{sources_instruction}"
+            f"When citing information in the text, use a LaTeX-like citation format by creating a markdown link with a reference number, like this: [[1]](#ref1), [[2]](#ref2), etc. "
+            f"Each citation should be a clickable link that jumps to the corresponding entry in the Sources section. "
+            f"When multiple pieces of information come from the same source, use the same citation number. "
+            f"Place citations at the end of sentences or paragraphs where the information is used.\n\n"
+            f"<prompt>{prompt}</prompt>\n\n"
+            f"Here are all the learnings from previous research:\n\n"
+            f"<learnings>\n{learnings_string}\n</learnings>\n\n"
+            f"Here are the source URLs to include in your report (numbered for citation):\n\n"
+            f"<sources>\n{sources_list}\n</sources>"
+        )
 
-    # Create a numbered list of source URLs for reference with anchor IDs
-    sources_list = "\n".join([f"{i+1}. <a id=\"ref{i+1}\"></a>[{url}]({url})" for i, url in enumerate(visited_urls)])
+    # Prepare learnings string with each learning wrapped in tags, trimmed to
+    # the tokens the rest of the prompt leaves in the context window.
+    learnings_string = "\n\n".join([f"<learning>\n{learning}\n</learning>" for learning in formatted_learnings])
+    budget = prompt_token_budget(markdown_system_prompt(), build(""), JSON_INSTRUCTION)
+    learnings_string = trim_prompt(learnings_string, max_tokens=budget)
+    logger.debug("Formatted learnings string length: %d", len(learnings_string))
+    return build(learnings_string)
+
+def _append_sections(parts, obj, skip=(), level=2, max_level=4):
+    """
+    Appends the fields of a report object to `parts` as Markdown sections,
+    nesting dictionaries as subsections down to heading level `max_level`.
+    """
+    for key, value in obj.items():
+        if key in skip:
+            continue
+        # Convert snake_case or camelCase to Title Case for section headers
+        section_title = key.replace('_', ' ').title()
+        heading = "#" * level
+        if isinstance(value, str):
+            parts.append(f"{heading} {section_title}\n\n{value}\n\n")
+        elif isinstance(value, dict) and level < max_level:
+            parts.append(f"{heading} {section_title}\n\n")
+            _append_sections(parts, value, level=level + 1, max_level=max_level)
+        elif level == 4:
+            # For any other type at the deepest level, convert to string
+            parts.append(f"{heading} {section_title}\n\n{str(value)}\n\n")
+
+def _structured_report(obj, title_key, max_level=4):
+    """Converts a report returned as an object (title, introduction, sections, conclusion) to Markdown."""
+    introduction = obj.get("introduction", "")
+    conclusion = obj.get("conclusion", "")
+    parts = [f"# {obj.get(title_key, 'Research Report')}\n\n"]
+    if introduction:
+        parts.append(f"## Introduction\n\n{introduction}\n\n")
+    _append_sections(parts, obj, skip=(title_key, "introduction", "conclusion"), max_level=max_level)
+    if conclusion:
+        parts.append(f"## Conclusion\n\n{conclusion}\n\n")
+    return "".join(parts)
+
+def _simple_report(formatted_learnings):
+    """Fallback report listing every learning under Key Findings."""
+    return "# Research Report\n\n## Key Findings\n\n" + "".join(f"{learning}\n\n" for learning in formatted_learnings)
+
+@tracing.traced("report")
+async def write_final_report(prompt, learnings, visited_urls):
+    logger.info("Writing final report from %d learnings and %d URLs", len(learnings), len(visited_urls))
 
-    prompt_text = (
-        f"Given the following prompt from the user, write a final report on the topic using the learnings from research. "
-        f"Make it as detailed as possible, aim for 3 or more pages, include ALL the learnings from research. "
-        f"Format your response as a well-structured Markdown document with proper headings, lists, and formatting. "
-        f"Include a numbered Sources section at the end with all the URLs listed.\n\n"
-        f"When citing information in the text, use a LaTeX-like citation format by creating a markdown link with a reference number, like this: [[1]](#ref1), [[2]](#ref2), etc. "
-        f"Each citation should be a clickable link that jumps to the corresponding entry in the Sources section. "
-        f"When multiple pieces of information come from the same source, use the same citation number. "
-        f"Place citations at the end of sentences or paragraphs where the information is used.\n\n"
-        f"<prompt>{prompt}</prompt>\n\n"
-        f"Here are all the learnings from previous research:\n\n"
-        f"<learnings>\n{learnings_string}\n</learnings>\n\n"
-        f"Here are the source URLs to include in your report (numbered for citation):\n\n"
-        f"<sources>\n{sources_list}\n</sources>"
-    )
-    print(f"Prompt text length: {len(prompt_text)}")
+    formatted_learnings = format_learnings(learnings)
+    prompt_text = final_report_prompt(prompt, formatted_learnings, visited_urls)
+    logger.debug("Prompt text length: %d", len(prompt_text))
 
     try:
-        print("Calling generate_object...")
         response = await generate_object(
             model=o3_mini_model,
             system=markdown_system_prompt(),
@@ -156,70 +279,30 @@ async def write_final_report(prompt, learnings, visited_urls):
                 "required": ["reportMarkdown"]
             }
         )
-        print(f"Response from generate_object: {response}")
+        logger.debug("Response from generate_object: %s", response)
 
         # Check if the response has the expected structure
         response_obj = response.get("object", {})
-        print(f"Response object keys: {list(response_obj.keys())}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response object keys: %s", list(response_obj.keys()))
 
         # Try to extract the report content from different possible structures
         report = ""
 
         # Check for content key (one format we're getting)
         if "content" in response_obj:
-            print("Found content in response, using as markdown")
+            logger.debug("Found content in response, using as markdown")
             report = response_obj.get("content", "")
         # Check for reportMarkdown key (our expected format)
         elif "reportMarkdown" in response_obj:
             report = response_obj.get("reportMarkdown", "")
         # Check if we have reportTitle (another format we're getting)
         elif "reportTitle" in response_obj:
-            print("Found reportTitle in response, converting to markdown")
-            title = response_obj.get("reportTitle", "Research Report")
-            introduction = response_obj.get("introduction", "")
-            conclusion = response_obj.get("conclusion", "")
-
-            # Start with the title
-            report = f"# {title}\n\n"
-
-            # Add introduction if present
-            if introduction:
-                report += f"## Introduction\n\n{introduction}\n\n"
-
-            # Process all other fields that might contain content
-            for key, value in response_obj.items():
-                if key not in ["reportTitle", "introduction", "conclusion"]:
-                    # Convert snake_case or camelCase to Title Case for section headers
-                    section_title = key.replace('_', ' ').title()
-
-                    if isinstance(value, str):
-                        # If it's a string, add it directly
-                        report += f"## {section_title}\n\n{value}\n\n"
-                    elif isinstance(value, dict):
-                        # If it's a dictionary, process each key as a subsection
-                        report += f"## {section_title}\n\n"
-                        for sub_key, sub_value in value.items():
-                            # Convert snake_case or camelCase to Title Case for subsection headers
-                            sub_section_title = sub_key.replace('_', ' ').title()
-                            if isinstance(sub_value, str):
-                                report += f"### {sub_section_title}\n\n{sub_value}\n\n"
-                            elif isinstance(sub_value, dict):
-                                # Handle nested dictionaries (up to 2 levels deep)
-                                report += f"### {sub_section_title}\n\n"
-                                for sub_sub_key, sub_sub_value in sub_value.items():
-                                    sub_sub_section_title = sub_sub_key.replace('_', ' ').title()
-                                    if isinstance(sub_sub_value, str):
-                                        report += f"#### {sub_sub_section_title}\n\n{sub_sub_value}\n\n"
-                                    else:
-                                        # For any other type, convert to string
-                                        report += f"#### {sub_sub_section_title}\n\n{str(sub_sub_value)}\n\n"
-
-            # Add conclusion if present
-            if conclusion:
-                report += f"## Conclusion\n\n{conclusion}\n\n"
+            logger.debug("Found reportTitle in response, converting to markdown")
+            report = _structured_report(response_obj, "reportTitle")
         # Check for final_report key (another format we're getting)
         elif "final_report" in response_obj:
-            print("Found final_report object in response, converting to markdown")
+            logger.debug("Found final_report object in response, converting to markdown")
             final_report_content = response_obj.get("final_report", "")
 
             # If final_report is a string, use it directly
@@ -227,266 +310,482 @@ async def write_final_report(prompt, learnings, visited_urls):
                 report = final_report_content
             # If final_report is an object, process it
             elif isinstance(final_report_content, dict):
-                report_obj = final_report_content
-                title = report_obj.get("title", "Research Report")
-                introduction = report_obj.get("introduction", "")
-                conclusion = report_obj.get("conclusion", "")
-
-                # Start with the title
-                report = f"# {title}\n\n"
-
-                # Add introduction if present
-                if introduction:
-                    report += f"## Introduction\n\n{introduction}\n\n"
-
-                # Process all other fields that might contain content
-                for key, value in report_obj.items():
-                    if key not in ["title", "introduction", "conclusion"]:
-                        # Convert snake_case or camelCase to Title Case for section headers
-                        section_title = key.replace('_', ' ').title()
-
-                        if isinstance(value, str):
-                            # If it's a string, add it directly
-                            report += f"## {section_title}\n\n{value}\n\n"
-                        elif isinstance(value, dict):
-                            # If it's a dictionary, process each key as a subsection
-                            report += f"## {section_title}\n\n"
-                            for sub_key, sub_value in value.items():
-                                # Convert snake_case or camelCase to Title Case for subsection headers
-                                sub_section_title = sub_key.replace('_', ' ').title()
-                                if isinstance(sub_value, str):
-                                    report += f"### {sub_section_title}\n\n{sub_value}\n\n"
-                                elif isinstance(sub_value, dict):
-                                    # Handle nested dictionaries (up to 2 levels deep)
-                                    report += f"### {sub_section_title}\n\n"
-                                    for sub_sub_key, sub_sub_value in sub_value.items():
-                                        sub_sub_section_title = sub_sub_key.replace('_', ' ').title()
-                                        if isinstance(sub_sub_value, str):
-                                            report += f"#### {sub_sub_section_title}\n\n{sub_sub_value}\n\n"
-                                        else:
-                                            # For any other type, convert to string
-                                            report += f"#### {sub_sub_section_title}\n\n{str(sub_sub_value)}\n\n"
-
-                # Add conclusion if present
-                if conclusion:
-                    report += f"## Conclusion\n\n{conclusion}\n\n"
+                report = _structured_report(final_report_content, "title")
             else:
                 # Fallback if final_report is neither string nor dict
                 report = "# Research Report\n\n"
         # Check for report key (another format we're getting)
         elif "report" in response_obj:
-            print("Found report object in response, converting to markdown")
+            logger.debug("Found report object in response, converting to markdown")
             report_content = response_obj.get("report", "")
 
             # If report is a string, use it directly
             if isinstance(report_content, str):
                 report = report_content
-            # If report is an object, process it
+            # If report is an object, process it (top-level text fields only)
             elif isinstance(report_content, dict):
-                report_obj = report_content
-                title = report_obj.get("title", "Research Report")
-                introduction = report_obj.get("introduction", "")
-                conclusion = report_obj.get("conclusion", "")
-
-                # Start with the title
-                report = f"# {title}\n\n"
-
-                # Add introduction if present
-                if introduction:
-                    report += f"## Introduction\n\n{introduction}\n\n"
-
-                # Process all other fields that might contain content
-                for key, value in report_obj.items():
-                    if key not in ["title", "introduction", "conclusion"] and isinstance(value, str):
-                        # Convert snake_case or camelCase to Title Case for section headers
-                        section_title = key.replace('_', ' ').title()
-                        report += f"## {section_title}\n\n{value}\n\n"
-
-                # Add conclusion if present
-                if conclusion:
-                    report += f"## Conclusion\n\n{conclusion}\n\n"
+                report = _structured_report(report_content, "title", max_level=2)
             else:
                 # Fallback if report is neither string nor dict
                 report = "# Research Report\n\n"
         # Check for sections key (one format we're getting)
         elif "sections" in response_obj:
-            print("Found sections in response, converting to markdown")
+            logger.debug("Found sections in response, converting to markdown")
             sections = response_obj.get("sections", [])
             title = response_obj.get("title", "Research Report")
             conclusion = response_obj.get("conclusion", "")
 
             # Convert sections to markdown
-            report = f"# {title}\n\n"
+            parts = [f"# {title}\n\n"]
             for section in sections:
                 section_title = section.get("section_title", "")
                 content = section.get("content", "")
-                report += f"## {section_title}\n\n{content}\n\n"
+                parts.append(f"## {section_title}\n\n{content}\n\n")
 
             if conclusion:
-                report += f"## Conclusion\n\n{conclusion}\n\n"
+                parts.append(f"## Conclusion\n\n{conclusion}\n\n")
+            report = "".join(parts)
         # Check for pages key (another format we're getting)
         elif "pages" in response_obj:
-            print("Found pages in response, converting to markdown")
+            logger.debug("Found pages in response, converting to markdown")
             pages = response_obj.get("pages", [])
             title = response_obj.get("title", "Research Report")
             introduction = response_obj.get("introduction", "")
             conclusion = response_obj.get("conclusion", "")
 
             # Convert pages to markdown
-            report = f"# {title}\n\n"
+            parts = [f"# {title}\n\n"]
 
             if introduction:
-                report += f"## Introduction\n\n{introduction}\n\n"
+                parts.append(f"## Introduction\n\n{introduction}\n\n")
 
             for page in pages:
                 page_number = page.get("pageNumber", "")
                 content = page.get("content", "")
-                report += f"## Page {page_number}\n\n{content}\n\n"
+                parts.append(f"## Page {page_number}\n\n{content}\n\n")
 
             if conclusion:
-                report += f"## Conclusion\n\n{conclusion}\n\n"
+                parts.append(f"## Conclusion\n\n{conclusion}\n\n")
+            report = "".join(parts)
 
-        print(f"Report length: {len(report)}")
+        logger.debug("Report length: %d", len(report))
 
         # If the report is still empty, generate a simple report directly
         if not report:
-            print("Report is empty, generating a simple report")
-            simple_report = "# Research Report\n\n"
-
-            # Add a Key Findings section with all learnings
-            simple_report += "## Key Findings\n\n"
-            for learning in formatted_learnings:
-                simple_report += f"{learning}\n\n"
-
-            report = simple_report
+            logger.warning("Report is empty, generating a simple report")
+            report = _simple_report(formatted_learnings)
 
         # Check if the report already has a Sources section
         if "## Sources" not in report:
             # Append visited URLs section with numbered references and anchor IDs
-            urls_section = "\n\n## Sources\n\n" + "\n".join([f"{i+1}. <a id=\"ref{i+1}\"></a>[{url}]({url})" for i, url in enumerate(visited_urls)])
+            urls_section = "\n\n## Sources\n\n" + "\n".join([format_source(i, url) for i, url in enumerate(visited_urls)])
             report += urls_section
 
         return report
     except Exception as e:
-        print(f"Error in write_final_report: {e}")
+        logger.error("Error in write_final_report: %s", e)
         # Generate a simple report as fallback
-        simple_report = "# Research Report\n\n"
-
-        # Add a Key Findings section with all learnings
-        simple_report += "## Key Findings\n\n"
-        for learning in formatted_learnings:
-            simple_report += f"{learning}\n\n"
+        simple_report = _simple_report(formatted_learnings)
 
         # Add Sources section with numbered references and anchor IDs
-        urls_section = "\n\n## Sources\n\n" + "\n".join([f"{i+1}. <a id=\"ref{i+1}\"></a>[{url}]({url})" for i, url in enumerate(visited_urls)])
+        urls_section = "\n\n## Sources\n\n" + "\n".join([format_source(i, url) for i, url in enumerate(visited_urls)])
         return simple_report + urls_section
 
-async def deep_research(query, breadth, depth, learnings=None, visited_urls=None):
+@tracing.traced("report")
+async def write_final_report_stream(prompt, learnings, visited_urls, output_path="output.md", echo=True):
+    """
+    Streams the final report to `output_path` (and stdout if `echo`) as it is generated.
+
+    The model writes Markdown directly instead of a JSON object, so tokens are
+    written as they arrive and never buffered as a whole report. The Sources
+    section is appended afterwards one entry at a time.
+
+    Returns:
+        Dictionary with the output path, bytes written, time to first byte and total time
+    """
+    logger.info("Streaming final report from %d learnings and %d URLs", len(learnings), len(visited_urls))
+
+    formatted_learnings = format_learnings(learnings)
+    prompt_text = final_report_prompt(prompt, formatted_learnings, visited_urls, include_sources=False)
+
+    start = time.perf_counter()
+    time_to_first_byte = None
+    written = 0
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        def emit(text):
+            nonlocal written
+            f.write(text)
+            f.flush()
+            if echo:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            written += len(text)
+
+        try:
+            async for delta in stream_text(model=o3_mini_model, system=markdown_system_prompt(), prompt=prompt_text):
+                if time_to_first_byte is None:
+                    time_to_first_byte = time.perf_counter() - start
+                emit(delta)
+        except Exception as e:
+            logger.error("Error in write_final_report_stream: %s", e)
+            if not written:
+                # Nothing was streamed: fall back to a simple report built from the learnings.
+                emit("# Research Report\n\n## Key Findings\n\n")
+                for learning in formatted_learnings:
+                    emit(f"{learning}\n\n")
+
+        emit("\n\n## Sources\n\n")
+        for i, url in enumerate(visited_urls):
+            emit(format_source(i, url) + "\n")
+
+    total_time = time.perf_counter() - start
+    if time_to_first_byte is not None:
+        logger.info("Report streamed: first byte after %.2fs, finished after %.2fs", time_to_first_byte, total_time)
+    return {
+        "path": output_path,
+        "bytes": written,
+        "timeToFirstByte": time_to_first_byte,
+        "totalTime": total_time,
+    }
+
+def merge_page_results(results, threshold=LEARNING_SIMILARITY_THRESHOLD):
+    """
+    Merges the learnings and follow-up questions extracted from single pages
+    of one search, in page order. Exact repeats are dropped and, unless
+    `threshold` is None, so are near duplicates of an earlier item.
+
+    Returns:
+        Dictionary with "learnings" and "followUpQuestions"
+    """
+    def merge(texts):
+        texts = list(dict.fromkeys(texts))
+        if threshold is None or len(texts) < 2:
+            return texts
+        return [texts[group[0]] for group in group_near_duplicates(texts, threshold)]
+
+    return {
+        "learnings": merge(_learning_text(l) for result in results for l in result.get("learnings", [])),
+        "followUpQuestions": merge(str(q) for result in results for q in result.get("followUpQuestions", [])),
+    }
+
+def _learning_text(learning):
+    """Converts a learning returned by the model (string or dictionary) to a string."""
+    if isinstance(learning, str):
+        return learning
+    if isinstance(learning, dict) and 'title' in learning and ('details' in learning or 'description' in learning):
+        details = learning.get('details', learning.get('description', ''))
+        return f"{learning['title']}: {details}"
+    return str(learning)
+
+def _expected_nodes(breadth, depth):
+    """Number of query nodes in a full research tree; each level halves the breadth."""
+    total, count = 0, breadth
+    for _ in range(depth):
+        total += count
+        breadth = math.ceil(breadth / 2)
+        count *= breadth
+    return total
+
+def _child_nodes(parent, serp_queries, breadth, depth):
+    nodes = []
+    for i, serp_query in enumerate(serp_queries):
+        nodes.append(ResearchNode(
+            id=f"{parent.id}.{i}" if parent is not None else str(i),
+            query=serp_query["query"],
+            research_goal=serp_query.get("researchGoal", ""),
+            breadth=breadth,
+            depth=depth,
+            level=parent.level + 1 if parent is not None else 0,
+            parent=parent.id if parent is not None else None,
+            score=parent.score if parent is not None else 1.0,
+        ))
+    return nodes
+
+@tracing.traced("research")
+async def deep_research(query, breadth, depth, learnings=None, visited_urls=None, firecrawl=None, scheduler=None,
+                        checkpoint=None, strategy="breadth_first", max_queries=None, max_tokens=None, deadline=None,
+                        pipeline=False, speculate=False, on_progress=None):
+    """
+    Researches `query`, returning the accumulated learnings and visited URLs.
+
+    The research tree is explored by a FrontierEngine: every query node lives
+    in one ResearchStore, so learnings and URLs are stored once and follow-up
+    queries see the results of sibling branches. The frontier is expanded
+    level by level ("breadth_first") or by node score ("best_first"), and
+    stops early once `max_queries`, `max_tokens` or the `deadline` (seconds)
+    is reached.
+
+    With `pipeline`, each search returns URLs only and every result page is
+    scraped separately and sent to the LLM as soon as it arrives; the
+    per-page learnings are merged afterwards. A slow page then no longer
+    holds up the others, at the cost of one LLM call per page.
+
+    With `speculate` (breadth-first only), follow-up queries of a node are
+    generated, and searched, as soon as the node finishes instead of once
+    the whole level has finished; they are then refined only with the
+    learnings known at that time.
+
+    `on_progress(percent)` is called whenever a query node finishes, with
+    the share of the expected number of queries done so far.
+
+    When a ResearchCheckpoint is given, every generated set of SERP queries and
+    every finished query node is recorded; nodes already in the checkpoint are
+    skipped, so an interrupted run continues with its unfinished frontier.
+    """
     learnings = learnings or []
     visited_urls = visited_urls or []
 
-    serp_queries = await generate_serp_queries(query, num_queries=breadth, learnings=learnings)
-
-    # Get API key and base URL from environment variables
-    api_key = os.getenv("FIRECRAWL_API_KEY")
-    api_url = os.getenv("FIRECRAWL_BASE_URL")
-
-    print(f"FireCrawl API Key: {api_key[:5]}...{api_key[-5:] if api_key else 'None'}")
-    print(f"FireCrawl Base URL: {api_url}")
-
-    if not api_key:
-        print("ERROR: FireCrawl API key is not set. Cannot perform search.")
-        return {"learnings": learnings, "visitedUrls": []}
-
-    try:
-        firecrawl = FirecrawlApp(api_key=api_key, api_url=api_url)
-        semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
-    except Exception as e:
-        print(f"ERROR: Failed to initialize FireCrawl API: {e}")
-        return {"learnings": learnings, "visitedUrls": []}
-
-    async def process_query(serp_query):
-        async with semaphore:
+    if scheduler is None:
+        # One scheduler per run bounds search and LLM concurrency across all tree levels.
+        scheduler = ResearchScheduler(search_limit=CONCURRENCY_LIMIT, llm_limit=LLM_CONCURRENCY_LIMIT)
+
+    owns_firecrawl = firecrawl is None
+    if owns_firecrawl:
+        # Create one FirecrawlApp (and its connection pool) for the whole run.
+        api_key = os.getenv("FIRECRAWL_API_KEY")
+        api_url = os.getenv("FIRECRAWL_BASE_URL")
+
+        logger.debug("FireCrawl base URL: %s", api_url)
+
+        if not api_key:
+            logger.error("FireCrawl API key is not set. Cannot perform search.")
+            return {"learnings": learnings, "visitedUrls": []}
+
+        try:
+            firecrawl = FirecrawlApp(api_key=api_key, api_url=api_url)
+        except Exception as e:
+            logger.error("Failed to initialize FireCrawl API: %s", e)
+            return {"learnings": learnings, "visitedUrls": []}
+
+    if checkpoint is not None:
+        if checkpoint.run is None:
+            checkpoint.start(query, breadth, depth)
+        elif checkpoint.completed:
+            logger.info("Resuming from checkpoint with %d completed queries", checkpoint.completed)
+
+    store = ResearchStore(learnings, visited_urls)
+
+    expected_nodes = _expected_nodes(breadth, depth)
+    if max_queries is not None:
+        expected_nodes = min(expected_nodes, max_queries)
+    finished_nodes = 0
+
+    def report_progress():
+        nonlocal finished_nodes
+        finished_nodes += 1
+        if on_progress is not None:
+            # The tree may come out smaller than expected, so 100% is only reported at the end.
+            on_progress(min(99, 100 * finished_nodes // max(1, expected_nodes)))
+
+    async def serp_queries_for(parent_id, prompt, num_queries, priority, node_learnings):
+        serp_queries = checkpoint.queries(parent_id) if checkpoint is not None else None
+        if serp_queries is None:
+            async with scheduler.slot("llm", priority=priority):
+                serp_queries = await generate_serp_queries(prompt, num_queries=num_queries, learnings=node_learnings)
+            if checkpoint is not None and serp_queries:
+                checkpoint.record_queries(parent_id, serp_queries)
+        return serp_queries
+
+    def accept_page(node, item):
+        """
+        Claims a scraped page for `node`. Pages another branch already
+        digested, and mirrors of them under other URLs, are not sent to the
+        LLM again.
+        """
+        # Fingerprint about as much of the page as would be sent (~4 characters per token).
+        content = (item.get("markdown") or "")[:MAX_CONTENT_TOKENS * 4]
+        if not content:
+            return True
+        if not store.registry.claim(item["url"], node.id, canonical_url(item.get("metadata")),
+                                    size=len(content.encode("utf-8"))):
+            logger.debug("Skipping already digested page: %s", item['url'])
+            return False
+        if (duplicate := store.content.add(item["url"], content)) is not None:
+            logger.debug("Skipping near-duplicate page: %s (same content as %s)", item['url'], duplicate)
+            return False
+        return True
+
+    async def extract(node, result, priority):
+        async with scheduler.slot("llm", priority=priority):
+            return await process_serp_result(node.query, result,
+                                             num_follow_up_questions=math.ceil(node.breadth / 2),
+                                             research_goal=node.research_goal)
+
+    async def search(node):
+        """Runs the search for a node; in pipelined mode, pages are scraped separately afterwards."""
+        async with scheduler.slot("search", priority=-node.depth):
+            with tracing.span("search", query=node.query):
+                if pipeline:
+                    return await firecrawl.search(node.query, timeout=15000, limit=SEARCH_LIMIT, scrape=False)
+                return await firecrawl.search(node.query, timeout=15000, limit=SEARCH_LIMIT,
+                                              scrapeOptions={"formats": ["markdown"]})
+
+    async def prefetch_node(node):
+        if checkpoint is not None and checkpoint.node(node.id) is not None:
+            return None
+        return await search(node)
+
+    async def search_results(node):
+        logger.debug("Searching for: %s", node.query)
+        if node.prefetch is not None:
+            try:
+                result = await node.prefetch
+                if result is not None:
+                    return result
+            except Exception as e:
+                logger.warning("Speculative search failed for '%s', searching again: %s", node.query, e)
+        return await search(node)
+
+    async def search_and_extract(node, priority):
+        """Searches with the pages scraped in the same call, then extracts learnings from all of them at once."""
+        result = await search_results(node)
+        logger.debug("Search result status: %s", result.get('status', 'unknown'))
+
+        data_items = [item for item in result.get("data", []) if item and isinstance(item, dict) and item.get("url")]
+        logger.debug("Found %d data items", len(data_items))
+        if not data_items:
+            logger.warning("No URLs found in search results for query: %s", node.query)
+
+        pages = [item for item in data_items if accept_page(node, item)]
+        new_urls = [item["url"] for item in pages]
+        logger.debug("Extracted %d new URLs: %s", len(new_urls), new_urls)
+        return new_urls, await extract(node, {**result, "data": pages}, priority)
+
+    async def search_then_scrape(node, priority):
+        """
+        Searches for URLs only, then scrapes each page and extracts its
+        learnings as soon as it arrives.
+
+        Returns:
+            The URLs of the digested pages and one extraction result per page
+        """
+        result = await search_results(node)
+        urls = list(dict.fromkeys(
+            item["url"] for item in result.get("data", []) if item and isinstance(item, dict) and item.get("url")
+        ))
+        logger.debug("Found %d URLs", len(urls))
+        if not urls:
+            logger.warning("No URLs found in search results for query: %s", node.query)
+
+        async def scrape_and_extract(url):
+            if store.registry.owner(url) not in (None, node.id):
+                # Known from another branch: skip it without scraping.
+                store.registry.claim(url, node.id)
+                logger.debug("Skipping already digested page: %s", url)
+                return None
             try:
-                print(f"Searching for: {serp_query['query']}")
-                result = await firecrawl.search(serp_query["query"], timeout=15000, limit=5, scrapeOptions={"formats": ["markdown"]})
-                print(f"Search result status: {result.get('status', 'unknown')}")
-
-                # Collect URLs from the search results.
-                data_items = result.get("data", [])
-                print(f"Found {len(data_items)} data items")
-
-                # Make sure we're extracting URLs correctly
-                new_urls = []
-                for item in data_items:
-                    if item and isinstance(item, dict) and "url" in item and item["url"]:
-                        new_urls.append(item["url"])
-
-                print(f"Extracted {len(new_urls)} URLs: {new_urls}")
-
-                if not new_urls:
-                    print(f"WARNING: No URLs found in search results for query: {serp_query['query']}")
-                    # Add a dummy URL for debugging purposes if needed
-                    # new_urls = [f"https://example.com/search?q={serp_query['query']}"]
-
-                new_breadth = math.ceil(breadth / 2)
-                new_depth = depth - 1
-
-                new_learnings_obj = await process_serp_result(serp_query["query"], result, num_follow_up_questions=new_breadth)
-
-                # Process learnings to ensure they are strings
-                new_learnings = new_learnings_obj.get("learnings", [])
-                processed_learnings = []
-
-                for learning in new_learnings:
-                    if isinstance(learning, str):
-                        processed_learnings.append(learning)
-                    elif isinstance(learning, dict):
-                        # Convert dictionary to string representation
-                        if 'title' in learning and ('details' in learning or 'description' in learning):
-                            details = learning.get('details', learning.get('description', ''))
-                            processed_learning = f"{learning['title']}: {details}"
-                        else:
-                            processed_learning = str(learning)
-                        processed_learnings.append(processed_learning)
-                    else:
-                        # For any other type, convert to string
-                        processed_learnings.append(str(learning))
-
-                all_learnings = learnings + processed_learnings
-                all_urls = visited_urls + new_urls
-
-                if new_depth > 0:
-                    print(f"Researching deeper, breadth: {new_breadth}, depth: {new_depth}")
-                    next_query = (
-                        f"Previous research goal: {serp_query['researchGoal']}\n"
-                        f"Follow-up research directions:" + "".join(f"\n{q}" for q in new_learnings_obj.get("followUpQuestions", []))
-                    )
-                    return await deep_research(next_query, new_breadth, new_depth, all_learnings, all_urls)
-                else:
-                    return {"learnings": all_learnings, "visitedUrls": all_urls}
+                async with scheduler.slot("search", priority=priority):
+                    with tracing.span("scrape", url=url):
+                        scraped = await firecrawl.scrape_url(url, {"formats": ["markdown"],
+                                                                   "timeout": SCRAPE_TIMEOUT_MS})
             except Exception as e:
-                print(f"ERROR: Failed to run query '{serp_query['query']}': {e}")
-                return {"learnings": [], "visitedUrls": []}
-
-    tasks = [process_query(q) for q in serp_queries]
-    results = await asyncio.gather(*tasks)
-    # Flatten the learnings and URLs
-    all_learnings = [l for r in results for l in r.get("learnings", [])]
-    all_urls = [u for r in results for u in r.get("visitedUrls", [])]
-
-    # Remove duplicates from URLs (which are hashable)
-    final_urls = list(set(all_urls))
-
-    # For learnings (which may be dictionaries and unhashable), we need a different approach
-    # If learnings are strings, we can use a set
-    if all_learnings and isinstance(all_learnings[0], str):
-        final_learnings = list(set(all_learnings))
+                logger.warning("Failed to scrape %s: %s", url, e)
+                return None
+            data = scraped.get("data") or {}
+            item = {"url": url, "markdown": data.get("markdown"), "metadata": data.get("metadata")}
+            if not accept_page(node, item):
+                return None
+            return url, await extract(node, {"data": [item]}, priority)
+
+        outcomes = await asyncio.gather(*(scrape_and_extract(url) for url in urls), return_exceptions=True)
+        digested = [outcome for outcome in outcomes if outcome and not isinstance(outcome, BaseException)]
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        for error in errors:
+            logger.warning("Failed to extract learnings for query '%s': %s", node.query, error)
+        if errors and not digested:
+            # Nothing was extracted: fail the node as a single failed extraction would.
+            raise errors[0]
+        new_urls = [url for url, _ in digested]
+        logger.debug("Extracted %d new URLs: %s", len(new_urls), new_urls)
+        return new_urls, [page_result for _, page_result in digested]
+
+    async def process_node(node):
+        with tracing.span("node", id=node.id, level=node.level, query=node.query, parent=node.parent):
+            try:
+                await run_node(node)
+            finally:
+                report_progress()
+
+    async def run_node(node):
+        # Shallower levels (more remaining depth) are scheduled first.
+        priority = -node.depth
+        done = checkpoint.node(node.id) if checkpoint is not None else None
+        if done is not None:
+            logger.debug("Skipping completed query from checkpoint: %s", node.query)
+            store.complete(node, done["learnings"], done["urls"], done["followUpQuestions"])
+            return
+
+        if pipeline:
+            new_urls, results = await search_then_scrape(node, priority)
+            merged = merge_page_results(results)
+        else:
+            new_urls, merged = await search_and_extract(node, priority)
+        processed_learnings = [_learning_text(learning) for learning in merged.get("learnings", [])]
+        follow_up_questions = merged.get("followUpQuestions", [])
+
+        # Nodes that produced nothing (e.g. a failed LLM call) are retried on resume.
+        if checkpoint is not None and (processed_learnings or follow_up_questions):
+            checkpoint.record_node(node.id, {"query": node.query, "researchGoal": node.research_goal},
+                                   processed_learnings, new_urls, follow_up_questions)
+        store.complete(node, processed_learnings, new_urls, follow_up_questions)
+
+    async def expand_node(node):
+        new_breadth = math.ceil(node.breadth / 2)
+        new_depth = node.depth - 1
+        logger.debug("Researching deeper, breadth: %d, depth: %d", new_breadth, new_depth)
+        next_query = (
+            f"Previous research goal: {node.research_goal}\n"
+            f"Follow-up research directions:" + "".join(f"\n{q}" for q in node.follow_up_questions)
+        )
+        with tracing.span("expand", id=node.id):
+            serp_queries = await serp_queries_for(node.id, next_query, new_breadth, -new_depth,
+                                                  store.learnings_for(node, SHARED_LEARNINGS_LIMIT))
+        return _child_nodes(node, serp_queries, new_breadth, new_depth)
+
+    engine = FrontierEngine(
+        store, process_node, expand_node, strategy=strategy,
+        budget=ResearchBudget(max_queries=max_queries, max_tokens=max_tokens, deadline=deadline),
+        speculate=speculate, prefetch_node=prefetch_node,
+    )
+
+    async def run():
+        serp_queries = await serp_queries_for("", query, breadth, -depth, store.learnings[-SHARED_LEARNINGS_LIMIT:])
+        await engine.run(_child_nodes(None, serp_queries, breadth, depth))
+
+    if owns_firecrawl:
+        async with firecrawl:
+            await run()
     else:
-        # If learnings are dictionaries, we need to keep them all for now
-        # A more sophisticated deduplication could be implemented if needed
-        final_learnings = all_learnings
-    return {"learnings": final_learnings, "visitedUrls": final_urls}
+        await run()
+
+    if on_progress is not None:
+        on_progress(100)
+
+    if LEARNING_SIMILARITY_THRESHOLD is not None:
+        before = len(store.learnings)
+        removed = store.merge_similar_learnings(LEARNING_SIMILARITY_THRESHOLD)
+        logger.info("Merged %d near-duplicate learnings (%d -> %d)", removed, before, len(store.learnings))
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Scheduler metrics:\n%s", scheduler.format_metrics())
+        if speculate:
+            logger.info("Speculation: %s", engine.speculation.format_metrics())
+        if firecrawl.cache is not None:
+            stats = firecrawl.cache.stats()
+            logger.info("Search cache: %d hits, %d misses, %d network calls",
+                        stats['hits'], stats['misses'], firecrawl.network_calls)
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            stats = llm_cache.stats()
+            logger.info("LLM cache: %d memory hits, %d disk hits, %d near-duplicate hits, %d misses",
+                        stats['memory_hits'], stats['disk_hits'], stats['near_hits'], stats['misses'])
+        urls, content = store.registry.stats(), store.content.stats()
+        skipped_bytes = urls["skipped_bytes"] + content["skipped_bytes"]
+        logger.info("Page deduplication: %d repeated URLs and %d near-duplicate pages skipped, "
+                    "saving %d bytes (~%d tokens) of LLM input",
+                    urls['duplicates'], content['duplicates'], skipped_bytes, skipped_bytes // 4)
+    return store.result()
 
 if __name__ == "__main__":
     # For debugging purposes
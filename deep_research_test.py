@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+import deep_research
+from ai.providers import close_client
+from benchmarks.fake_server import FakeServer, chat_completion
+from deep_research import merge_page_results, write_final_report_stream
+
+WORDS = ("solar wind hydro grid storage battery market policy demand supply price turbine panel "
+         "efficiency capacity output cost subsidy region growth").split()
+
+def page(url):
+    """Distinct text for every URL, so no page is dropped as a near duplicate of another."""
+    rng = random.Random(url)
+    return f"{url} | " + " ".join(rng.choice(WORDS) + str(rng.randint(0, 999)) for _ in range(60))
+
+class MergePageResultsTest(unittest.TestCase):
+    RESULTS = [
+        {"learnings": ["Acme shipped 1.2 million units in 2023, up 40% year over year.", "Grid storage doubled."],
+         "followUpQuestions": ["Which regions grew?"]},
+        {"learnings": ["Grid storage doubled.", "Acme shipped 1.2 million units in 2023, up 40 percent year over year."],
+         "followUpQuestions": ["Which regions grew?", "What drove demand?"]},
+        {"learnings": [{"title": "Prices", "details": "Panel prices fell."}]},
+    ]
+
+    def test_drops_exact_and_near_duplicates_in_page_order(self):
+        merged = merge_page_results(self.RESULTS, threshold=0.7)
+        self.assertEqual(merged["learnings"], ["Acme shipped 1.2 million units in 2023, up 40% year over year.",
+                                               "Grid storage doubled.", "Prices: Panel prices fell."])
+        self.assertEqual(merged["followUpQuestions"], ["Which regions grew?", "What drove demand?"])
+
+    def test_without_threshold_only_drops_exact_repeats(self):
+        merged = merge_page_results(self.RESULTS, threshold=None)
+        self.assertEqual(len(merged["learnings"]), 4)
+        self.assertEqual(merge_page_results([], threshold=0.7), {"learnings": [], "followUpQuestions": []})
+
+class FakeFirecrawl:
+    """
+    Search client for pipelined research: searches return `results[query]`
+    URLs after `delays[query]` seconds, and scraping a URL in `failing`
+    raises.
+    """
+
+    cache = None
+    network_calls = 0
+
+    def __init__(self, results, delays=None, failing=()):
+        self.results = results
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.scraped = []
+
+    async def search(self, query, **options):
+        await asyncio.sleep(self.delays.get(query, 0))
+        return {"data": [{"url": url} for url in self.results[query]]}
+
+    async def scrape_url(self, url, params=None):
+        self.scraped.append(url)
+        await asyncio.sleep(0.01)
+        if url in self.failing:
+            raise ConnectionError(f"could not scrape {url}")
+        return {"data": {"markdown": page(url), "metadata": {}}}
+
+class PipelineTest(unittest.IsolatedAsyncioTestCase):
+    async def generate_serp_queries(self, query, num_queries=3, learnings=None):
+        return [{"query": f"q{i}", "researchGoal": f"Goal {i}"} for i in range(num_queries)]
+
+    async def process_serp_result(self, query, result, num_learnings=3, num_follow_up_questions=3,
+                                  research_goal=""):
+        url = result["data"][0]["markdown"].split(" | ")[0]
+        if "bad" in url:
+            raise ValueError("the model returned invalid JSON")
+        return {"learnings": [f"Learning from {url}"], "followUpQuestions": []}
+
+    async def research(self, firecrawl, breadth):
+        with mock.patch.object(deep_research, "generate_serp_queries", self.generate_serp_queries), \
+                mock.patch.object(deep_research, "process_serp_result", self.process_serp_result), \
+                mock.patch.object(deep_research, "LEARNING_SIMILARITY_THRESHOLD", None):
+            return await deep_research.deep_research("Energy", breadth, 1, firecrawl=firecrawl, pipeline=True)
+
+    async def test_pages_owned_by_another_node_are_not_scraped(self):
+        firecrawl = FakeFirecrawl({"q0": ["https://a.com/shared", "https://a.com/0"],
+                                   "q1": ["https://a.com/shared", "https://a.com/1"]},
+                                  delays={"q1": 0.1})
+        result = await self.research(firecrawl, 2)
+
+        self.assertEqual(firecrawl.scraped.count("https://a.com/shared"), 1)
+        self.assertEqual(sorted(firecrawl.scraped), ["https://a.com/0", "https://a.com/1", "https://a.com/shared"])
+        self.assertEqual(sorted(result["learnings"]), ["Learning from https://a.com/0",
+                                                       "Learning from https://a.com/1",
+                                                       "Learning from https://a.com/shared"])
+
+    async def test_failed_pages_do_not_lose_the_others(self):
+        # One page cannot be scraped and the extraction of another fails.
+        firecrawl = FakeFirecrawl({"q0": ["https://a.com/down", "https://a.com/bad", "https://a.com/ok"]},
+                                  failing={"https://a.com/down"})
+        with self.assertLogs(level="WARNING") as logs:
+            result = await self.research(firecrawl, 1)
+
+        self.assertEqual(result["learnings"], ["Learning from https://a.com/ok"])
+        self.assertEqual(result["visitedUrls"], ["https://a.com/ok"])
+        self.assertFalse(any("Failed to run query" in line for line in logs.output))
+
+    async def test_node_fails_only_when_every_page_errors(self):
+        firecrawl = FakeFirecrawl({"q0": ["https://a.com/bad1", "https://a.com/bad2"]})
+        with self.assertLogs(level="ERROR") as logs:
+            result = await self.research(firecrawl, 1)
+
+        self.assertEqual(result["learnings"], [])
+        self.assertTrue(any("Failed to run query 'q0': the model returned invalid JSON" in line
+                            for line in logs.output))
+
+class StreamReportTest(unittest.IsolatedAsyncioTestCase):
+    URLS = ["https://a.com/solar", "https://b.com/wind"]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "output.md")
+
+    async def stream(self, responder):
+        async with FakeServer(latency=0.0, responder=responder) as server:
+            with mock.patch.dict(os.environ, {"OPENAI_BASE_URL": server.base_url, "OPENAI_API_KEY": "test-key",
+                                              "RECORD_FIXTURES": ""}):
+                try:
+                    result = await write_final_report_stream("Energy", ["Solar output rose.", "Wind grew."],
+                                                             self.URLS, output_path=self.path, echo=False)
+                finally:
+                    await close_client()
+        with open(self.path, encoding="utf-8") as f:
+            return result, f.read()
+
+    async def test_writes_the_streamed_report_then_the_sources(self):
+        result, report = await self.stream(
+            lambda path, body: chat_completion(body["model"], "# Energy\n\nSolar output rose [[1]](#ref1).", 50, 10))
+
+        self.assertEqual(report, "# Energy\n\nSolar output rose [[1]](#ref1).\n\n## Sources\n\n"
+                                 '1. <a id="ref1"></a>[https://a.com/solar](https://a.com/solar)\n'
+                                 '2. <a id="ref2"></a>[https://b.com/wind](https://b.com/wind)\n')
+        self.assertEqual(result["bytes"], len(report))
+        self.assertIsNotNone(result["timeToFirstByte"])
+        self.assertLessEqual(result["timeToFirstByte"], result["totalTime"])
+
+    async def test_failure_before_the_first_token_writes_the_key_findings(self):
+        # A client error is not retried, so the stream fails before any token arrives.
+        with self.assertLogs(level="ERROR"):
+            result, report = await self.stream(lambda path, body: (400, {"error": {"message": "bad request"}}))
+
+        self.assertTrue(report.startswith("# Research Report\n\n## Key Findings\n\n"))
+        self.assertIn("Solar output rose.", report)
+        self.assertIn("Wind grew.", report)
+        self.assertIn('\n\n## Sources\n\n1. <a id="ref1"></a>', report)
+        self.assertIsNone(result["timeToFirstByte"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import asyncio
 from ai.providers import o3_mini_model, system_prompt, generate_object
+from ai import tracing
 
+@tracing.traced("feedback")
 async def generate_feedback(query, num_questions=3):
     prompt_text = (
         f"Given the following query from the user, ask some follow up questions to clarify the research direction. "
@@ -24,5 +26,15 @@ async def generate_feedback(query, num_questions=3):
     questions = response.get("object", {}).get("questions", [])
     return questions[:num_questions]
 
+def combine_query(query, questions_and_answers):
+    """
+    Builds the research query from the user's query and their answers to the
+    follow-up questions, given as (question, answer) pairs.
+    """
+    combined_query = f"Initial Query: {query}\nFollow-up Questions and Answers:\n"
+    for question, answer in questions_and_answers:
+        combined_query += f"Q: {question}\nA: {answer}\n"
+    return combined_query
+
 if __name__ == "__main__":
     asyncio.run(generate_feedback("What is AI?"))
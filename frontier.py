@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+import time
+import heapq
+import logging
+import asyncio
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from ai.providers import track_usage
+from ai.urls import UrlRegistry, normalize_url
+from ai.similarity import NearDuplicateIndex, group_near_duplicates, tokenize, STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ResearchNode:
+    """One SERP query in the research tree."""
+    id: str
+    query: str
+    research_goal: str
+    breadth: int
+    depth: int
+    level: int = 0
+    parent: Optional[str] = None
+    score: float = 1.0
+    status: str = "pending"
+    learnings: List[str] = field(default_factory=list)
+    urls: List[str] = field(default_factory=list)
+    follow_up_questions: List[str] = field(default_factory=list)
+    tokens: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    # Search started speculatively for this node, before it was admitted.
+    prefetch: Optional[asyncio.Future] = field(default=None, repr=False, compare=False)
+
+class ResearchStore:
+    """
+    Single store for every node, learning and URL of a research run.
+
+    Each learning and URL is kept once, in discovery order, and shared by all
+    branches; nodes only hold their own results. URLs are compared in
+    normalised form, `registry` records which node digested each page and
+    `content` indexes page text to catch mirrors under other URLs.
+    """
+
+    def __init__(self, learnings: Optional[List[str]] = None, urls: Optional[List[str]] = None) -> None:
+        self.nodes: Dict[str, ResearchNode] = {}
+        self.learnings: List[str] = []
+        self.learning_sources: Dict[str, List[str]] = {}
+        self.urls: List[str] = []
+        self._url_set = set()
+        self.registry = UrlRegistry()
+        self.content = NearDuplicateIndex()
+        self.add_results(learnings or [], urls or [], sources=[])
+
+    def add_node(self, node: ResearchNode) -> None:
+        self.nodes[node.id] = node
+
+    def add_results(self, learnings: List[str], urls: List[str], sources: Optional[List[str]] = None) -> int:
+        """
+        Adds learnings and URLs, linking each learning to `sources` (default: `urls`).
+
+        Returns:
+            Number of URLs not seen before
+        """
+        sources = urls if sources is None else sources
+        new_urls = 0
+        for url in urls:
+            key = normalize_url(url)
+            if key not in self._url_set:
+                self._url_set.add(key)
+                self.urls.append(url)
+                new_urls += 1
+        for learning in learnings:
+            if learning not in self.learning_sources:
+                self.learnings.append(learning)
+                self.learning_sources[learning] = []
+            known = self.learning_sources[learning]
+            known.extend(url for url in sources if url not in known)
+        return new_urls
+
+    def complete(self, node: ResearchNode, learnings: List[str], urls: List[str],
+                 follow_up_questions: List[str]) -> None:
+        """Records the results of a finished node and scores its children for best-first search."""
+        node.learnings = learnings
+        node.urls = urls
+        node.follow_up_questions = follow_up_questions
+        for url in urls:
+            self.registry.claim(url, node.id)
+        new_urls = self.add_results(learnings, urls)
+        # Branches that keep finding new pages are explored first.
+        node.score = (new_urls / len(urls) if urls else 0.0) + (1.0 if learnings else 0.0)
+        node.status = "done"
+
+    def merge_similar_learnings(self, threshold: float) -> int:
+        """
+        Merges paraphrased learnings: each group of learnings with TF-IDF
+        cosine similarity of at least `threshold` is replaced by its richest
+        variant (most distinct terms, then longest), which inherits the source
+        URLs of the whole group. Node results are left unchanged.
+
+        Returns:
+            Number of learnings removed
+        """
+        def richness(learning: str):
+            return len({t for t in tokenize(learning) if t not in STOPWORDS}), len(learning)
+
+        order = sorted(range(len(self.learnings)), key=lambda i: richness(self.learnings[i]), reverse=True)
+        groups = group_near_duplicates(self.learnings, threshold, order=order)
+        kept = {}
+        for group in groups:
+            representative = self.learnings[group[0]]
+            sources: List[str] = []
+            for i in sorted(group):
+                sources.extend(url for url in self.learning_sources[self.learnings[i]] if url not in sources)
+            kept[min(group)] = (representative, sources)
+        removed = len(self.learnings) - len(kept)
+        # Each merged learning takes the place of the group's first discovered variant.
+        self.learnings = [kept[i][0] for i in sorted(kept)]
+        self.learning_sources = {learning: sources for learning, sources in (kept[i] for i in sorted(kept))}
+        return removed
+
+    def learnings_for(self, node: ResearchNode, limit: int) -> List[str]:
+        """
+        Learnings to condition a node's follow-up queries on: the node's own
+        branch first, then the most recent learnings from other branches.
+        """
+        branch: List[str] = []
+        current: Optional[ResearchNode] = node
+        while current is not None:
+            branch = current.learnings + branch
+            current = self.nodes.get(current.parent) if current.parent else None
+        selected = list(dict.fromkeys(branch))[-limit:]
+        chosen = set(selected)
+        others = [l for l in reversed(self.learnings) if l not in chosen][:limit - len(selected)]
+        return list(reversed(others)) + selected
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "learnings": list(self.learnings),
+            "visitedUrls": list(self.urls),
+            "learningSources": {l: list(urls) for l, urls in self.learning_sources.items()},
+        }
+
+class ResearchBudget:
+    """
+    Global limits for a research run. None means unlimited.
+
+    Args:
+        max_queries: Maximum number of query nodes to process
+        max_tokens: Maximum number of LLM tokens (prompt + completion)
+        deadline: Wall-clock limit in seconds from the start of the run
+    """
+
+    def __init__(self, max_queries: Optional[int] = None, max_tokens: Optional[int] = None,
+                 deadline: Optional[float] = None) -> None:
+        self.max_queries = max_queries
+        self.max_tokens = max_tokens
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.queries = 0
+        self.tokens = 0
+
+    def remaining_time(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.started + self.deadline - time.monotonic())
+
+    def exhausted(self) -> Optional[str]:
+        """Returns the name of the exhausted budget, or None."""
+        if self.max_queries is not None and self.queries >= self.max_queries:
+            return "max_queries"
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            return "max_tokens"
+        if self.deadline is not None and self.remaining_time() <= 0:
+            return "deadline"
+        return None
+
+class SpeculationStats:
+    """
+    Outcome of speculative expansion: follow-up queries generated, and their
+    searches started, before the level barrier.
+    """
+
+    def __init__(self) -> None:
+        self.expansions = 0
+        self.prefetches = 0
+        self.used = 0
+        self.cancelled = 0
+        self.wasted_tokens = 0
+        self.saved_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "expansions": self.expansions,
+            "prefetches": self.prefetches,
+            "used": self.used,
+            "cancelled": self.cancelled,
+            "wasted_tokens": self.wasted_tokens,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def format_metrics(self) -> str:
+        """Returns the metrics as a short human-readable summary."""
+        return (
+            f"{self.expansions} expansions and {self.prefetches} searches started early, "
+            f"{self.used} prefetched searches used, {self.cancelled} tasks cancelled; "
+            f"at least ~{self.saved_seconds:.2f}s of wall-clock time saved, {self.wasted_tokens} tokens wasted"
+        )
+
+class FrontierEngine:
+    """
+    Explicit work-queue engine that expands the research tree.
+
+    `process_node(node)` runs the searches and extraction for one node and
+    records its results in the store; `expand_node(node)` returns the child
+    nodes generated from its follow-up questions. With the "breadth_first"
+    strategy, each level is processed in full before any node of it is
+    expanded, so follow-up queries see every learning of the level. With
+    "best_first", nodes are taken from a priority queue by score as soon as
+    there is room, without level barriers.
+
+    When a budget runs out, no new nodes are started; at the deadline,
+    in-flight nodes are cancelled and left unfinished.
+
+    With `speculate` (breadth-first only; best-first already expands each
+    node as soon as it finishes), a node is expanded as soon as it finishes
+    instead of at the level barrier, from the learnings known at that time,
+    and `prefetch_node(child)` is started for each child so its search runs
+    while the rest of the level is still busy. The prefetch task is left in
+    `child.prefetch` for `process_node` to await. Speculative work for
+    children that are never run (budget exhausted, deadline) is cancelled;
+    `speculation` records the estimated time saved and the tokens wasted.
+    """
+
+    STRATEGIES = ("breadth_first", "best_first")
+
+    def __init__(self, store: ResearchStore,
+                 process_node: Callable[[ResearchNode], Awaitable[None]],
+                 expand_node: Callable[[ResearchNode], Awaitable[List[ResearchNode]]],
+                 strategy: str = "breadth_first", budget: Optional[ResearchBudget] = None,
+                 max_active_nodes: int = 16, speculate: bool = False,
+                 prefetch_node: Optional[Callable[[ResearchNode], Awaitable[Any]]] = None) -> None:
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {self.STRATEGIES}")
+        self.store = store
+        self.process_node = process_node
+        self.expand_node = expand_node
+        self.strategy = strategy
+        self.budget = budget or ResearchBudget()
+        self.max_active_nodes = max_active_nodes
+        self.speculate = speculate
+        self.prefetch_node = prefetch_node
+        self.speculation = SpeculationStats()
+        self.stop_reason: Optional[str] = None
+        # Per parent: tokens and duration of its speculative expansion.
+        self._expansions: Dict[str, Any] = {}
+        # Per child: start and end of its speculative search.
+        self._prefetch_times: Dict[str, Any] = {}
+        # Every prefetch task started, so none is left running after the run.
+        self._prefetches: List[asyncio.Future] = []
+
+    async def run(self, nodes: List[ResearchNode]) -> None:
+        """Explores the tree below the given nodes until it is exhausted or a budget runs out."""
+        with track_usage() as usage:
+            self._usage = usage
+            try:
+                if self.strategy == "breadth_first":
+                    await self._run_breadth_first(nodes)
+                else:
+                    await self._run_best_first(nodes)
+            finally:
+                # Prefetches of nodes that never ran are still searching.
+                await self._cancel(self._prefetches)
+                self._prefetches = []
+        if self.stop_reason:
+            logger.warning("Research stopped early: %s budget exhausted", self.stop_reason)
+
+    def _check_budget(self) -> bool:
+        self.budget.tokens = self._usage.total_tokens
+        reason = self.budget.exhausted()
+        if reason and not self.stop_reason:
+            self.stop_reason = reason
+        return reason is None
+
+    async def _process(self, node: ResearchNode) -> bool:
+        node.status = "running"
+        node.started = time.monotonic()
+        try:
+            with track_usage() as usage:
+                await self.process_node(node)
+            node.tokens = usage.total_tokens
+            return node.status == "done"
+        except asyncio.CancelledError:
+            node.status = "cancelled"
+            raise
+        except Exception as e:
+            logger.error("Failed to run query '%s': %s", node.query, e)
+            node.status = "failed"
+            return False
+        finally:
+            node.finished = time.monotonic()
+
+    async def _expand(self, node: ResearchNode) -> List[ResearchNode]:
+        if node.depth <= 1 or not self._check_budget():
+            return []
+        try:
+            children = await self.expand_node(node)
+        except Exception as e:
+            logger.error("Failed to expand query '%s': %s", node.query, e)
+            return []
+        for child in children:
+            self.store.add_node(child)
+        return children
+
+    def _admit(self, node: ResearchNode) -> bool:
+        if not self._check_budget():
+            return False
+        self.budget.queries += 1
+        self.store.add_node(node)
+        return True
+
+    async def _gather_until_deadline(self, coroutines: List[Awaitable[Any]]) -> List[Any]:
+        tasks = [asyncio.ensure_future(c) for c in coroutines]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=self.budget.remaining_time())
+        if pending:
+            self.stop_reason = self.stop_reason or "deadline"
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        return [t.result() if t in done and not t.cancelled() else None for t in tasks]
+
+    async def _speculate(self, node: ResearchNode) -> List[ResearchNode]:
+        self.speculation.expansions += 1
+        started = time.monotonic()
+        with track_usage() as usage:
+            try:
+                children = await self._expand(node)
+            finally:
+                self._expansions[node.id] = (usage.total_tokens, time.monotonic() - started)
+        if self.prefetch_node is not None:
+            for child in children:
+                self._prefetch(child)
+        return children
+
+    def _prefetch(self, node: ResearchNode) -> None:
+        started = time.monotonic()
+
+        async def run() -> Any:
+            try:
+                return await self.prefetch_node(node)
+            finally:
+                self._prefetch_times[node.id] = (started, time.monotonic())
+
+        self.speculation.prefetches += 1
+        node.prefetch = asyncio.ensure_future(run())
+        self._prefetches.append(node.prefetch)
+
+    async def _cancel(self, tasks: List[asyncio.Future]) -> None:
+        """Cancels speculative tasks that are still running and waits for them."""
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        self.speculation.cancelled += len(pending)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _discard(self, dropped: List[ResearchNode], admitted: List[ResearchNode],
+                       speculated: List[str]) -> None:
+        """
+        Cancels the prefetched searches of `dropped` nodes, which will not run,
+        and counts the tokens of speculative expansions none of whose children
+        were admitted as wasted.
+        """
+        await self._cancel([node.prefetch for node in dropped if node.prefetch is not None])
+        for node in dropped:
+            node.prefetch = None
+        used_parents = {node.parent for node in admitted}
+        for parent in speculated:
+            if parent not in used_parents:
+                self.speculation.wasted_tokens += self._expansions[parent][0]
+
+    def _record_saving(self, nodes: List[ResearchNode], expand_time: float, waited: float) -> None:
+        """
+        Estimates the wall-clock time speculation saved on a level: without it,
+        each node would have started after the slowest expansion and then run
+        its whole search; with it, the node started after `waited` seconds and
+        only waited for what was left of its prefetched search. Queueing for
+        search slots, which speculation also spreads out, is not modelled,
+        so this underestimates the saving.
+        """
+        before, after = [], []
+        for node in nodes:
+            if node.started is None:
+                continue
+            search, remaining = 0.0, 0.0
+            times = self._prefetch_times.get(node.id)
+            prefetch = node.prefetch
+            if times and prefetch is not None and prefetch.done() and not prefetch.cancelled() \
+                    and prefetch.exception() is None:
+                search = times[1] - times[0]
+                remaining = max(0.0, times[1] - node.started)
+                self.speculation.used += 1
+            # The search results are no longer needed.
+            node.prefetch = None
+            before.append(expand_time + search)
+            after.append(waited + remaining)
+        if before:
+            self.speculation.saved_seconds += max(0.0, max(before) - max(after))
+
+    async def _run_breadth_first(self, nodes: List[ResearchNode]) -> None:
+        level = sorted(nodes, key=lambda n: -n.score)
+        speculative: Dict[str, asyncio.Future] = {}
+        saving = None
+
+        async def process(node: ResearchNode) -> bool:
+            ok = await self._process(node)
+            if ok and self.speculate and node.depth > 1 and not self.stop_reason:
+                # Expand now, without waiting for the rest of the level.
+                speculative[node.id] = asyncio.ensure_future(self._speculate(node))
+            return ok
+
+        while level:
+            admitted = [node for node in level if self._admit(node)]
+            if self.speculate:
+                await self._discard([node for node in level if node not in admitted], admitted,
+                                    saving[2] if saving else [])
+            results = await self._gather_until_deadline([process(node) for node in admitted])
+            if saving is not None:
+                self._record_saving(admitted, saving[0], saving[1])
+            finished = [node for node, ok in zip(admitted, results) if ok]
+            if self.stop_reason:
+                tasks = list(speculative.values())
+                await self._cancel(tasks)
+                # Finished expansions have already started the searches of their children.
+                await self._discard([child for task in tasks
+                                     if not task.cancelled() and task.exception() is None
+                                     for child in task.result()], [], [])
+                for parent in speculative:
+                    self.speculation.wasted_tokens += self._expansions.get(parent, (0, 0))[0]
+                break
+            if self.speculate:
+                barrier = time.monotonic()
+                tasks = [speculative.pop(node.id) for node in finished if node.id in speculative]
+                children = await self._gather_until_deadline(tasks)
+                self.speculation.cancelled += sum(task.cancelled() for task in tasks)
+                durations = [self._expansions[node.id][1] for node in finished if node.id in self._expansions]
+                saving = (max(durations, default=0.0), time.monotonic() - barrier,
+                          [node.id for node in finished if node.id in self._expansions])
+            else:
+                children = await self._gather_until_deadline([self._expand(node) for node in finished])
+            level = sorted((c for group in children if group for c in group), key=lambda n: -n.score)
+
+    async def _run_best_first(self, nodes: List[ResearchNode]) -> None:
+        counter = itertools.count()
+        frontier = [(-node.score, next(counter), node) for node in nodes]
+        heapq.heapify(frontier)
+        active: Dict[asyncio.Future, ResearchNode] = {}
+
+        async def visit(node: ResearchNode) -> List[ResearchNode]:
+            if not await self._process(node):
+                return []
+            return await self._expand(node)
+
+        while frontier or active:
+            while frontier and len(active) < self.max_active_nodes and not self.stop_reason:
+                _, _, node = heapq.heappop(frontier)
+                if not self._admit(node):
+                    break
+                active[asyncio.ensure_future(visit(node))] = node
+            if not active:
+                break
+            done, _ = await asyncio.wait(active, timeout=self.budget.remaining_time(),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                self.stop_reason = self.stop_reason or "deadline"
+                for task in active:
+                    task.cancel()
+                await asyncio.gather(*active, return_exceptions=True)
+                break
+            for task in done:
+                del active[task]
+                for child in task.result():
+                    heapq.heappush(frontier, (-child.score, next(counter), child))
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import asyncio
+import unittest
+from ai.providers import _current_usage
+from frontier import FrontierEngine, ResearchBudget, ResearchNode, ResearchStore
+
+def spend(tokens):
+    """Counts `tokens` as an LLM call of the current scope."""
+    if tokens:
+        _current_usage.get().add(tokens, 0)
+
+class StubResearch:
+    """
+    Stands in for the searches and LLM calls of deep_research: every node
+    takes `delays[query]` seconds (default `delay`) and has `breadth`
+    children, each search spends `tokens` and each expansion `expand_tokens`.
+    """
+
+    def __init__(self, delay=0.01, delays=None, scores=None, tokens=0, expand_tokens=0, prefetch_delay=0.05):
+        self.store = ResearchStore()
+        self.delay = delay
+        self.delays = delays or {}
+        self.scores = scores or {}
+        self.tokens = tokens
+        self.expand_tokens = expand_tokens
+        self.prefetch_delay = prefetch_delay
+        self.processed = []
+        self.prefetches = []
+        self.prefetched = []
+
+    def roots(self, *queries, breadth=2, depth=1):
+        return [ResearchNode(id=query, query=query, research_goal="", breadth=breadth, depth=depth,
+                             score=self.scores.get(query, 1.0)) for query in queries]
+
+    def engine(self, **options):
+        return FrontierEngine(self.store, self.process_node, self.expand_node,
+                              prefetch_node=self.prefetch_node, **options)
+
+    async def process_node(self, node):
+        if node.prefetch is not None:
+            await node.prefetch
+            self.prefetched.append(node.query)
+        await asyncio.sleep(self.delays.get(node.query, self.delay))
+        spend(self.tokens)
+        self.processed.append(node.query)
+        self.store.complete(node, [f"Learning of {node.query}"], [f"https://example.com/{node.id}"], [])
+
+    async def expand_node(self, node):
+        await asyncio.sleep(0.01)
+        spend(self.expand_tokens)
+        queries = [f"{node.query}.{i}" for i in range(node.breadth)]
+        return [ResearchNode(id=query, query=query, research_goal="", breadth=node.breadth, depth=node.depth - 1,
+                             level=node.level + 1, parent=node.id, score=self.scores.get(query, 1.0))
+                for query in queries]
+
+    async def prefetch_node(self, node):
+        self.prefetches.append(asyncio.current_task())
+        await asyncio.sleep(self.prefetch_delay)
+
+class BudgetTest(unittest.IsolatedAsyncioTestCase):
+    async def test_max_queries_stops_admissions(self):
+        research = StubResearch()
+        engine = research.engine(budget=ResearchBudget(max_queries=3))
+        roots = research.roots("a", "b", "c", "d")
+        await engine.run(roots)
+
+        self.assertEqual(engine.stop_reason, "max_queries")
+        self.assertEqual(research.processed, ["a", "b", "c"])
+        # The node over budget was never started or added to the store.
+        self.assertEqual(roots[3].status, "pending")
+        self.assertNotIn("d", research.store.nodes)
+        self.assertEqual(engine.budget.queries, 3)
+
+    async def test_max_tokens_stops_best_first(self):
+        research = StubResearch(tokens=100)
+        engine = research.engine(strategy="best_first", max_active_nodes=1,
+                                 budget=ResearchBudget(max_tokens=250))
+        await engine.run(research.roots("a", "b", "c", "d", "e"))
+
+        self.assertEqual(engine.stop_reason, "max_tokens")
+        self.assertEqual(research.processed, ["a", "b", "c"])
+        self.assertEqual(engine.budget.tokens, 300)
+
+    async def test_exhausted_budget_is_not_expanded(self):
+        research = StubResearch(tokens=100)
+        engine = research.engine(budget=ResearchBudget(max_tokens=100))
+        await engine.run(research.roots("a", depth=2))
+
+        self.assertEqual(engine.stop_reason, "max_tokens")
+        self.assertEqual(research.processed, ["a"])
+        self.assertEqual(list(research.store.nodes), ["a"])
+
+    async def test_deadline_cancels_nodes_in_flight(self):
+        research = StubResearch(delays={"slow": 5.0})
+        engine = research.engine(strategy="best_first", budget=ResearchBudget(deadline=0.2))
+        roots = research.roots("fast", "slow", depth=2)
+        await asyncio.wait_for(engine.run(roots), timeout=2)
+
+        self.assertEqual(engine.stop_reason, "deadline")
+        self.assertEqual(roots[0].status, "done")
+        self.assertEqual(roots[1].status, "cancelled")
+        self.assertNotIn("slow", research.processed)
+
+    async def test_no_budget_runs_the_whole_tree(self):
+        research = StubResearch()
+        engine = research.engine()
+        await engine.run(research.roots("a", depth=3))
+
+        self.assertIsNone(engine.stop_reason)
+        self.assertEqual(len(research.processed), 1 + 2 + 4)
+
+class BestFirstTest(unittest.IsolatedAsyncioTestCase):
+    async def test_visits_nodes_by_score(self):
+        # Children of "a" compete with the remaining roots by score.
+        research = StubResearch(scores={"a": 0.9, "b": 0.5, "c": 0.2, "a.0": 0.7, "a.1": 0.1})
+        engine = research.engine(strategy="best_first", max_active_nodes=1)
+        roots = research.roots("c", "b") + research.roots("a", depth=2)
+        await engine.run(roots)
+
+        self.assertIsNone(engine.stop_reason)
+        self.assertEqual(research.processed, ["a", "a.0", "b", "c", "a.1"])
+
+    async def test_max_active_nodes_bounds_concurrency(self):
+        research = StubResearch()
+        running = peak = 0
+        process_node = research.process_node
+
+        async def counting(node):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                await process_node(node)
+            finally:
+                running -= 1
+
+        research.process_node = counting
+        engine = research.engine(strategy="best_first", max_active_nodes=2)
+        await engine.run(research.roots("a", "b", "c", "d", "e"))
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(len(research.processed), 5)
+
+class SpeculationTest(unittest.IsolatedAsyncioTestCase):
+    async def test_children_are_prefetched_and_used(self):
+        research = StubResearch()
+        engine = research.engine(speculate=True)
+        await engine.run(research.roots("a", "b", depth=2))
+
+        self.assertIsNone(engine.stop_reason)
+        self.assertEqual(sorted(research.processed), ["a", "a.0", "a.1", "b", "b.0", "b.1"])
+        self.assertEqual(sorted(research.prefetched), ["a.0", "a.1", "b.0", "b.1"])
+        stats = engine.speculation.stats()
+        self.assertEqual((stats["expansions"], stats["prefetches"], stats["used"]), (2, 4, 4))
+        self.assertEqual((stats["cancelled"], stats["wasted_tokens"]), (0, 0))
+
+    async def test_prefetches_of_children_not_admitted_are_cancelled(self):
+        research = StubResearch(expand_tokens=100, prefetch_delay=0.2)
+        # Only one child of "a" fits in the budget; the children of "b" are never run.
+        engine = research.engine(speculate=True, budget=ResearchBudget(max_queries=3))
+        await engine.run(research.roots("a", "b", depth=2))
+
+        self.assertEqual(engine.stop_reason, "max_queries")
+        self.assertEqual(sorted(research.processed), ["a", "a.0", "b"])
+        self.assertEqual(engine.speculation.cancelled, 3)
+        self.assertEqual(engine.speculation.wasted_tokens, 100)
+        self.assertTrue(all(task.done() for task in research.prefetches))
+
+    async def test_deadline_mid_level_leaves_no_prefetch_running(self):
+        research = StubResearch(delays={"slow": 5.0}, expand_tokens=100, prefetch_delay=5.0)
+        engine = research.engine(speculate=True, budget=ResearchBudget(deadline=0.2))
+        await asyncio.wait_for(engine.run(research.roots("fast", "slow", depth=2)), timeout=2)
+
+        self.assertEqual(engine.stop_reason, "deadline")
+        self.assertEqual(research.store.nodes["slow"].status, "cancelled")
+        # "fast" was expanded and its children's searches started before the deadline.
+        self.assertEqual(len(research.prefetches), 2)
+        self.assertTrue(all(task.done() for task in research.prefetches))
+        self.assertEqual(engine.speculation.cancelled, 2)
+        self.assertEqual(engine.speculation.wasted_tokens, 100)
+
+    async def test_token_budget_mid_level_leaves_no_prefetch_running(self):
+        research = StubResearch(delays={"slow": 0.1}, tokens=100, expand_tokens=100, prefetch_delay=5.0)
+        # "fast" is expanded within the budget; when "slow" finishes, the budget is spent.
+        engine = research.engine(speculate=True, budget=ResearchBudget(max_tokens=250))
+        await asyncio.wait_for(engine.run(research.roots("fast", "slow", depth=2)), timeout=2)
+
+        self.assertEqual(engine.stop_reason, "max_tokens")
+        self.assertEqual(sorted(research.processed), ["fast", "slow"])
+        self.assertEqual(len(research.prefetches), 2)
+        self.assertTrue(all(task.done() for task in research.prefetches))
+        self.assertEqual(engine.speculation.cancelled, 2)
+        self.assertEqual(engine.speculation.wasted_tokens, 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,8 @@ def markdown_system_prompt():
     Returns a system prompt specifically designed for generating well-formatted Markdown reports.
     """
     from datetime import datetime
-    now = datetime.utcnow().isoformat() + "Z"
+    # Date only, like prompt.system_prompt(), to keep LLM cache keys stable.
+    now = datetime.utcnow().date().isoformat()
     return (
         f"You are an expert researcher and technical writer. Today is {now}. Follow these instructions when responding:\n"
         f"- You are tasked with creating comprehensive, well-structured research reports in Markdown format.\n"
@@ -7,10 +7,11 @@ def get_prompt():
 
 def system_prompt():
     """
-    Returns the system prompt for AI generation with current timestamp and detailed instructions.
+    Returns the system prompt for AI generation with the current date and detailed instructions.
     """
     from datetime import datetime
-    now = datetime.utcnow().isoformat() + "Z"
+    # Date only, so the system prompt (and LLM cache keys) stay stable through the day.
+    now = datetime.utcnow().date().isoformat()
     return (
         f"You are an expert researcher. Today is {now}. Follow these instructions when responding:\n"
         f"- You may be asked to research subjects that are after your knowledge cutoff; assume the user is right when presented with news.\n"
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import math
+from ai.providers import o3_mini_model, generate_object, prompt_token_budget
+from ai.tokenizer import count_tokens
+from ai.similarity import cluster_texts
+from ai import tracing
+from markdown_prompt import markdown_system_prompt
+from deep_research import format_learnings, format_source
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of learnings drafted together in one section (map step).
+SECTION_SIZE = 12
+
+# Number of section drafts written concurrently.
+MAP_CONCURRENCY = 8
+
+# Above this many tokens of learnings (about 150,000 characters), one report call covers them too thinly.
+SINGLE_CALL_LIMIT = 37500
+
+def needs_hierarchical_report(learnings):
+    """
+    Returns True when the learnings are too large for write_final_report's single prompt,
+    either above SINGLE_CALL_LIMIT or above what fits in the model's context window.
+    """
+    limit = min(SINGLE_CALL_LIMIT, prompt_token_budget(markdown_system_prompt()))
+    # Each learning is wrapped in <learning> tags (about 8 tokens) in the prompt.
+    return sum(count_tokens(str(learning)) + 8 for learning in learnings) > limit
+
+def _citations(urls, url_numbers):
+    return "".join(f"[[{url_numbers[url]}]](#ref{url_numbers[url]})" for url in urls if url in url_numbers)
+
+@tracing.traced("report.section")
+async def _draft_section(prompt, section_learnings, semaphore):
+    """
+    Map step: write one report section from a cluster of learnings.
+    Each learning carries the citation links of its sources.
+    """
+    learnings_text = "\n\n".join(
+        f"<learning citations=\"{citations}\">\n{learning}\n</learning>"
+        for learning, citations in section_learnings
+    )
+    prompt_text = (
+        f"You are writing ONE section of a larger research report on the prompt below. "
+        f"Cover ONLY the learnings provided here, include ALL of them, and be as detailed as possible. "
+        f"Format the section as Markdown with a single '## ' heading followed by the body (use '### ' for subsections). "
+        f"Each learning lists the citation links for its sources; when you use a learning, cite it with exactly those links, "
+        f"placed at the end of the sentence or paragraph. Do not invent citation numbers and do not add a Sources section.\n\n"
+        f"<prompt>{prompt}</prompt>\n\n"
+        f"<learnings>\n{learnings_text}\n</learnings>"
+    )
+    async with semaphore:
+        response = await generate_object(
+            model=o3_mini_model,
+            system=markdown_system_prompt(),
+            prompt=prompt_text,
+            schema={
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string", "description": "Section heading without the leading ##"},
+                    "sectionMarkdown": {"type": "string", "description": "The complete markdown section, starting with its ## heading"}
+                },
+                "required": ["title", "sectionMarkdown"]
+            }
+        )
+    section = response.get("object", {})
+    markdown = section.get("sectionMarkdown", "")
+    if not markdown or markdown == "Error generating content":
+        # Keep the learnings even if drafting failed.
+        markdown = "## Findings\n\n" + "\n".join(f"- {learning} {citations}" for learning, citations in section_learnings)
+        return {"title": "Findings", "markdown": markdown}
+    if not markdown.lstrip().startswith("#"):
+        markdown = f"## {section.get('title') or 'Findings'}\n\n{markdown}"
+    return {"title": section.get("title") or "Findings", "markdown": markdown.strip()}
+
+@tracing.traced("report.outline")
+async def _outline_report(prompt, sections):
+    """
+    Reduce step: choose the title, introduction, conclusion and section order.
+    Only section titles and short excerpts are sent, so this call stays small.
+    """
+    overview = "\n\n".join(
+        f"<section index=\"{i}\" title=\"{section['title']}\">\n{section['markdown'][:600]}\n</section>"
+        for i, section in enumerate(sections)
+    )
+    prompt_text = (
+        f"The sections below were drafted for a research report on the prompt. "
+        f"Write the report title, an introduction that frames the whole report, and a conclusion that synthesises the sections. "
+        f"Also give the order in which the sections should appear (a list of section indices, each exactly once). "
+        f"Keep any citation links of the form [[n]](#refn) exactly as they appear.\n\n"
+        f"<prompt>{prompt}</prompt>\n\n"
+        f"<sections>\n{overview}\n</sections>"
+    )
+    response = await generate_object(
+        model=o3_mini_model,
+        system=markdown_system_prompt(),
+        prompt=prompt_text,
+        schema={
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "introduction": {"type": "string"},
+                "conclusion": {"type": "string"},
+                "sectionOrder": {"type": "array", "items": {"type": "integer"}}
+            },
+            "required": ["title", "introduction", "conclusion", "sectionOrder"]
+        }
+    )
+    return response.get("object", {})
+
+@tracing.traced("report")
+async def write_hierarchical_report(prompt, learnings, visited_urls, learning_sources=None,
+                                    section_size=SECTION_SIZE):
+    """
+    Writes the final report map-reduce style, for learning sets too large for one prompt.
+
+    Learnings are clustered into sections of at most `section_size`, every
+    section is drafted in parallel (map), and a final small call writes the
+    title, introduction and conclusion and orders the sections (reduce).
+    Citations use each learning's source URLs from `learning_sources`, numbered
+    by their position in `visited_urls`, so they match the Sources section.
+
+    Returns:
+        The report as a Markdown string
+    """
+    logger.info("Writing hierarchical report from %d learnings and %d URLs", len(learnings), len(visited_urls))
+    learning_sources = learning_sources or {}
+    url_numbers = {url: i + 1 for i, url in enumerate(visited_urls)}
+
+    formatted_learnings = format_learnings(learnings)
+    annotated = [
+        (formatted, _citations(learning_sources.get(learning, []) if isinstance(learning, str) else [], url_numbers))
+        for learning, formatted in zip(learnings, formatted_learnings)
+    ]
+
+    num_sections = max(1, math.ceil(len(annotated) / section_size))
+    clusters = cluster_texts(formatted_learnings, num_sections, max_size=section_size)
+    logger.info("Drafting %d sections", len(clusters))
+
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+    sections = await asyncio.gather(*[
+        _draft_section(prompt, [annotated[i] for i in cluster], semaphore) for cluster in clusters
+    ])
+
+    outline = await _outline_report(prompt, sections) if sections else {}
+    order = [i for i in outline.get("sectionOrder", []) if isinstance(i, int) and 0 <= i < len(sections)]
+    order = list(dict.fromkeys(order))
+    order += [i for i in range(len(sections)) if i not in order]
+
+    title = outline.get("title")
+    if not title or title == "Error generating content":
+        title = "Research Report"
+    parts = [f"# {title}"]
+    introduction = outline.get("introduction")
+    if introduction and introduction != "Error generating content":
+        parts.append(f"## Introduction\n\n{introduction}")
+    parts.extend(sections[i]["markdown"] for i in order)
+    conclusion = outline.get("conclusion")
+    if conclusion and conclusion != "Error generating content":
+        parts.append(f"## Conclusion\n\n{conclusion}")
+    parts.append("## Sources\n\n" + "\n".join(format_source(i, url) for i, url in enumerate(visited_urls)))
+    return "\n\n".join(parts)
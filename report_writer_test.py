@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import re
+import unittest
+from unittest import mock
+import report_writer
+from report_writer import write_hierarchical_report
+
+URLS = ["https://a.com/solar", "https://b.com/wind", "https://c.com/hydro"]
+
+class StubModel:
+    """
+    Stands in for generate_object: drafts each section as a list of its
+    learnings with their citation links, and answers the outline call with
+    `outline`. Sections with a learning containing "FAIL" fail to draft.
+    """
+
+    def __init__(self, outline=None):
+        self.outline = outline or {}
+        self.outline_prompt = None
+
+    async def __call__(self, model, system, prompt, schema):
+        if "sectionMarkdown" in schema["properties"]:
+            learnings = re.findall(r'<learning citations="(.*?)">\n(.*?)\n</learning>', prompt, re.S)
+            if any("FAIL" in learning for _, learning in learnings):
+                return {"object": {"title": "Error generating content", "sectionMarkdown": "Error generating content"}}
+            body = "\n".join(f"{learning} {citations}" for citations, learning in learnings)
+            return {"object": {"title": learnings[0][1], "sectionMarkdown": f"## {learnings[0][1]}\n\n{body}"}}
+        self.outline_prompt = prompt
+        return {"object": {"title": "Energy", "introduction": "Intro.", "conclusion": "Conclusion.", **self.outline}}
+
+    def section_learnings(self):
+        """The first learning of each section, by the index the outline call saw it under."""
+        return dict((int(i), title) for i, title in re.findall(r'<section index="(\d+)" title="(.*?)">',
+                                                                 self.outline_prompt))
+
+class HierarchicalReportTest(unittest.IsolatedAsyncioTestCase):
+    async def write(self, model, learnings, learning_sources=None, section_size=1):
+        with mock.patch.object(report_writer, "generate_object", model):
+            return await write_hierarchical_report("Renewable energy", learnings, URLS,
+                                                   learning_sources=learning_sources, section_size=section_size)
+
+    async def test_citations_follow_sources_in_visited_url_order(self):
+        sources = {
+            "Solar panels convert sunlight": [URLS[2], URLS[0]],
+            "Wind turbines spin rotors": [URLS[1], "https://unvisited.com"],
+        }
+        report = await self.write(StubModel(), list(sources) + ["Hydro dams store water"], sources)
+
+        self.assertIn("Solar panels convert sunlight [[3]](#ref3)[[1]](#ref1)", report)
+        self.assertIn("Wind turbines spin rotors [[2]](#ref2)\n", report)
+        self.assertNotIn("unvisited", report)
+        # A learning without visited sources is not cited.
+        self.assertRegex(report, r"(?m)^Hydro dams store water$")
+        self.assertIn('## Sources\n\n1. <a id="ref1"></a>[https://a.com/solar]', report)
+        self.assertIn('3. <a id="ref3"></a>[https://c.com/hydro]', report)
+
+    async def test_section_order_is_cleaned_up(self):
+        # Out-of-range and repeated indices are dropped; sections left out are appended in draft order.
+        model = StubModel({"sectionOrder": [2, 7, -1, 2, "0"]})
+        report = await self.write(model, ["Solar panels", "Wind turbines", "Hydro dams"])
+
+        sections = model.section_learnings()
+        expected = [sections[2], sections[0], sections[1]]
+        positions = [report.index(f"## {title}") for title in expected]
+        self.assertEqual(positions, sorted(positions))
+        for title in expected:
+            self.assertEqual(report.count(f"## {title}"), 1)
+        self.assertTrue(report.startswith("# Energy\n\n## Introduction\n\nIntro."))
+        self.assertLess(positions[-1], report.index("## Conclusion"))
+        self.assertLess(report.index("## Conclusion"), report.index("## Sources"))
+
+    async def test_failed_outline_keeps_the_drafted_sections(self):
+        model = StubModel({"title": "Error generating content", "introduction": "Error generating content",
+                           "conclusion": "", "sectionOrder": []})
+        report = await self.write(model, ["Solar panels", "Wind turbines"])
+
+        self.assertTrue(report.startswith("# Research Report\n\n## "))
+        self.assertNotIn("## Introduction", report)
+        self.assertNotIn("## Conclusion", report)
+        self.assertIn("## Solar panels", report)
+        self.assertIn("## Wind turbines", report)
+
+    async def test_failed_draft_falls_back_to_the_learnings(self):
+        sources = {"FAIL solar output": [URLS[0]], "Wind turbines spin rotors": [URLS[1]]}
+        report = await self.write(StubModel(), list(sources), sources)
+
+        self.assertIn("## Findings\n\n- FAIL solar output [[1]](#ref1)", report)
+        self.assertIn("## Wind turbines spin rotors", report)
+
+    async def test_sections_hold_at_most_section_size_learnings(self):
+        learnings = [f"Learning {i} about {topic}" for i, topic in enumerate(["solar", "wind", "hydro"] * 3)]
+        report = await self.write(StubModel(), learnings, section_size=4)
+
+        sections = re.findall(r"## Learning.*?(?=\n\n## |\Z)", report, re.S)
+        self.assertEqual(len(sections), 3)
+        for section in sections:
+            self.assertLessEqual(len(re.findall(r"^Learning \d", section, re.M)), 4)
+        for learning in learnings:
+            self.assertEqual(len(re.findall(rf"(?m)^{learning} ?$", report)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
-from deep_research import deep_research, write_final_report
-from feedback import generate_feedback
+from deep_research import deep_research, write_final_report, write_final_report_stream
+from feedback import combine_query, generate_feedback
+from ai.providers import close_client
+from ai.tracing import get_tracer
+from ai.profiling import SamplingProfiler, critical_path, format_critical_path, write_timeline
+from checkpoint import ResearchCheckpoint
+from report_writer import needs_hierarchical_report, write_hierarchical_report
 
 # Load environment variables
 load_dotenv('.env.local')
@@ -16,7 +23,11 @@ async def ask_question(prompt: str) -> str:
     """
     return await asyncio.get_event_loop().run_in_executor(None, lambda: input(prompt))
 
-async def main():
+async def plan_research():
+    """
+    Interactively asks for the topic, breadth, depth and follow-up answers.
+    Returns the combined query, breadth and depth.
+    """
     # Get initial query
     initial_query = await ask_question("What would you like to research? ")
 
@@ -48,9 +59,30 @@ async def main():
         answers.append(answer)
 
     # Combine all information for deep research
-    combined_query = f"Initial Query: {initial_query}\nFollow-up Questions and Answers:\n"
-    for q, a in zip(follow_up_questions, answers):
-        combined_query += f"Q: {q}\nA: {a}\n"
+    return combine_query(initial_query, zip(follow_up_questions, answers)), breadth, depth
+
+async def main(args):
+    checkpoint = ResearchCheckpoint(args.checkpoint, resume=True) if args.resume else None
+    if checkpoint is not None and checkpoint.run is not None:
+        combined_query = checkpoint.run["query"]
+        breadth = checkpoint.run["breadth"]
+        depth = checkpoint.run["depth"]
+        print(f"Resuming research from {args.checkpoint} ({checkpoint.completed} queries already completed)")
+    else:
+        if checkpoint is not None:
+            checkpoint.close()
+            print(f"No checkpoint found at {args.checkpoint}, starting a new research run.")
+        elif os.path.exists(args.checkpoint) and os.path.getsize(args.checkpoint):
+            print(f"{args.checkpoint} holds a previous research run, which the new run will replace. "
+                  f"To continue it instead, press Ctrl+C and run with --resume.")
+        combined_query, breadth, depth = await plan_research()
+        # The previous checkpoint is only replaced once the new run actually starts.
+        checkpoint = ResearchCheckpoint(args.checkpoint, resume=False)
+
+    # Profile from here on: the interactive questions above are not part of the run.
+    profiler = SamplingProfiler() if args.profile else None
+    if profiler is not None:
+        profiler.start()
 
     print("\nResearching your topic...")
     print("\nStarting research with progress tracking...\n")
@@ -61,12 +93,17 @@ async def main():
 
     # Perform deep research
     try:
-        result = await deep_research(query=combined_query, breadth=breadth, depth=depth)
+        result = await deep_research(query=combined_query, breadth=breadth, depth=depth, checkpoint=checkpoint,
+                                     strategy=args.strategy, max_queries=args.max_queries,
+                                     max_tokens=args.max_tokens, deadline=args.deadline,
+                                     pipeline=args.pipeline, speculate=args.speculate, on_progress=on_progress)
         print("\nResearch completed successfully.")
     except Exception as e:
         print(f"\nError during research: {e}")
         # Provide a minimal result to continue
         result = {"learnings": [], "visitedUrls": []}
+    finally:
+        checkpoint.close()
     learnings = result.get("learnings", [])
     visited_urls = result.get("visitedUrls", [])
 
@@ -84,15 +121,103 @@ async def main():
     print("\n".join(visited_urls))
     print("Writing final report...")
 
-    # Write the final report
-    report = await write_final_report(prompt=combined_query, learnings=learnings, visited_urls=visited_urls)
-
-    # Save report to file
-    with open("output.md", "w", encoding="utf-8") as f:
-        f.write(report)
-
-    print(f"\n\nFinal Report:\n\n{report}")
+    if args.hierarchical or needs_hierarchical_report(learnings):
+        if args.stream:
+            print(f"{len(learnings)} learnings are too many to stream the report in one pass; "
+                  f"writing it section by section instead (--stream is ignored).")
+        # Draft sections in parallel and merge them, so no learnings are trimmed
+        report = await write_hierarchical_report(prompt=combined_query, learnings=learnings, visited_urls=visited_urls,
+                                                 learning_sources=result.get("learningSources", {}))
+
+        with open("output.md", "w", encoding="utf-8") as f:
+            f.write(report)
+
+        print(f"\n\nFinal Report:\n\n{report}")
+    elif args.stream:
+        # Stream the report to output.md and stdout as it is generated
+        print("\n\nFinal Report:\n")
+        streamed = await write_final_report_stream(prompt=combined_query, learnings=learnings,
+                                                   visited_urls=visited_urls, output_path="output.md")
+        if streamed["timeToFirstByte"] is not None:
+            print(f"\nReport streamed: first byte after {streamed['timeToFirstByte']:.2f}s, "
+                  f"finished after {streamed['totalTime']:.2f}s")
+    else:
+        # Write the final report
+        report = await write_final_report(prompt=combined_query, learnings=learnings, visited_urls=visited_urls)
+
+        # Save report to file
+        with open("output.md", "w", encoding="utf-8") as f:
+            f.write(report)
+
+        print(f"\n\nFinal Report:\n\n{report}")
     print("\nReport has been saved to output.md")
 
+    tracer = get_tracer()
+    print(f"\nWhere the time and tokens went:\n{tracer.format_summary()}")
+    if args.trace:
+        count = tracer.export_jsonl(args.trace)
+        print(f"Wrote {count} trace spans to {args.trace}")
+    if profiler is not None:
+        profiler.stop()
+        write_profile(args.profile, profiler, tracer.spans)
+
+    await close_client()
+
+def write_profile(prefix, profiler, spans):
+    """Writes the CPU flame graph stacks and the task timeline, and prints the hot spots and critical path."""
+    profiler.write_folded(f"{prefix}.folded")
+    write_timeline(spans, f"{prefix}.timeline.json")
+    research = [s for s in spans if s.name == "research" and s.parent is None]
+    print(f"\n{profiler.format_top()}")
+    print(f"\n{format_critical_path(critical_path(spans, research[-1] if research else None))}")
+    print(f"\nWrote CPU stacks to {prefix}.folded (flamegraph.pl, speedscope) "
+          f"and the task timeline to {prefix}.timeline.json (Perfetto, chrome://tracing)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run an interactive deep research session.")
+    parser.add_argument("--checkpoint", default="research_checkpoint.jsonl",
+                        help="File the research tree is checkpointed to (default: research_checkpoint.jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume the run recorded in the checkpoint file, skipping completed queries")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the final report to output.md and stdout as it is generated "
+                             "(not for reports written section by section)")
+    parser.add_argument("--hierarchical", action="store_true",
+                        help="Write the report section by section (used automatically for large learning sets)")
+    parser.add_argument("--strategy", choices=["breadth_first", "best_first"], default="breadth_first",
+                        help="Order in which the research tree is explored (default: breadth_first)")
+    parser.add_argument("--max-queries", type=int, default=None,
+                        help="Stop after this many search queries")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="Stop starting new queries once this many LLM tokens were used")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="Stop researching after this many seconds")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Scrape search results one page at a time and extract learnings from each as it arrives")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "WARNING").upper(),
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Level of the log messages written to stderr: INFO adds run statistics, "
+                             "DEBUG every search and LLM call (default: WARNING, or LOG_LEVEL)")
+    parser.add_argument("--trace", default=None, metavar="PATH",
+                        help="Write a span per search, LLM and report call to PATH as OpenTelemetry JSON lines")
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="PREFIX",
+                        help="Sample the CPU while researching and writing the report, and write PREFIX.folded "
+                             "(flame graph stacks) and PREFIX.timeline.json (asyncio task timeline); "
+                             "also prints the critical path of the research tree (default PREFIX: profile)")
+    parser.add_argument("--speculate", action="store_true",
+                        help="Generate and search follow-up queries as soon as each query finishes, "
+                             "without waiting for the rest of its level")
+    args = parser.parse_args()
+    if args.stream and args.hierarchical:
+        parser.error("--stream cannot be combined with --hierarchical: sections are drafted in parallel and merged")
+    return args
+
 if __name__ == '__main__':
-    asyncio.run(main())
+    args = parse_args()
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Third-party clients log every request at INFO.
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, logging.getLogger().level))
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Progress is saved in {args.checkpoint}; continue with: python run.py --resume")